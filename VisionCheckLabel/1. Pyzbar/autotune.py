@@ -0,0 +1,169 @@
+"""Dò tham số tiền xử lý tốt nhất cho từng model trên bộ ảnh OK đã gán nhãn
+
+Mỗi ứng viên là một chiến lược đơn (không fallback) với một bộ tham số blur /
+block size / C / ngưỡng cố định, có hoặc không khoanh vùng. Ứng viên phải đọc
+đủ mọi mã trong ground truth của từng ảnh trong tập tune (--no-require-all: chỉ
+cần một mã mỗi ảnh); trong số đó chọn ứng viên có latency trung bình thấp nhất,
+rồi lưu làm bước đầu tiên của cascade trong recipe của model. Chỉ các key được
+dò (TUNED_KEYS) bị ghi đè, phần còn lại của recipe (pyramid, expected_codes...)
+giữ nguyên.
+
+Manifest không ghi model của từng ảnh: không có --match thì model được tune trên
+toàn bộ tập ảnh, gồm cả label của các model khác.
+
+Ví dụ:
+    python autotune.py --model "RU Model"
+    python autotune.py --model "OCDU Model" --match "image/OK/09*" --no-require-all
+"""
+import argparse
+import copy
+import fnmatch
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+
+from pipeline import decode_cascade
+from benchmark import DEFAULT_MANIFEST, load_manifest
+from recipes import MODELS, load_recipe, save_recipe
+
+BLUR_SIZES = [0, 3, 5]
+BLOCK_SIZES = [11, 15, 21, 31, 41]
+C_VALUES = [2, 5, 10]
+THRESHOLDS = [100, 125, 150, 175]
+
+# Các key của recipe do autotune quyết định
+TUNED_KEYS = ('strategies', 'blur', 'block_sizes', 'C', 'threshold', 'localize')
+
+# Ảnh xám của tập tune, nạp một lần trong mỗi process worker
+_samples = []
+
+
+def candidate_recipes(recipe: dict):
+    """Sinh toàn bộ lưới ứng viên trên nền recipe hiện tại, mỗi ứng viên chỉ có một chiến lược"""
+    for localize in (True, False):
+        base = dict(copy.deepcopy(recipe), localize=localize)
+        yield dict(base, strategies=['gray'])
+        for ksize in BLUR_SIZES:
+            yield dict(base, strategies=['otsu'], blur=ksize)
+            for threshold in THRESHOLDS:
+                yield dict(base, strategies=['binary'], blur=ksize, threshold=threshold)
+            for block_size, C in itertools.product(BLOCK_SIZES, C_VALUES):
+                yield dict(base, strategies=['adaptive'], blur=ksize, block_sizes=[block_size], C=C)
+
+
+def load_samples(entries):
+    global _samples
+    cv2.setNumThreads(1)
+    _samples = []
+    for entry in entries:
+        gray = cv2.imread(entry['abs_path'], cv2.IMREAD_GRAYSCALE)
+        if gray is not None:
+            _samples.append((gray, set(entry['expected']), entry['complete']))
+
+
+def evaluate(args):
+    """Chạy một ứng viên trên toàn bộ tập tune; dừng ngay ở ảnh đầu tiên bị trượt"""
+    recipe, require_all = args
+    total = 0.0
+    for gray, expected, complete in _samples:
+        start = time.perf_counter()
+        codes, _ = decode_cascade(gray, recipe)
+        total += time.perf_counter() - start
+
+        read = {obj.data.decode('utf-8') for obj in codes}
+        hits = read & expected if expected else read
+        false_read = complete and bool(read - expected)
+        enough = hits == expected if (require_all and expected) else bool(hits)
+        if false_read or not enough:
+            return {'recipe': recipe, 'recall_ok': False}
+    return {'recipe': recipe, 'recall_ok': True, 'mean_ms': total * 1000 / max(1, len(_samples))}
+
+
+def describe(recipe: dict) -> str:
+    strategy = recipe['strategies'][0]
+    parts = [strategy, f"localize={recipe['localize']}"]
+    if strategy != 'gray':
+        parts.append(f"blur={recipe['blur']}")
+    if strategy == 'adaptive':
+        parts.append(f"block={recipe['block_sizes'][0]} C={recipe['C']}")
+    elif strategy == 'binary':
+        parts.append(f"threshold={recipe['threshold']}")
+    return " ".join(parts)
+
+
+def to_cascade(best: dict, current: dict) -> dict:
+    """Ghép ứng viên thắng lên recipe hiện tại: chiến lược thắng lên đầu, các chiến lược cũ làm fallback"""
+    recipe = copy.deepcopy(current)
+    recipe.update({key: copy.deepcopy(best[key]) for key in TUNED_KEYS})
+    winner = best['strategies'][0]
+    recipe['strategies'] = [winner] + [name for name in current['strategies'] if name != winner]
+    recipe['block_sizes'] = best['block_sizes'][:1] + [
+        size for size in current['block_sizes'] if size not in best['block_sizes'][:1]]
+    return recipe
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dò tham số tiền xử lý cho một model")
+    parser.add_argument("--model", required=True, choices=MODELS)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--set", default="OK", help="Tập ảnh trong manifest dùng để tune")
+    parser.add_argument("--match", help="Chỉ lấy ảnh có đường dẫn khớp glob này (ảnh của riêng model); "
+                                         "bỏ trống thì tune trên toàn bộ tập, gồm cả ảnh của các model khác")
+    parser.add_argument("--require-all", action=argparse.BooleanOptionalAction, default=True,
+                        help="Phải đọc đủ mọi mã trong ground truth (mặc định); --no-require-all: "
+                             "chỉ cần ít nhất một mã mỗi ảnh")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in kết quả, không ghi recipe")
+    args = parser.parse_args()
+
+    entries = [entry for entry in load_manifest(args.manifest) if entry['set'] == args.set]
+    if args.match:
+        entries = [entry for entry in entries
+                   if fnmatch.fnmatch(entry['path'], args.match) or fnmatch.fnmatch(entry['abs_path'], args.match)]
+    if not entries:
+        print("No tuning image", file=sys.stderr)
+        return 1
+
+    current = load_recipe(args.model)
+    candidates = list(candidate_recipes(current))
+    scope = f"images matching {args.match}" if args.match else f"all {args.set} images (no --match, every model)"
+    print(f"Tuning {args.model}: {len(candidates)} candidates x {len(entries)} {scope}, "
+          f"{args.workers} workers", file=sys.stderr)
+
+    start = time.perf_counter()
+    passed = []
+    with multiprocessing.Pool(max(1, args.workers), initializer=load_samples, initargs=(entries,)) as pool:
+        tasks = [(recipe, args.require_all) for recipe in candidates]
+        for result in pool.imap_unordered(evaluate, tasks):
+            if result['recall_ok']:
+                passed.append(result)
+                print(f"  {result['mean_ms']:8.2f} ms  {describe(result['recipe'])}", file=sys.stderr)
+    recall = "100% recall" if args.require_all else "at least one code per image"
+    print(f"{len(passed)}/{len(candidates)} candidates keep {recall} "
+          f"({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+
+    if not passed:
+        print(f"No candidate keeps {recall}, recipe unchanged", file=sys.stderr)
+        return 1
+
+    best = min(passed, key=lambda result: result['mean_ms'])
+    recipe = to_cascade(best['recipe'], current)
+    print(f"Best: {describe(best['recipe'])} ({best['mean_ms']:.2f} ms/image on {len(entries)} {scope})")
+    if not args.dry_run:
+        path = save_recipe(args.model, recipe, tuning={
+            'images': len(entries),
+            'match': args.match,
+            'mean_ms': round(best['mean_ms'], 3),
+            'require_all': args.require_all,
+            'tuned_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        print(f"Saved {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""Benchmark độ chính xác và tốc độ của pipeline giải mã trên bộ label OK/NG
+
+Các lệnh:
+    manifest  tạo file ground truth từ image/OK và image/NG
+    run       chạy pipeline trên manifest, in recall / false read / throughput / latency
+              (recipe mặc định, recipe đã lưu của một model bằng --model, hoặc file --recipe)
+    diff      so sánh hai lần chạy đã lưu bằng `run --out`
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+from pipeline import DEFAULT_RECIPE, STAGES, decode_file, is_image_file, iter_candidates, is_valid, percentile
+from main import init_worker, parse_levels, parse_symbols
+from decode_cache import recipe_fingerprint
+from recipes import MODELS, compile_inspection
+
+MANIFEST_VERSION = 1
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MANIFEST = os.path.join(HERE, "benchmark_manifest.json")
+DEFAULT_IMAGE_ROOT = os.path.join(HERE, "..", "image")
+
+# Ảnh NG được lưu với tên <serial>_<yyyymmddHHMMSS>.png
+NG_SERIAL_PATTERN = re.compile(r"^(S\d+)_\d{14}$")
+
+
+def exhaustive_decode(image_path: str) -> list[str]:
+    """Giải mã vét cạn (không dừng sớm) để làm ground truth cho ảnh OK
+
+    Chỉ dùng ảnh xám gốc và ảnh phóng to: các ảnh nhị phân thỉnh thoảng đọc sai
+    CODE128 (ví dụ '"ARP\'14NC...' thay cho 'CARP514NC...'), đưa vào ground truth
+    sẽ che mất đúng loại false read mà benchmark cần bắt.
+    """
+    import cv2
+    from pyzbar.pyzbar import decode
+
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return []
+    recipe = dict(DEFAULT_RECIPE, strategies=['gray', 'upscale'])
+    found = set()
+    for _, candidate, _ in iter_candidates(gray, recipe):
+        found.update(obj.data.decode('utf-8') for obj in decode(candidate) if is_valid(obj))
+    return sorted(found)
+
+
+def build_manifest(image_root: str, manifest_path: str, bootstrap: bool, workers: int):
+    """Tạo manifest: NG lấy serial từ tên file, OK lấy mã từ giải mã vét cạn nếu bootstrap"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    for label_set in ("OK", "NG"):
+        folder = os.path.join(image_root, label_set)
+        if not os.path.isdir(folder):
+            print(f"Skip missing folder: {folder}", file=sys.stderr)
+            continue
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if not is_image_file(path):
+                continue
+            entry = {
+                'path': os.path.relpath(path, base_dir).replace(os.sep, '/'),
+                'set': label_set,
+                'expected': [],
+                # complete = danh sách expected là toàn bộ mã trên label, mã lạ mới tính là false read
+                'complete': False,
+                'source': None,
+            }
+            match = NG_SERIAL_PATTERN.match(os.path.splitext(name)[0])
+            if match:
+                entry['expected'] = [match.group(1)]
+                entry['source'] = 'filename'
+            entries.append(entry)
+
+    if bootstrap:
+        todo = [entry for entry in entries if entry['source'] is None]
+        paths = [os.path.join(base_dir, entry['path']) for entry in todo]
+        with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+            for entry, codes in zip(todo, pool.imap(exhaustive_decode, paths, chunksize=4)):
+                entry['expected'] = codes
+                entry['complete'] = True
+                entry['source'] = 'bootstrap'
+
+    manifest = {'version': MANIFEST_VERSION, 'images': entries}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    labelled = sum(1 for entry in entries if entry['expected'])
+    print(f"Wrote {manifest_path}: {len(entries)} images, {labelled} with ground truth", file=sys.stderr)
+
+
+def load_manifest(manifest_path: str) -> list[dict]:
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version: {manifest.get('version')}")
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for entry in manifest['images']:
+        entry['abs_path'] = os.path.normpath(os.path.join(base_dir, entry['path']))
+    return manifest['images']
+
+
+def latency_stats(values: list[float]) -> dict:
+    if not values:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    return {
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+    }
+
+
+def score(entry: dict, result: dict) -> dict:
+    """So kết quả giải mã của một ảnh với ground truth"""
+    read = sorted({code['data'] for code in result['codes']})
+    expected = set(entry['expected'])
+    hits = sorted(expected.intersection(read))
+    false_reads = sorted(set(read) - expected) if entry['complete'] else []
+    return {
+        'path': entry['path'],
+        'set': entry['set'],
+        'expected': entry['expected'],
+        'read': read,
+        'hits': hits,
+        'false_reads': false_reads,
+        'strategy': result['strategy'],
+        'scale': result.get('scale'),
+        'error': result.get('error'),
+        'ms': result['ms'],
+        'stages': result.get('stages', {}),
+    }
+
+
+def summarize(rows: list[dict]) -> dict:
+    labelled = [row for row in rows if row['expected']]
+    expected_count = sum(len(row['expected']) for row in labelled)
+    hit_count = sum(len(row['hits']) for row in labelled)
+    return {
+        'images': len(rows),
+        'decoded_images': sum(1 for row in rows if row['read']),
+        'labelled_images': len(labelled),
+        'expected_codes': expected_count,
+        'code_recall': round(hit_count / expected_count, 4) if expected_count else None,
+        'image_recall': round(sum(1 for row in labelled if len(row['hits']) == len(row['expected']))
+                              / len(labelled), 4) if labelled else None,
+        'false_reads': sum(len(row['false_reads']) for row in rows),
+        'errors': sum(1 for row in rows if row['error']),
+    }
+
+
+def load_recipe_arg(path: str) -> dict:
+    """Recipe từ file JSON: file recipe của model (lấy phần "decode") hoặc chỉ các tham số pipeline"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return dict(DEFAULT_RECIPE, **data.get('decode', data))
+
+
+def run_benchmark(manifest_path: str, workers: int, recipe: dict, source: str = "default") -> dict:
+    entries = load_manifest(manifest_path)
+    task = functools.partial(decode_file, recipe=recipe)
+    rows = []
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+        results = pool.imap(task, [entry['abs_path'] for entry in entries], chunksize=4)
+        for entry, result in zip(entries, results):
+            rows.append(score(entry, result))
+    elapsed = time.perf_counter() - start
+
+    summary = {'all': summarize(rows)}
+    for label_set in sorted({row['set'] for row in rows}):
+        summary[label_set] = summarize([row for row in rows if row['set'] == label_set])
+
+    latency = {'total': latency_stats([row['ms'] for row in rows])}
+    for name in STAGES:
+        values = [row['stages'][name] for row in rows if name in row['stages']]
+        if values:
+            latency[name] = latency_stats(values)
+
+    return {
+        'manifest': os.path.abspath(manifest_path),
+        'recipe': recipe,
+        'recipe_source': source,
+        'recipe_fingerprint': recipe_fingerprint(recipe),
+        'workers': workers,
+        'wall_s': round(elapsed, 3),
+        'throughput': round(len(rows) / elapsed, 2) if elapsed > 0 else 0.0,
+        'summary': summary,
+        'latency_ms': latency,
+        'images': rows,
+    }
+
+
+def print_report(run: dict):
+    print(f"Recipe: {run['recipe_source']} ({run['recipe_fingerprint']})")
+    print(f"Throughput: {run['throughput']} images/s ({run['wall_s']} s, {run['workers']} workers)")
+    print(f"{'set':<5} {'images':>7} {'decoded':>8} {'code recall':>12} {'image recall':>13} {'false reads':>12}")
+    for label_set, stats in run['summary'].items():
+        code_recall = '-' if stats['code_recall'] is None else f"{stats['code_recall']:.2%}"
+        image_recall = '-' if stats['image_recall'] is None else f"{stats['image_recall']:.2%}"
+        print(f"{label_set:<5} {stats['images']:>7} {stats['decoded_images']:>8} {code_recall:>12} "
+              f"{image_recall:>13} {stats['false_reads']:>12}")
+    print(f"{'stage (ms)':<12} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, stats in run['latency_ms'].items():
+        print(f"{name:<12} {stats['mean']:>9.2f} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f}")
+
+
+def print_diff(base: dict, new: dict):
+    """In chênh lệch giữa hai lần chạy và các ảnh đổi trạng thái"""
+    def line(label, old, cur, fmt="{:.2f}"):
+        if old is None or cur is None:
+            print(f"{label:<28} {str(old):>10} {str(cur):>10}")
+            return
+        delta = cur - old
+        print(f"{label:<28} {fmt.format(old):>10} {fmt.format(cur):>10} {('+' if delta >= 0 else '') + fmt.format(delta):>10}")
+
+    print(f"Recipe: {base.get('recipe_source', '?')} ({base.get('recipe_fingerprint', '?')}) -> "
+          f"{new.get('recipe_source', '?')} ({new.get('recipe_fingerprint', '?')})")
+    print(f"{'metric':<28} {'base':>10} {'new':>10} {'delta':>10}")
+    line("throughput (images/s)", base['throughput'], new['throughput'])
+    for label_set in new['summary']:
+        old_stats = base['summary'].get(label_set, {})
+        new_stats = new['summary'][label_set]
+        line(f"{label_set} code recall", old_stats.get('code_recall'), new_stats['code_recall'], "{:.4f}")
+        line(f"{label_set} image recall", old_stats.get('image_recall'), new_stats['image_recall'], "{:.4f}")
+        line(f"{label_set} false reads", old_stats.get('false_reads'), new_stats['false_reads'], "{:.0f}")
+    for name, stats in new['latency_ms'].items():
+        old_stats = base['latency_ms'].get(name, {})
+        for key in ('p50', 'p95', 'p99'):
+            line(f"{name} {key} (ms)", old_stats.get(key), stats[key])
+
+    old_rows = {row['path']: row for row in base['images']}
+    changed = []
+    for row in new['images']:
+        old = old_rows.get(row['path'])
+        if old is None:
+            continue
+        if set(old['hits']) != set(row['hits']) or set(old['false_reads']) != set(row['false_reads']):
+            changed.append((old, row))
+    if changed:
+        print(f"\n{len(changed)} images changed:")
+        for old, row in changed:
+            print(f"  {row['path']}: hits {old['hits']} -> {row['hits']}, "
+                  f"false reads {old['false_reads']} -> {row['false_reads']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline giải mã trên bộ ảnh OK/NG")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    manifest_cmd = sub.add_parser("manifest", help="Tạo manifest ground truth")
+    manifest_cmd.add_argument("--images", default=DEFAULT_IMAGE_ROOT, help="Thư mục chứa OK/ và NG/")
+    manifest_cmd.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    manifest_cmd.add_argument("--bootstrap", action="store_true",
+                              help="Điền mã cho ảnh OK bằng giải mã vét cạn (cần kiểm tra lại bằng tay)")
+    manifest_cmd.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+
+    run_cmd = sub.add_parser("run", help="Chạy benchmark")
+    run_cmd.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    run_cmd.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    run_cmd.add_argument("--out", help="Lưu kết quả chi tiết ra file JSON để diff sau")
+    source = run_cmd.add_mutually_exclusive_group()
+    source.add_argument("--model", choices=MODELS,
+                        help="Dùng recipe đã lưu của model (kèm loại kiểm tra và ROI của teaching)")
+    source.add_argument("--recipe", help="Dùng recipe trong file JSON")
+    # Các tùy chọn dưới đây ghi đè lên recipe đang dùng, chỉ khi được truyền vào
+    run_cmd.add_argument("--strategies", help="Thứ tự cascade, ví dụ: gray,otsu,adaptive,upscale")
+    run_cmd.add_argument("--localize", action=argparse.BooleanOptionalAction,
+                         help="Bật / tắt bước khoanh vùng barcode")
+    run_cmd.add_argument("--symbols", help="Chỉ quét các symbology này, ví dụ: CODE128,CODE39")
+    run_cmd.add_argument("--pyramid", metavar="LEVELS", help="Các mức pyramid, ví dụ: 0.5,0.75")
+    run_cmd.add_argument("--expected-codes", type=int, metavar="N",
+                         help="Số mã trên label: cascade dừng khi đã đọc đủ N mã")
+
+    diff_cmd = sub.add_parser("diff", help="So sánh hai lần chạy")
+    diff_cmd.add_argument("base")
+    diff_cmd.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "manifest":
+        build_manifest(args.images, args.manifest, args.bootstrap, max(1, args.workers))
+    elif args.command == "run":
+        if args.model:
+            recipe, source = compile_inspection(args.model), f"model {args.model}"
+        elif args.recipe:
+            recipe, source = load_recipe_arg(args.recipe), args.recipe
+        else:
+            recipe, source = dict(DEFAULT_RECIPE), "default"
+        if args.localize is not None:
+            recipe['localize'] = args.localize
+        if args.symbols:
+            recipe['symbols'] = parse_symbols(args.symbols)
+        if args.pyramid:
+            recipe['pyramid'] = parse_levels(args.pyramid)
+        if args.expected_codes:
+            recipe['expected_codes'] = args.expected_codes
+        if args.strategies:
+            recipe['strategies'] = [name.strip() for name in args.strategies.split(",") if name.strip()]
+        run = run_benchmark(args.manifest, max(1, args.workers), recipe, source)
+        print_report(run)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(run, f, ensure_ascii=False, indent=1)
+    else:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        print_diff(base, new)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
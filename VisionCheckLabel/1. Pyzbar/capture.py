@@ -0,0 +1,310 @@
+"""Nguồn ảnh trực tiếp từ camera, đưa frame thẳng vào pipeline không qua file PNG
+
+Frame được ghi vào FrameRing: một khối bộ nhớ cấp phát sẵn gồm `slots` ảnh xám
+cùng kích thước. Thread chụp lấy một slot trống, ghi ảnh vào đó rồi đưa sang
+hàng đợi frame sẵn sàng; bên xử lý dùng xong thì trả slot lại. Hết slot trống
+(xử lý chậm hơn camera) thì frame mới bị bỏ và được đếm, không cấp phát thêm.
+
+Các nguồn:
+    PylonCaptureSource   camera Basler qua pypylon (tùy chọn)
+    ReplayCaptureSource  phát lại ảnh có sẵn trên đĩa, dùng để thử không cần camera
+"""
+import abc
+import queue
+import threading
+import time
+
+import numpy as np
+
+from ingest import read_gray
+
+
+class Frame:
+    """Một slot của FrameRing đang được bên xử lý giữ; gọi release() (hoặc dùng with) khi xong"""
+
+    def __init__(self, ring, index: int, meta: dict):
+        self.ring = ring
+        self.index = index
+        self.image = ring.slot(index)
+        self.meta = meta
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.image = None
+            self.ring.release(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FrameRing:
+    """slots ảnh xám uint8 cấp phát một lần, luân chuyển qua hai hàng đợi slot trống / frame sẵn sàng"""
+
+    def __init__(self, slots: int, shape: tuple):
+        self.shape = tuple(shape)
+        self._buffer = np.empty((slots,) + self.shape, dtype=np.uint8)
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        for index in range(slots):
+            self._free.put(index)
+        self.dropped = 0
+
+    def slot(self, index: int) -> np.ndarray:
+        return self._buffer[index]
+
+    def acquire(self, timeout: float = None):
+        """Lấy một slot trống để ghi; None nếu mọi slot đang bận (timeout=None: không chờ)"""
+        try:
+            if timeout is None:
+                return self._free.get_nowait()
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def publish(self, index: int, meta: dict):
+        self._ready.put((index, meta))
+
+    def release(self, index: int):
+        self._free.put(index)
+
+    def get(self, timeout: float = None):
+        """Frame sẵn sàng tiếp theo, None nếu hết timeout"""
+        try:
+            item = self._ready.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is None:
+            return None
+        index, meta = item
+        return Frame(self, index, meta)
+
+    def close(self):
+        """Đánh thức bên đang chờ get()"""
+        self._ready.put(None)
+
+
+class CaptureSource(abc.ABC):
+    """Nguồn frame chạy trên thread riêng; lớp con cài open() / grab() (và close() nếu cần)"""
+
+    def __init__(self, slots: int = 4, drop_when_full: bool = True):
+        self.slots = slots
+        # Camera không chờ được nên bỏ frame; nguồn phát lại thì có thể chờ slot trống
+        self.drop_when_full = drop_when_full
+        self.ring = None
+        self.frames_captured = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._scratch = None
+
+    @abc.abstractmethod
+    def open(self) -> tuple:
+        """Mở thiết bị, trả về shape (cao, rộng) của ảnh"""
+
+    @abc.abstractmethod
+    def grab(self, out: np.ndarray):
+        """Ghi một ảnh vào out, trả về dict metadata; None nếu chưa có ảnh; raise StopIteration khi hết nguồn"""
+
+    def close(self):
+        pass
+
+    def start(self):
+        shape = self.open()
+        self.ring = FrameRing(self.slots, shape)
+        self._scratch = np.empty(shape, dtype=np.uint8)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                index = self.ring.acquire()
+                while index is None and not self.drop_when_full and not self._stop.is_set():
+                    index = self.ring.acquire(timeout=0.1)
+                if index is None and self._stop.is_set():
+                    break
+                out = self._scratch if index is None else self.ring.slot(index)
+                try:
+                    meta = self.grab(out)
+                except StopIteration:
+                    if index is not None:
+                        self.ring.release(index)
+                    break
+                if meta is None:
+                    if index is not None:
+                        self.ring.release(index)
+                    continue
+                self.frames_captured += 1
+                if index is None:
+                    # Vẫn phải lấy ảnh ra khỏi camera, nhưng không còn slot để giữ lại
+                    self.ring.dropped += 1
+                    continue
+                meta.setdefault('seq', self.frames_captured)
+                meta.setdefault('timestamp', time.time())
+                self.ring.publish(index, meta)
+        finally:
+            self.close()
+            self.ring.close()
+
+    def frames(self, timeout: float = 0.5):
+        """Sinh các Frame cho tới khi nguồn dừng; bên nhận phải release() từng frame"""
+        while True:
+            frame = self.ring.get(timeout)
+            if frame is not None:
+                yield frame
+            elif self._thread is None or not self._thread.is_alive():
+                return
+
+    def snapshot(self, timeout: float = 2.0):
+        """Lấy một bản sao của frame kế tiếp (ví dụ ảnh mẫu cho teaching), None nếu quá timeout"""
+        frame = self.ring.get(timeout)
+        if frame is None:
+            return None
+        with frame:
+            return frame.image.copy(), frame.meta
+
+
+class ReplayCaptureSource(CaptureSource):
+    """Phát lại danh sách file ảnh như một camera (ảnh khác kích thước ảnh đầu tiên bị bỏ qua)
+
+    Có fps thì phát đúng nhịp và bỏ frame khi ring đầy như camera thật; không có
+    fps thì phát nhanh nhất có thể và chờ slot trống, không bỏ frame nào.
+    """
+
+    def __init__(self, paths, fps: float = None, loop: bool = False, slots: int = 4):
+        super().__init__(slots, drop_when_full=bool(fps))
+        self.paths = list(paths)
+        self.fps = fps
+        self.loop = loop
+        self._position = 0
+        self._next_time = 0.0
+
+    def open(self):
+        if not self.paths:
+            raise RuntimeError("Replay source has no image")
+        first = read_gray(self.paths[0])
+        if first is None:
+            raise RuntimeError(f"Cannot read image: {self.paths[0]}")
+        return first.shape
+
+    def grab(self, out):
+        if self._position >= len(self.paths):
+            if not self.loop:
+                raise StopIteration
+            self._position = 0
+        path = self.paths[self._position]
+        self._position += 1
+
+        if self.fps:
+            delay = self._next_time - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            self._next_time = time.perf_counter() + 1.0 / self.fps
+
+        gray = read_gray(path)
+        if gray is None or gray.shape != out.shape:
+            return None
+        np.copyto(out, gray)
+        return {'path': path}
+
+
+class PylonCaptureSource(CaptureSource):
+    """Camera Basler qua pypylon, ảnh Mono8 được chép thẳng từ buffer của pylon vào slot"""
+
+    def __init__(self, serial_number: str = None, exposure_us: float = None, software_trigger: bool = False,
+                 timeout_ms: int = 1000, slots: int = 4):
+        super().__init__(slots)
+        self.serial_number = serial_number
+        self.exposure_us = exposure_us
+        self.software_trigger = software_trigger
+        self.timeout_ms = timeout_ms
+        self.camera = None
+        self._pylon = None
+
+    def open(self):
+        try:
+            from pypylon import pylon
+        except ImportError:
+            raise RuntimeError("Camera Basler cần thư viện pypylon: pip install pypylon") from None
+        self._pylon = pylon
+
+        factory = pylon.TlFactory.GetInstance()
+        if self.serial_number:
+            devices = [device for device in factory.EnumerateDevices()
+                       if device.GetSerialNumber() == self.serial_number]
+            if not devices:
+                raise RuntimeError(f"Camera {self.serial_number} not found")
+            device = factory.CreateDevice(devices[0])
+        else:
+            device = factory.CreateFirstDevice()
+        camera = pylon.InstantCamera(device)
+        camera.Open()
+
+        # Chụp thẳng ảnh xám 8 bit: không phải chuyển màu trước khi giải mã. grab() chép
+        # buffer vào slot xám một kênh nên camera không có Mono8 (camera màu) thì không dùng được
+        formats = camera.PixelFormat.GetSymbolics()
+        if "Mono8" not in formats:
+            camera.Close()
+            raise RuntimeError(f"Camera does not support PixelFormat Mono8 (available: {', '.join(formats)})")
+        camera.PixelFormat.SetValue("Mono8")
+        if self.exposure_us is not None:
+            # Camera đời mới dùng ExposureTime, đời cũ (GigE) dùng ExposureTimeAbs
+            node = camera.ExposureTime if hasattr(camera, 'ExposureTime') else camera.ExposureTimeAbs
+            node.SetValue(float(self.exposure_us))
+        if self.software_trigger:
+            camera.TriggerSelector.SetValue("FrameStart")
+            camera.TriggerMode.SetValue("On")
+            camera.TriggerSource.SetValue("Software")
+
+        camera.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
+        self.camera = camera
+        return camera.Height.GetValue(), camera.Width.GetValue()
+
+    def trigger(self):
+        """Phát software trigger (khi mở với software_trigger=True)"""
+        if self.camera.WaitForFrameTriggerReady(self.timeout_ms, self._pylon.TimeoutHandling_Return):
+            self.camera.ExecuteSoftwareTrigger()
+
+    def grab(self, out):
+        pylon = self._pylon
+        result = self.camera.RetrieveResult(self.timeout_ms, pylon.TimeoutHandling_Return)
+        if result is None or not result.IsValid():
+            return None
+        try:
+            if not result.GrabSucceeded():
+                return None
+            with result.GetArrayZeroCopy() as array:
+                if array.shape != out.shape:
+                    return None
+                np.copyto(out, array)
+            return {'block_id': result.BlockID, 'camera_timestamp': result.TimeStamp}
+        finally:
+            result.Release()
+
+    def close(self):
+        if self.camera is not None:
+            if self.camera.IsGrabbing():
+                self.camera.StopGrabbing()
+            self.camera.Close()
+            self.camera = None
+
+
+def open_source(kind: str, **options) -> CaptureSource:
+    """'pylon' hoặc 'replay' -> nguồn đã start()"""
+    if kind == 'pylon':
+        return PylonCaptureSource(**options).start()
+    if kind == 'replay':
+        return ReplayCaptureSource(**options).start()
+    raise ValueError(f"Unknown capture source: {kind}")
@@ -0,0 +1,145 @@
+"""Cache kết quả giải mã theo nội dung ảnh + recipe tiền xử lý
+
+Khóa = hash nội dung file ảnh, kèm fingerprint của recipe. Tầng 1 là LRU trong
+bộ nhớ, tầng 2 (tùy chọn) là SQLite trên đĩa để dùng lại giữa các lần chạy và
+giữa các process. Cả hai tầng đều khóa theo (hash, fingerprint) nên không bao
+giờ trả về kết quả của recipe khác; get / put nhận fingerprint của recipe đã
+dùng, mặc định là recipe đặt bằng set_recipe. Đổi recipe thì LRU bị xóa, các
+dòng SQLite của recipe khác vẫn giữ (các process / model dùng chung file không
+xóa cache của nhau). File SQLite được giới hạn max_rows dòng, bỏ các dòng ghi lâu nhất.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def recipe_fingerprint(recipe: dict) -> str:
+    """Fingerprint ổn định của recipe (không phụ thuộc thứ tự key)"""
+    payload = json.dumps(recipe, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class DecodeCache:
+    # Số lần put giữa hai lần dọn file SQLite
+    PRUNE_EVERY = 1000
+
+    def __init__(self, recipe: dict, capacity: int = 256, db_path: str = None, max_rows: int = 100000):
+        self.capacity = capacity
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        self.fingerprint = None
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS decode_cache ("
+                " content_hash TEXT NOT NULL,"
+                " recipe TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " stored_at REAL NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (content_hash, recipe))")
+            # File tạo bởi phiên bản trước chưa có cột stored_at
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(decode_cache)")}
+            if 'stored_at' not in columns:
+                self._db.execute("ALTER TABLE decode_cache ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+            self._db.execute("CREATE INDEX IF NOT EXISTS decode_cache_stored_at ON decode_cache (stored_at)")
+            self._db.commit()
+            self.prune()
+
+        self.set_recipe(recipe)
+
+    def set_recipe(self, recipe: dict):
+        """Đổi recipe; nếu tham số thay đổi thì không dùng kết quả của recipe cũ nữa"""
+        fingerprint = recipe_fingerprint(recipe)
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return
+            self.fingerprint = fingerprint
+            self._entries.clear()
+
+    def get(self, key: str, fingerprint: str = None):
+        """Trả về bản ghi kết quả đã lưu hoặc None
+
+        fingerprint là recipe_fingerprint của recipe đã dùng để giải mã; mặc định là
+        recipe đặt bằng set_recipe.
+        """
+        fingerprint = fingerprint or self.fingerprint
+        with self._lock:
+            result = self._entries.get((key, fingerprint))
+            if result is not None:
+                self._entries.move_to_end((key, fingerprint))
+                self.hits += 1
+                return result
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result FROM decode_cache WHERE content_hash = ? AND recipe = ?",
+                    (key, fingerprint)).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember((key, fingerprint), result)
+                    self.hits += 1
+                    return result
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, result: dict, fingerprint: str = None):
+        fingerprint = fingerprint or self.fingerprint
+        with self._lock:
+            self._remember((key, fingerprint), result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO decode_cache (content_hash, recipe, result, stored_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, fingerprint, json.dumps(result, ensure_ascii=False), time.time()))
+                self._db.commit()
+                self._puts += 1
+        if self._puts >= self.PRUNE_EVERY:
+            self.prune()
+
+    def prune(self):
+        """Giữ tối đa max_rows dòng trong file SQLite (mọi recipe), bỏ các dòng ghi lâu nhất"""
+        with self._lock:
+            if self._db is None:
+                return
+            self._puts = 0
+            self._db.execute(
+                "DELETE FROM decode_cache WHERE rowid IN"
+                " (SELECT rowid FROM decode_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,))
+            self._db.commit()
+
+    def _remember(self, key: tuple, result: dict):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'size': len(self._entries),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,78 @@
+"""Nạp ảnh thẳng vào buffer xám 1 kênh uint8 và tái sử dụng buffer giữa các frame
+
+Mỗi thread giữ một bộ WorkBuffers riêng: buffer chỉ được cấp lại khi frame mới
+lớn hơn mọi frame trước đó, nên ở chế độ chạy ổn định (cùng độ phân giải camera)
+không còn cấp phát bộ nhớ cho file, ảnh crop hay ảnh tiền xử lý.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+# reduce -> cờ imdecode; libjpeg giải mã thẳng ở độ phân giải 1/2, 1/4, 1/8
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+_local = threading.local()
+
+
+class WorkBuffers:
+    """Các buffer uint8 đặt tên, chỉ lớn lên chứ không bao giờ cấp phát lại cho frame nhỏ hơn"""
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape) -> np.ndarray:
+        """Trả về view liên tục (C-contiguous) có đúng shape, dùng chung bộ nhớ với lần gọi trước"""
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=np.uint8)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+    def copy(self, name, image: np.ndarray) -> np.ndarray:
+        """Chép image (thường là view crop không liên tục) vào buffer name"""
+        out = self.get(name, image.shape)
+        np.copyto(out, image)
+        return out
+
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+
+def work_buffers() -> WorkBuffers:
+    """WorkBuffers của thread hiện tại"""
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = WorkBuffers()
+    return buffers
+
+
+def read_bytes(image_path: str, buffers: WorkBuffers = None) -> np.ndarray:
+    """Đọc nguyên file vào buffer 'file' (không cấp phát mới nếu buffer đã đủ lớn)"""
+    buffers = buffers or work_buffers()
+    with open(image_path, 'rb', buffering=0) as f:
+        size = f.seek(0, 2)
+        f.seek(0)
+        data = buffers.get('file', (size,))
+        read = f.readinto(data)
+    return data[:read]
+
+
+def decode_gray(data: np.ndarray, reduce: int = 1):
+    """Giải mã bytes ảnh thẳng sang ảnh xám (không qua ảnh BGR), None nếu hỏng"""
+    try:
+        flag = _REDUCED_FLAGS[reduce]
+    except KeyError:
+        raise ValueError(f"load_reduce must be one of {sorted(_REDUCED_FLAGS)}, got {reduce}") from None
+    return cv2.imdecode(data, flag)
+
+
+def read_gray(image_path: str, reduce: int = 1):
+    """Đọc file ảnh thành ảnh xám uint8 liên tục"""
+    return decode_gray(read_bytes(image_path), reduce)
@@ -1,44 +1,147 @@
 from pyzbar.pyzbar import decode, Decoded
-from PIL import Image
 import cv2
-import numpy as np
+import argparse
+import collections
+import functools
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
 
-flThresh = 150
-maxVal = 250
+from pipeline import DEFAULT_RECIPE, preprocess, decode_file, is_image_file
+from decode_cache import DecodeCache
 
 image_path = "image/081734_label.png"
-image = cv2.imread(image_path)
 
-gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+# Cache riêng của từng process worker (tầng SQLite dùng chung qua file)
+_cache = None
 
-blurred = cv2.GaussianBlur(gray, (3,3), 0)
 
-thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                               cv2.THRESH_BINARY, 11, 2)
+def iter_image_paths(inputs):
+    """Mở rộng danh sách thư mục / glob / file thành danh sách file ảnh"""
+    for item in inputs:
+        if os.path.isdir(item):
+            paths = sorted(os.path.join(item, name) for name in os.listdir(item))
+        else:
+            paths = sorted(glob.glob(item, recursive=True))
+        for path in paths:
+            if is_image_file(path):
+                yield path
 
 
-decode_objects: list[Decoded] = decode(thresh)
+def parse_symbols(text):
+    """'CODE128,CODE39' -> ['CODE128', 'CODE39']; rỗng -> None (quét tất cả)"""
+    if not text:
+        return None
+    return [name.strip().upper() for name in text.split(",") if name.strip()]
 
-for obj in decode_objects:
-    print(f"Type: {obj.type}, Data: {obj.data.decode('utf-8')}")
 
-cv2.imshow("Process Image", thresh)
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+def parse_levels(text):
+    """'0.5,0.75' -> [0.5, 0.75]; rỗng -> None (chỉ ảnh gốc)"""
+    if not text:
+        return None
+    return [float(level) for level in text.split(",") if level.strip()]
 
-# barcodeOriginal: list[Decoded] = decode(Image.open(image_path))
-# barcodeProcess: list[Decoded] = decode(thresh)
 
-# all_barcodes = barcodeOriginal + barcodeProcess
-# unique_data = set()
+def init_worker(recipe=None, cache_db=None):
+    global _cache
+    # Mỗi process đã chiếm một core, tắt thread nội bộ của OpenCV để tránh tranh CPU
+    cv2.setNumThreads(1)
+    if cache_db:
+        _cache = DecodeCache(recipe or DEFAULT_RECIPE, db_path=cache_db)
 
-# print("Detected Barcode: ")
 
-# for barcode in all_barcodes:
-#     data = barcode.data.decode("utf-8")
-#     if data is not unique_data:
-#         unique_data.add(data)
-#         print(f"Type: {barcode.type}, Data: {data}")
+def decode_task(path, recipe):
+    return decode_file(path, recipe, cache=_cache)
 
-# if not all_barcodes:
-#     print("No barcode detect")
+
+def run_batch(inputs, workers, chunksize, recipe, cache_db=None):
+    """Giải mã song song toàn bộ ảnh, in mỗi ảnh một dòng JSON ra stdout"""
+    paths = list(iter_image_paths(inputs))
+    if not paths:
+        print("No image found", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    decoded_count = 0
+    cache_hits = 0
+    winners = collections.Counter()
+    scales = collections.Counter()
+    task = functools.partial(decode_task, recipe=recipe)
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(recipe, cache_db)) as pool:
+        for result in pool.imap_unordered(task, paths, chunksize=chunksize):
+            decoded_count += result['ok']
+            cache_hits += result.get('cached', False)
+            winners[result['strategy']] += 1
+            if result.get('scale') is not None:
+                scales[result['scale']] += 1
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+
+    elapsed = time.perf_counter() - start
+    print(f"Decoded {decoded_count}/{len(paths)} images in {elapsed:.2f}s "
+          f"({len(paths) / elapsed:.1f} images/s, {workers} workers)", file=sys.stderr)
+    if cache_db:
+        print(f"Cache: {cache_hits} hits, {len(paths) - cache_hits} misses ({cache_db})", file=sys.stderr)
+    print("Winning strategy: " + ", ".join(f"{name}={count}" for name, count in winners.most_common()),
+          file=sys.stderr)
+    if recipe.get('pyramid'):
+        print("Pyramid level: " + ", ".join(f"{scale:g}={count}" for scale, count in sorted(scales.items())),
+              file=sys.stderr)
+    return 0
+
+
+def show_single(path):
+    """Chế độ cũ: giải mã một ảnh và hiển thị ảnh sau xử lý"""
+    image = cv2.imread(path)
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    thresh = preprocess(gray)
+
+    decode_objects: list[Decoded] = decode(thresh)
+
+    for obj in decode_objects:
+        print(f"Type: {obj.type}, Data: {obj.data.decode('utf-8')}")
+
+    cv2.imshow("Process Image", thresh)
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Giải mã barcode trên label")
+    parser.add_argument("inputs", nargs="*",
+                        help="Thư mục hoặc glob ảnh cần giải mã (bỏ trống để xem một ảnh mẫu)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Số process giải mã (mặc định: số core)")
+    parser.add_argument("--chunksize", type=int, default=4,
+                        help="Số ảnh giao cho mỗi process một lần")
+    parser.add_argument("--strategies", default=",".join(DEFAULT_RECIPE['strategies']),
+                        help="Thứ tự cascade, ví dụ: gray,otsu,adaptive,upscale")
+    parser.add_argument("--localize", action=argparse.BooleanOptionalAction, default=DEFAULT_RECIPE['localize'],
+                        help="Khoanh vùng barcode trước, chỉ giải mã toàn ảnh khi các vùng chưa đủ "
+                             "--expected-codes mã")
+    parser.add_argument("--expected-codes", type=int, metavar="N",
+                        help="Số mã trên label: cascade dừng khi đã đọc đủ N mã (mặc định: chạy hết)")
+    parser.add_argument("--symbols",
+                        help="Chỉ quét các symbology này, ví dụ: CODE128,CODE39 (mặc định: tất cả)")
+    parser.add_argument("--pyramid", metavar="LEVELS",
+                        help="Giải mã ảnh thu nhỏ trước, ví dụ: 0.5,0.75 (ảnh gốc luôn là mức cuối)")
+    parser.add_argument("--cache", metavar="DB",
+                        help="File SQLite cache kết quả theo nội dung ảnh + recipe")
+    args = parser.parse_args()
+
+    if not args.inputs:
+        show_single(image_path)
+        return 0
+    recipe = dict(DEFAULT_RECIPE, strategies=[name.strip() for name in args.strategies.split(",") if name.strip()],
+                  localize=args.localize, expected_codes=args.expected_codes, symbols=parse_symbols(args.symbols),
+                  pyramid=parse_levels(args.pyramid))
+    return run_batch(args.inputs, max(1, args.workers), max(1, args.chunksize), recipe, args.cache)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""So mã đọc được với danh sách S/N dự kiến (ví dụ S/N của một lệnh sản xuất)
+
+Ba kiểu so sánh của teaching, mỗi kiểu một chỉ mục dựng một lần khi nạp danh sách:
+    exact     mã trùng hẳn một S/N               -> hash set
+    prefix    mã bắt đầu bằng một S/N             -> trie
+    contains  mã chứa một S/N ở vị trí bất kỳ     -> automaton Aho-Corasick
+Mỗi lần kiểm tra chỉ duyệt các ký tự của mã, không phụ thuộc số S/N trong danh sách.
+S/N đã khớp với một label PASS được đánh dấu đã dùng để phát hiện label in trùng.
+
+Ví dụ:
+    python matcher.py serials.txt S516C00933 --mode contains
+"""
+import argparse
+import sys
+import threading
+from collections import deque
+
+MATCH_MODES = ('exact', 'prefix', 'contains')
+
+# "Kiểu so sánh" trong hộp thoại teaching -> kiểu của SerialMatcher
+TEACHING_MODES = {
+    "Chính xác 100%": 'exact',
+    "Phần đầu giống nhau": 'prefix',
+    "Chứa chuỗi": 'contains',
+}
+
+
+def match_code(value: str, code: str, mode: str = 'exact') -> bool:
+    """So một giá trị (S/N, Model) với đúng một mã theo kiểu so sánh"""
+    if mode == 'exact':
+        return code == value
+    if mode == 'prefix':
+        return code.startswith(value)
+    if mode == 'contains':
+        return value in code
+    raise ValueError(f"Unknown match mode: {mode}")
+
+
+class _Trie:
+    """Trie ký tự; node là dict con, key None đánh dấu cuối một S/N"""
+
+    def __init__(self, serials):
+        self.root = {}
+        for serial in serials:
+            node = self.root
+            for char in serial:
+                node = node.setdefault(char, {})
+            node[None] = serial
+
+    def prefixes_of(self, code: str) -> list[str]:
+        """Các S/N là phần đầu của code, ngắn trước"""
+        found = []
+        node = self.root
+        for char in code:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                found.append(node[None])
+        return found
+
+
+class _AhoCorasick:
+    """Automaton Aho-Corasick: tìm mọi S/N xuất hiện trong code trong một lần duyệt"""
+
+    def __init__(self, serials):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for serial in serials:
+            state = 0
+            for char in serial:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append(serial)
+
+        # Duyệt theo chiều rộng để node nông có fail trước node sâu
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, child in self.goto[state].items():
+                pending.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def occurrences_in(self, code: str) -> list[str]:
+        """Các S/N xuất hiện trong code (không trùng lặp), theo thứ tự kết thúc trong code"""
+        found = []
+        state = 0
+        for char in code:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for serial in self.output[state]:
+                if serial not in found:
+                    found.append(serial)
+        return found
+
+
+class SerialMatcher:
+    """Chỉ mục của danh sách S/N cho một kiểu so sánh, kèm trạng thái S/N đã dùng"""
+
+    def __init__(self, serials, mode: str = 'exact', source: str = None):
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {mode}")
+        self.mode = mode
+        self.source = source  # file danh sách S/N (nếu nạp từ file)
+        self.serials = {serial.strip() for serial in serials if serial and serial.strip()}
+        self._consumed = set()
+        self._lock = threading.Lock()
+        self._trie = _Trie(self.serials) if mode == 'prefix' else None
+        self._automaton = _AhoCorasick(self.serials) if mode == 'contains' else None
+
+    def __len__(self):
+        return len(self.serials)
+
+    def find(self, code: str) -> list[str]:
+        """Các S/N khớp với một mã theo kiểu so sánh của matcher"""
+        if self.mode == 'exact':
+            return [code] if code in self.serials else []
+        if self.mode == 'prefix':
+            return self._trie.prefixes_of(code)
+        return self._automaton.occurrences_in(code)
+
+    def check(self, codes) -> dict:
+        """Tìm S/N khớp trong các mã của một label
+
+        Trả về {'serial': S/N khớp hoặc None, 'code': mã chứa S/N đó, 'consumed': S/N đã
+        dùng cho label trước chưa}. S/N chưa dùng được ưu tiên hơn S/N đã dùng.
+        """
+        used = None
+        for code in codes:
+            for serial in self.find(code):
+                if not self.is_consumed(serial):
+                    return {'serial': serial, 'code': code, 'consumed': False}
+                if used is None:
+                    used = {'serial': serial, 'code': code, 'consumed': True}
+        return used or {'serial': None, 'code': None, 'consumed': False}
+
+    def is_consumed(self, serial: str) -> bool:
+        with self._lock:
+            return serial in self._consumed
+
+    def consume(self, serial: str) -> bool:
+        """Đánh dấu S/N đã dùng; False nếu nó đã được dùng trước đó"""
+        with self._lock:
+            if serial in self._consumed:
+                return False
+            self._consumed.add(serial)
+            return True
+
+    def consumed_count(self) -> int:
+        with self._lock:
+            return len(self._consumed)
+
+    def reset(self):
+        """Bỏ đánh dấu mọi S/N (bắt đầu lại lệnh sản xuất)"""
+        with self._lock:
+            self._consumed.clear()
+
+
+def load_serials(path: str) -> list[str]:
+    """Đọc danh sách S/N: mỗi dòng một S/N (file CSV thì lấy cột đầu), bỏ dòng trống và dòng '#'"""
+    serials = []
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            value = line.split(",", 1)[0].strip()
+            if value and not value.startswith("#"):
+                serials.append(value)
+    return serials
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra mã với danh sách S/N dự kiến")
+    parser.add_argument("serials", help="File danh sách S/N, mỗi dòng một S/N")
+    parser.add_argument("codes", nargs="+", help="Các mã đọc được trên label")
+    parser.add_argument("--mode", choices=MATCH_MODES, default='exact')
+    args = parser.parse_args()
+
+    matcher = SerialMatcher(load_serials(args.serials), args.mode, source=args.serials)
+    result = matcher.check(args.codes)
+    print(f"{len(matcher)} serials, mode={args.mode}: "
+          + (f"matched {result['serial']} in {result['code']}" if result['serial'] else "no match"))
+    return 0 if result['serial'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
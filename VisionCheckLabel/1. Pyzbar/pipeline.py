@@ -0,0 +1,523 @@
+"""Pipeline giải mã barcode dùng chung cho script đơn ảnh và chế độ batch"""
+import functools
+import math
+import os
+import time
+from contextlib import contextmanager
+
+import cv2
+from pyzbar.pyzbar import Decoded, ZBarSymbol
+from pyzbar.locations import Point, Rect
+
+from decode_cache import content_hash, recipe_fingerprint
+from ingest import WorkBuffers, decode_gray, read_bytes, work_buffers
+from zbar_scanner import scan
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Thứ tự cascade: chiến lược rẻ nhất trước, chỉ ảnh khó mới phải chạy các bước sau
+DEFAULT_RECIPE = {
+    'strategies': ['gray', 'otsu', 'adaptive', 'upscale'],
+    'blur': 3,
+    'block_sizes': [11, 21, 31],
+    'C': 2,
+    'upscale': 2.0,
+    # Vùng ROI [x, y, rộng, cao] theo pixel ảnh gốc, cắt ra trước mọi bước tiền xử lý.
+    # None = giải mã toàn ảnh. Lưu trong recipe của model từ hộp thoại teaching.
+    'roi': None,
+    # Nạp ảnh ở độ phân giải 1/load_reduce (1, 2, 4, 8), tọa độ mã vẫn trả về theo ảnh gốc
+    'load_reduce': 1,
+    # Pyramid: các mức tỉ lệ (0 < mức <= 1) thử từ thô tới mịn, ảnh gốc luôn là mức cuối.
+    # None = chỉ giải mã ảnh gốc. Mức khởi đầu của từng model do pyramid.py học.
+    'pyramid': None,
+    # Ngưỡng cố định cho chiến lược 'binary' (không nằm trong cascade mặc định)
+    'threshold': 150,
+    'max_val': 250,
+    # Backend giải mã ('zbar' hoặc 'dmtx') và các symbology cần quét (None = tất cả)
+    'backend': 'zbar',
+    'symbols': None,
+    'dmtx_timeout_ms': 200,
+    # Số mã in trên label: cascade dừng ngay khi đã đọc đủ số mã này.
+    # None = chạy hết mọi chiến lược (và mọi mức pyramid) rồi gộp mã của tất cả.
+    'expected_codes': None,
+    # Khoanh vùng barcode trước khi giải mã (tỉ lệ ảnh dò, lề thêm quanh vùng, số vùng tối đa).
+    # Tắt mặc định: chưa đủ expected_codes mã thì vẫn phải giải mã toàn ảnh.
+    'localize': False,
+    'loc_scale': 0.5,
+    'loc_pad': 0.3,
+    'loc_max_regions': 6,
+}
+
+# Các stage được đo thời gian, theo thứ tự trong pipeline
+STAGES = ('load', 'cache', 'gray', 'roi', 'pyramid', 'localize', 'preprocess', 'decode')
+
+# Kernel đóng khoảng trắng giữa các vạch, tính trên ảnh đã thu nhỏ
+_CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 5))
+
+
+@contextmanager
+def stage(timings: dict, name: str):
+    """Cộng dồn thời gian (giây) của một stage vào timings; timings=None thì bỏ qua"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def timed(iterable, timings: dict, name: str):
+    """Bọc một generator lười để thời gian sinh từng phần tử được tính vào stage name"""
+    iterator = iter(iterable)
+    while True:
+        with stage(timings, name):
+            item = next(iterator, None)
+        if item is None:
+            return
+        yield item
+
+
+def percentile(values, pct: float):
+    """Phân vị pct (0-100) theo nearest-rank, None nếu không có giá trị"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+# Các hàm tiền xử lý nhận dst / blur_dst tùy chọn: buffer có sẵn cùng shape để ghi
+# kết quả vào, thay vì để OpenCV cấp phát ảnh mới cho mỗi frame
+
+
+def blur(gray, ksize: int, dst=None):
+    """GaussianBlur với kernel ksize (0 hoặc 1 = không làm mờ)"""
+    if ksize <= 1:
+        return gray
+    return cv2.GaussianBlur(gray, (ksize, ksize), 0, dst=dst)
+
+
+def adaptive(gray, block_size: int = 11, C: int = 2, ksize: int = 3, dst=None, blur_dst=None):
+    """Làm mờ nhẹ rồi nhị phân hóa thích nghi"""
+    return cv2.adaptiveThreshold(blur(gray, ksize, blur_dst), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, block_size, C, dst=dst)
+
+
+def otsu(gray, ksize: int = 3, dst=None, blur_dst=None):
+    """Nhị phân hóa toàn cục với ngưỡng Otsu"""
+    _, thresh = cv2.threshold(blur(gray, ksize, blur_dst), 0, 255,
+                              cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)
+    return thresh
+
+
+def binary(gray, threshold: int = 150, max_val: int = 250, ksize: int = 3, dst=None, blur_dst=None):
+    """Nhị phân hóa với ngưỡng cố định"""
+    _, thresh = cv2.threshold(blur(gray, ksize, blur_dst), threshold, max_val, cv2.THRESH_BINARY, dst=dst)
+    return thresh
+
+
+def upscale(gray, factor: float = 2.0, dst=None):
+    """Phóng to ảnh cho barcode có vạch quá mảnh"""
+    height, width = gray.shape[:2]
+    size = (int(round(width * factor)), int(round(height * factor)))
+    return cv2.resize(gray, size, dst=dst, interpolation=cv2.INTER_CUBIC)
+
+
+def preprocess(gray):
+    """Pipeline cố định cũ: GaussianBlur 3x3 + adaptiveThreshold 11/2"""
+    return adaptive(gray, 11, 2, 3)
+
+
+def localize(gray, recipe: dict = None) -> list[tuple]:
+    """Tìm các vùng nghi là barcode 1D bằng gradient + morphology
+
+    Barcode có gradient ngang mạnh hơn hẳn gradient dọc, nên lấy |Gx| - |Gy|,
+    làm mờ, nhị phân Otsu rồi đóng khe giữa các vạch thành khối. Trả về danh sách
+    (x, y, w, h) theo tọa độ ảnh gốc, vùng lớn nhất trước; rỗng nếu không thấy gì.
+    """
+    recipe = recipe or DEFAULT_RECIPE
+    scale = recipe['loc_scale']
+    height, width = gray.shape[:2]
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    grad_x = cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 1, 0, ksize=3))
+    grad_y = cv2.convertScaleAbs(cv2.Sobel(small, cv2.CV_16S, 0, 1, ksize=3))
+    gradient = cv2.blur(cv2.subtract(grad_x, grad_y), (7, 7))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _CLOSE_KERNEL)
+    mask = cv2.erode(mask, None, iterations=2)
+    mask = cv2.dilate(mask, None, iterations=2)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = 0.002 * small.shape[0] * small.shape[1]
+    pad = recipe['loc_pad']
+    rects = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        # Bỏ vùng quá nhỏ và vùng không nằm ngang (chữ, logo, cạnh label)
+        if w * h < min_area or w < 2 * h:
+            continue
+        pad_x, pad_y = int(w * pad) + 4, int(h * pad) + 4
+        x0 = max(0, int((x - pad_x) / scale))
+        y0 = max(0, int((y - pad_y) / scale))
+        x1 = min(width, int((x + w + pad_x) / scale))
+        y1 = min(height, int((y + h + pad_y) / scale))
+        rects.append((x0, y0, x1 - x0, y1 - y0))
+
+    rects.sort(key=lambda rect: rect[2] * rect[3], reverse=True)
+    return rects[:recipe['loc_max_regions']]
+
+
+def iter_candidates(gray, recipe: dict = None, buffers: WorkBuffers = None, slot: str = ''):
+    """Sinh lần lượt (tên chiến lược, ảnh, tỉ lệ so với gray) theo thứ tự cascade, chỉ tính khi cần
+
+    Nếu có buffers thì ảnh ứng viên được ghi vào buffer '<slot>blur' / '<slot>thresh'
+    / '<slot>upscale' và bị ghi đè ở ứng viên kế tiếp, nên phải dùng xong trước khi
+    lấy phần tử sau. slot phân biệt các ảnh được xử lý xen kẽ nhau (các vùng crop).
+    """
+    recipe = recipe or DEFAULT_RECIPE
+    shape = gray.shape
+    dst = blur_dst = None
+    if buffers is not None:
+        dst = buffers.get(slot + 'thresh', shape)
+        blur_dst = buffers.get(slot + 'blur', shape)
+    for strategy in recipe['strategies']:
+        if strategy == 'gray':
+            yield 'gray', gray, 1.0
+        elif strategy == 'otsu':
+            yield 'otsu', otsu(gray, recipe['blur'], dst, blur_dst), 1.0
+        elif strategy == 'binary':
+            yield 'binary', binary(gray, recipe['threshold'], recipe['max_val'], recipe['blur'], dst, blur_dst), 1.0
+        elif strategy == 'adaptive':
+            for block_size in recipe['block_sizes']:
+                yield (f'adaptive_{block_size}',
+                       adaptive(gray, block_size, recipe['C'], recipe['blur'], dst, blur_dst), 1.0)
+        elif strategy == 'upscale':
+            factor = recipe['upscale']
+            up_dst = None
+            if buffers is not None:
+                up_dst = buffers.get(slot + 'upscale', (int(round(shape[0] * factor)), int(round(shape[1] * factor))))
+            yield 'upscale', upscale(gray, factor, up_dst), factor
+        else:
+            raise ValueError(f"Unknown strategy: {strategy}")
+
+
+def _decode_dmtx(image, timeout_ms: int):
+    """Giải mã Data Matrix bằng libdmtx, trả về cùng kiểu Decoded như pyzbar"""
+    from pylibdmtx import pylibdmtx
+
+    height = image.shape[0]
+    results = []
+    for obj in pylibdmtx.decode(image, timeout=timeout_ms):
+        # libdmtx tính top từ đáy ảnh
+        left, bottom, width, rect_height = obj.rect
+        top = height - bottom - rect_height
+        results.append(Decoded(
+            data=obj.data, type='DATAMATRIX',
+            rect=Rect(left, top, width, rect_height),
+            polygon=[Point(left, top), Point(left + width, top),
+                     Point(left + width, top + rect_height), Point(left, top + rect_height)],
+            quality=0, orientation=None))
+    return results
+
+
+def make_decoder(recipe: dict = None):
+    """Biên dịch phần backend / symbols của recipe thành hàm decoder(image) -> list[Decoded]
+
+    Chỉ bật đúng các symbology cần quét giúp zbar bỏ qua các bộ giải mã còn lại.
+    """
+    recipe = recipe or DEFAULT_RECIPE
+    backend = recipe.get('backend', 'zbar')
+    if backend == 'zbar':
+        names = recipe.get('symbols')
+        if not names:
+            return scan
+        try:
+            symbols = tuple(ZBarSymbol[name] for name in names)
+        except KeyError as e:
+            raise ValueError(f"Unknown zbar symbology: {e.args[0]}") from None
+        return functools.partial(scan, symbols=symbols)
+    if backend == 'dmtx':
+        try:
+            from pylibdmtx import pylibdmtx  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Data Matrix cần thư viện pylibdmtx: pip install pylibdmtx") from None
+        return functools.partial(_decode_dmtx, timeout_ms=recipe.get('dmtx_timeout_ms', 200))
+    raise ValueError(f"Unknown decode backend: {backend}")
+
+
+def is_valid(obj: Decoded) -> bool:
+    """Mã hợp lệ: có dữ liệu và giải mã được UTF-8"""
+    if not obj.data:
+        return False
+    try:
+        obj.data.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def to_frame(obj: Decoded, scale: float = 1.0, offset: tuple = (0, 0)) -> Decoded:
+    """Đưa tọa độ của mã từ ảnh ứng viên (đã crop / phóng to) về tọa độ ảnh gốc"""
+    if scale == 1.0 and offset == (0, 0):
+        return obj
+    dx, dy = offset
+    polygon = [Point(int(p.x / scale) + dx, int(p.y / scale) + dy) for p in obj.polygon]
+    rect = Rect(int(obj.rect.left / scale) + dx, int(obj.rect.top / scale) + dy,
+                int(obj.rect.width / scale), int(obj.rect.height / scale))
+    return obj._replace(rect=rect, polygon=polygon)
+
+
+def same_symbol(a: Decoded, b: Decoded) -> bool:
+    """Hai lần đọc là cùng một mã: trùng dữ liệu, hoặc tâm của lần này nằm trong khung của lần kia"""
+    if (a.type, a.data) == (b.type, b.data):
+        return True
+
+    def inside(obj, other):
+        x = obj.rect.left + obj.rect.width / 2
+        y = obj.rect.top + obj.rect.height / 2
+        rect = other.rect
+        return rect.left <= x <= rect.left + rect.width and rect.top <= y <= rect.top + rect.height
+    return inside(a, b) or inside(b, a)
+
+
+def merge_codes(codes: list, decoded) -> bool:
+    """Thêm vào codes các mã hợp lệ chưa có (tọa độ ảnh gốc), trả về True nếu có mã mới
+
+    Ảnh nhị phân thỉnh thoảng đọc sai CODE128 ngay tại vị trí của một mã đã đọc
+    (ví dụ '"ARP\'14NC...' thay cho 'CARP514NC...'), nên mã nằm chồng lên mã đã có
+    bị bỏ qua: lần đọc của chiến lược đứng trước trong cascade được giữ lại.
+    """
+    added = False
+    for obj in decoded:
+        if is_valid(obj) and not any(same_symbol(obj, code) for code in codes):
+            codes.append(obj)
+            added = True
+    return added
+
+
+def is_complete(codes: list, recipe: dict) -> bool:
+    """Đã đọc đủ expected_codes mã của recipe (expected_codes None thì không bao giờ đủ)"""
+    expected = recipe.get('expected_codes')
+    return bool(expected) and len(codes) >= expected
+
+
+def decode_regions(gray, rects, recipe: dict = None, timings: dict = None, decoder=scan,
+                   buffers: WorkBuffers = None):
+    """Chạy cascade trên các vùng crop; mỗi chiến lược chạy trên mọi vùng trước khi sang chiến lược sau"""
+    recipe = recipe or DEFAULT_RECIPE
+    buffers = buffers or work_buffers()
+    # Chép mỗi vùng một lần vào buffer liên tục riêng; các chiến lược sau đọc lại từ đó
+    crops = [(buffers.copy(f'crop{index}', gray[y:y + h, x:x + w]), (x, y))
+             for index, (x, y, w, h) in enumerate(rects)]
+    generators = [iter_candidates(crop, recipe, buffers, f'crop{index}/')
+                  for index, (crop, _) in enumerate(crops)]
+    codes = []
+    winner = None
+    for candidates in timed(zip(*generators), timings, 'preprocess'):
+        for (name, candidate, scale), (_, offset) in zip(candidates, crops):
+            with stage(timings, 'decode'):
+                decoded = decoder(candidate)
+            if merge_codes(codes, [to_frame(obj, scale, offset) for obj in decoded]):
+                winner = f'crop/{name}'
+        if is_complete(codes, recipe):
+            break
+    return codes, winner
+
+
+def decode_cascade(gray, recipe: dict = None, timings: dict = None, decoder=None, buffers: WorkBuffers = None,
+                   rects: list = None):
+    """Thử lần lượt các chiến lược và gộp mã của chúng, dừng khi đã đọc đủ expected_codes mã
+
+    Label thường có nhiều mã và mỗi chiến lược chỉ đọc được một phần, nên một
+    chiến lược ra mã chưa phải là xong: expected_codes None thì chạy hết cascade.
+    Nếu bật localize thì giải mã các vùng nghi là barcode trước; các vùng chưa cho
+    đủ expected_codes mã thì vẫn chạy cascade trên toàn ảnh và gộp thêm mã ở ngoài
+    các vùng đó, nên localize chỉ tiết kiệm được thời gian khi recipe có expected_codes.
+    Trả về (danh sách mã, chiến lược cuối cùng cho thêm mã mới) hoặc ([], None)
+    nếu tất cả thất bại.
+    Nếu truyền timings thì thời gian từng stage được cộng dồn vào đó. decoder
+    mặc định được biên dịch từ recipe bằng make_decoder; buffers mặc định là
+    WorkBuffers của thread hiện tại. rects là các vùng đã khoanh sẵn (ví dụ ở
+    một stage trước của stream), khi có thì không chạy lại localize.
+    """
+    recipe = recipe or DEFAULT_RECIPE
+    decoder = decoder or make_decoder(recipe)
+    buffers = buffers or work_buffers()
+    codes = []
+    winner = None
+    if recipe.get('localize'):
+        if rects is None:
+            with stage(timings, 'localize'):
+                rects = localize(gray, recipe)
+        if rects:
+            codes, winner = decode_regions(gray, rects, recipe, timings, decoder, buffers)
+            if is_complete(codes, recipe):
+                return codes, winner
+
+    for name, candidate, scale in timed(iter_candidates(gray, recipe, buffers), timings, 'preprocess'):
+        with stage(timings, 'decode'):
+            decoded = decoder(candidate)
+        if merge_codes(codes, [to_frame(obj, scale) for obj in decoded]):
+            winner = name
+        if is_complete(codes, recipe):
+            break
+    return codes, winner
+
+
+def pyramid_levels(recipe: dict = None) -> list[float]:
+    """Các mức pyramid của recipe, tăng dần và luôn kết thúc ở 1.0"""
+    recipe = recipe or DEFAULT_RECIPE
+    levels = sorted({float(level) for level in recipe.get('pyramid') or []} | {1.0})
+    if levels[0] <= 0 or levels[-1] > 1.0:
+        raise ValueError(f"Pyramid levels must be in (0, 1], got {recipe.get('pyramid')}")
+    return levels
+
+
+def decode_pyramid(gray, recipe: dict = None, timings: dict = None, decoder=None, buffers: WorkBuffers = None,
+                   rects: list = None):
+    """Chạy cascade trên ảnh thu nhỏ trước, chỉ lên mức lớn hơn khi chưa đọc đủ expected_codes mã
+
+    Mã của các mức được gộp lại; expected_codes None thì mọi mức đều chạy nên
+    pyramid chỉ tiết kiệm được thời gian khi recipe có expected_codes.
+    rects (vùng khoanh sẵn trên gray) chỉ được dùng ở mức ảnh gốc. Trả về (danh
+    sách mã theo tọa độ gray, tên chiến lược thắng, mức cuối cùng cho thêm mã mới)
+    hoặc ([], None, None) nếu mọi mức đều thất bại.
+    """
+    recipe = recipe or DEFAULT_RECIPE
+    decoder = decoder or make_decoder(recipe)
+    buffers = buffers or work_buffers()
+    height, width = gray.shape[:2]
+    codes = []
+    winner = found_level = None
+    for level in pyramid_levels(recipe):
+        image = gray
+        if level < 1.0:
+            size = (max(1, int(round(width * level))), max(1, int(round(height * level))))
+            with stage(timings, 'pyramid'):
+                image = cv2.resize(gray, size, dst=buffers.get('pyramid', (size[1], size[0])),
+                                   interpolation=cv2.INTER_AREA)
+        level_codes, name = decode_cascade(image, recipe, timings, decoder, buffers, rects if level == 1.0 else None)
+        if merge_codes(codes, [to_frame(obj, level) for obj in level_codes]):
+            winner, found_level = name, level
+        if is_complete(codes, recipe):
+            break
+    return codes, winner, found_level
+
+
+def crop_roi(gray, roi, reduce: int = 1):
+    """Cắt vùng roi (tọa độ ảnh gốc) khỏi gray đã nạp ở 1/reduce, trả về (view, (dx, dy) trên gray)
+
+    ROI được kẹp vào trong ảnh; roi None hoặc không còn giao với ảnh thì trả về cả ảnh.
+    """
+    if not roi:
+        return gray, (0, 0)
+    height, width = gray.shape[:2]
+    x, y, w, h = roi
+    x0 = min(max(0, int(x) // reduce), width)
+    y0 = min(max(0, int(y) // reduce), height)
+    x1 = min(width, -(-(int(x) + int(w)) // reduce))
+    y1 = min(height, -(-(int(y) + int(h)) // reduce))
+    if x1 <= x0 or y1 <= y0:
+        return gray, (0, 0)
+    return gray[y0:y1, x0:x1], (x0, y0)
+
+
+def compile_recipe(recipe: dict = None):
+    """Biên dịch recipe thành hàm decode(gray, timings, buffers, reduce) -> (mã, chiến lược, mức pyramid)
+
+    decoder và ROI được chuẩn bị một lần; mỗi ảnh chỉ còn cắt ROI vào buffer 'roi'
+    rồi chạy pyramid / cascade trên vùng đó. Tọa độ mã trả về theo ảnh gốc (đã
+    cộng lại vị trí ROI và nhân lại reduce).
+    """
+    recipe = recipe or DEFAULT_RECIPE
+    decoder = make_decoder(recipe)
+    roi = recipe.get('roi')
+
+    def decode(gray, timings: dict = None, buffers: WorkBuffers = None, reduce: int = 1, rects: list = None):
+        buffers = buffers or work_buffers()
+        dx = dy = 0
+        if roi:
+            with stage(timings, 'roi'):
+                image, (dx, dy) = crop_roi(gray, roi, reduce)
+                if image is not gray:
+                    gray = buffers.copy('roi', image)
+        codes, strategy, scale = decode_pyramid(gray, recipe, timings, decoder, buffers, rects)
+        if reduce != 1 or dx or dy:
+            codes = [to_frame(obj, 1.0 / reduce, (dx * reduce, dy * reduce)) for obj in codes]
+        return codes, strategy, scale
+    return decode
+
+
+def decode_image(image, recipe: dict = None, timings: dict = None):
+    """Chạy cascade trên ảnh BGR (nguồn đã có sẵn ảnh màu; file ảnh thì dùng decode_file)"""
+    with stage(timings, 'gray'):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return decode_cascade(gray, recipe, timings)
+
+
+def to_record(obj: Decoded) -> dict:
+    """Chuyển kết quả pyzbar sang dict để ghi JSON"""
+    return {
+        'type': obj.type,
+        'data': obj.data.decode('utf-8', errors='replace'),
+        'rect': list(obj.rect),
+    }
+
+
+def decode_file(image_path: str, recipe: dict = None, cache=None, decode=None) -> dict:
+    """Giải mã một file ảnh, trả về một bản ghi kết quả (không bao giờ raise)
+
+    Bản ghi gồm thời gian tổng 'ms', thời gian từng stage 'stages' (ms) và mức
+    pyramid đã giải mã được 'scale'.
+    Nếu có cache (DecodeCache) thì ảnh có nội dung đã gặp với cùng recipe được
+    trả về ngay, không giải mã lại. File được đọc vào buffer tái sử dụng và giải
+    mã thẳng sang ảnh xám, không qua ảnh BGR. decode là recipe đã biên dịch
+    (compile_recipe), truyền vào để không phải biên dịch lại cho mỗi ảnh.
+    """
+    recipe = recipe or DEFAULT_RECIPE
+    decode = decode or compile_recipe(recipe)
+    start = time.perf_counter()
+    timings = {}
+    result = {'path': image_path, 'ok': False, 'codes': [], 'strategy': None, 'scale': None}
+    try:
+        with stage(timings, 'load'):
+            data = read_bytes(image_path)
+        key = fingerprint = None
+        cached = None
+        if cache is not None:
+            with stage(timings, 'cache'):
+                # Khóa theo recipe của lần gọi này, không theo recipe đang đặt trong cache
+                key = content_hash(data)
+                fingerprint = recipe_fingerprint(recipe)
+                cached = cache.get(key, fingerprint)
+            result['cached'] = cached is not None
+
+        if cached is not None:
+            result.update(cached)
+        else:
+            reduce = recipe.get('load_reduce', 1)
+            with stage(timings, 'load'):
+                gray = decode_gray(data, reduce)
+            if gray is None:
+                result['error'] = 'Không đọc được ảnh'
+            else:
+                codes, strategy, scale = decode(gray, timings, reduce=reduce)
+                result['codes'] = [to_record(obj) for obj in codes]
+                result['strategy'] = strategy
+                result['scale'] = scale
+                result['ok'] = bool(codes)
+                if cache is not None:
+                    cache.put(key, {'ok': result['ok'], 'codes': result['codes'],
+                                    'strategy': strategy, 'scale': scale}, fingerprint)
+    except Exception as e:
+        result['error'] = str(e)
+    result['ms'] = round((time.perf_counter() - start) * 1000, 2)
+    result['stages'] = {name: round(seconds * 1000, 3) for name, seconds in timings.items()}
+    return result
+
+
+def is_image_file(path: str) -> bool:
+    return path.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(path)
@@ -0,0 +1,142 @@
+"""Học mức pyramid khởi đầu cho từng model
+
+Mỗi ảnh của tập học được giải mã độc lập ở mọi mức (không dừng sớm), đo thời
+gian và ghi lại mức nào đọc đúng mã. Từ bảng đó tính được chi phí thực tế nếu
+pyramid bắt đầu ở từng mức: các mức thấp hơn mức đầu tiên đọc được của ảnh là
+công phí. Chọn mức khởi đầu rẻ nhất mà không làm mất ảnh nào so với bắt đầu ở
+mức thô nhất, rồi lưu danh sách mức từ đó trở lên vào recipe của model.
+
+Ví dụ:
+    python pyramid.py --model "RU Model"
+    python pyramid.py --model "OCDU Model" --levels 0.5,0.6,0.75 --match "*/OK/09*"
+"""
+import argparse
+import fnmatch
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+
+from pipeline import decode_cascade, make_decoder, pyramid_levels
+from benchmark import DEFAULT_MANIFEST, load_manifest
+from main import parse_levels
+from recipes import MODELS, load_recipe, save_recipe
+
+DEFAULT_LEVELS = [0.5, 0.75]
+
+# Recipe đang học, gán trong mỗi process worker
+_recipe = None
+
+
+def init_worker(recipe):
+    global _recipe
+    cv2.setNumThreads(1)
+    _recipe = recipe
+
+
+def measure(entry: dict) -> list[tuple]:
+    """Giải mã ảnh ở từng mức, trả về [(mức, đọc đúng?, ms), ...] theo thứ tự tăng dần"""
+    gray = cv2.imread(entry['abs_path'], cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return []
+    decoder = make_decoder(_recipe)
+    expected = set(entry['expected'])
+    height, width = gray.shape
+    attempts = []
+    for level in pyramid_levels(_recipe):
+        start = time.perf_counter()
+        image = gray
+        if level < 1.0:
+            image = cv2.resize(gray, (round(width * level), round(height * level)), interpolation=cv2.INTER_AREA)
+        codes, _ = decode_cascade(image, _recipe, decoder=decoder)
+        ms = (time.perf_counter() - start) * 1000
+        read = {obj.data.decode('utf-8') for obj in codes}
+        hits = read & expected if expected else read
+        false_read = entry['complete'] and bool(read - expected)
+        attempts.append((level, hits, false_read, ms))
+
+    # Một mức chỉ tính là đọc được nếu không mất mã nào so với ảnh gốc (mức cuối)
+    full_hits = attempts[-1][1]
+    return [(level, bool(hits) and hits >= full_hits and not false_read, ms)
+            for level, hits, false_read, ms in attempts]
+
+
+def start_cost(table: list[list[tuple]], start: float) -> tuple[int, float]:
+    """(số ảnh đọc được, tổng ms) nếu pyramid bắt đầu ở mức start"""
+    decoded = 0
+    total = 0.0
+    for rows in table:
+        for level, ok, ms in rows:
+            if level < start:
+                continue
+            total += ms
+            if ok:
+                decoded += 1
+                break
+    return decoded, total
+
+
+def choose_start(table: list[list[tuple]], levels: list[float]) -> dict:
+    """Mức khởi đầu rẻ nhất trong các mức giữ nguyên số ảnh đọc được"""
+    costs = {level: start_cost(table, level) for level in levels}
+    best_decoded = max(decoded for decoded, _ in costs.values())
+    start = min((level for level in levels if costs[level][0] == best_decoded),
+                key=lambda level: costs[level][1])
+    return {'start': start, 'costs': costs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Học mức pyramid khởi đầu cho một model")
+    parser.add_argument("--model", required=True, choices=MODELS)
+    parser.add_argument("--levels", default=",".join(str(level) for level in DEFAULT_LEVELS),
+                        help="Các mức thử, ảnh gốc (1.0) luôn được thêm vào cuối")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--set", default="OK", help="Tập ảnh trong manifest dùng để học")
+    parser.add_argument("--match", help="Chỉ lấy ảnh có đường dẫn khớp glob này (ảnh của riêng model)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in kết quả, không ghi recipe")
+    args = parser.parse_args()
+
+    entries = [entry for entry in load_manifest(args.manifest) if entry['set'] == args.set]
+    if args.match:
+        entries = [entry for entry in entries
+                   if fnmatch.fnmatch(entry['path'], args.match) or fnmatch.fnmatch(entry['abs_path'], args.match)]
+    if not entries:
+        print("No training image", file=sys.stderr)
+        return 1
+
+    recipe = dict(load_recipe(args.model), pyramid=parse_levels(args.levels))
+    levels = pyramid_levels(recipe)
+    with multiprocessing.Pool(max(1, args.workers), initializer=init_worker, initargs=(recipe,)) as pool:
+        table = [rows for rows in pool.imap(measure, entries, chunksize=4) if rows]
+    if not table:
+        print(f"None of the {len(entries)} training images could be read", file=sys.stderr)
+        return 1
+
+    choice = choose_start(table, levels)
+    print(f"{'start':>6} {'decoded':>8} {'ms/image':>9}")
+    for level in levels:
+        decoded, total = choice['costs'][level]
+        print(f"{level:>6g} {decoded:>8} {total / len(table):>9.2f}")
+    start = choice['start']
+    print(f"Start level: {start:g}")
+
+    if not args.dry_run:
+        recipe['pyramid'] = [level for level in levels if level >= start and level < 1.0] or None
+        decoded, total = choice['costs'][start]
+        path = save_recipe(args.model, recipe, pyramid={
+            'levels': levels,
+            'start': start,
+            'images': len(table),
+            'decoded': decoded,
+            'mean_ms': round(total / len(table), 3),
+            'learned_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        print(f"Saved {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
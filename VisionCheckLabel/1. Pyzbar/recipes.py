@@ -0,0 +1,157 @@
+"""Lưu / nạp recipe giải mã theo từng model
+
+Mỗi model có một file JSON trong thư mục recipes/, dạng:
+    {"version": 2, "model": "RU Model", "decode": {...tham số pipeline...},
+     "inspection": {...thiết lập teaching...}, "tuning": {...}}
+Phần "decode" được ghép lên DEFAULT_RECIPE, "inspection" lên DEFAULT_INSPECTION,
+nên file cũ thiếu key mới vẫn dùng được. File version 1 (chưa có "inspection")
+được nâng cấp khi đọc.
+
+compile_inspection() ghép thiết lập teaching (loại kiểm tra, ROI) vào phần
+"decode" để ra recipe giải mã mà pipeline dùng trực tiếp.
+"""
+import copy
+import json
+import os
+import re
+
+from pipeline import DEFAULT_RECIPE
+
+RECIPE_VERSION = 2
+HERE = os.path.dirname(os.path.abspath(__file__))
+RECIPE_DIR = os.path.join(HERE, "recipes")
+
+# Các model trong hộp thoại teaching của giao diện
+MODELS = ["RU Model", "OCDU Model", "Accessory Model"]
+
+# Mọi symbology 1D mà zbar đọc được (ISBN10/13 là EAN13 nên không liệt kê riêng)
+BARCODE_1D_SYMBOLS = ['EAN13', 'EAN8', 'UPCA', 'UPCE', 'I25', 'CODE93', 'CODE128', 'CODE39', 'CODABAR',
+                      'DATABAR', 'DATABAR_EXP']
+
+# "Loại kiểm tra" trong hộp thoại teaching -> backend và symbology cần quét.
+CHECK_TYPES = {
+    "Barcode 1D": {'backend': 'zbar', 'symbols': BARCODE_1D_SYMBOLS},
+    # Label của các model hiện tại chỉ in CODE128 (serial, HN...) và CODE39 (S/N, mã model).
+    # Quét riêng hai loại này nhanh hơn và không mất mã CODE39 mờ do bộ giải mã I25 tranh dải vạch.
+    "Barcode 1D (CODE128/CODE39)": {'backend': 'zbar', 'symbols': ['CODE128', 'CODE39']},
+    "QR Code": {'backend': 'zbar', 'symbols': ['QRCODE']},
+    "Data Matrix": {'backend': 'dmtx', 'symbols': None},
+}
+
+# Kiểu vùng ROI trong teaching; chỉ cắt ảnh với vùng chữ nhật (vùng đa giác dùng hình bao x/y/w/h)
+ROI_TYPES = ["Vùng chữ nhật", "Vùng đa giác", "Toàn bộ ảnh"]
+MATCH_MODES = ["Chính xác 100%", "Phần đầu giống nhau", "Chứa chuỗi"]
+
+# Thiết lập của hộp thoại teaching, lưu trong phần "inspection" của file recipe
+DEFAULT_INSPECTION = {
+    'check_type': "Barcode 1D",
+    'match_mode': "Chính xác 100%",
+    'timeout_s': 5,
+    # File danh sách S/N dự kiến (matcher.load_serials); None = so với S/N nhập tay
+    'serial_list': None,
+    'roi': {'type': "Toàn bộ ảnh", 'x': 0, 'y': 0, 'width': 0, 'height': 0},
+}
+
+# Model dùng ở lần mở phần mềm gần nhất
+ACTIVE_FILE = "active.json"
+
+
+def recipe_slug(model: str) -> str:
+    """'RU Model' -> 'ru_model'"""
+    return re.sub(r"[^a-z0-9]+", "_", model.lower()).strip("_")
+
+
+def recipe_path(model: str, recipe_dir: str = RECIPE_DIR) -> str:
+    return os.path.join(recipe_dir, f"{recipe_slug(model)}.json")
+
+
+def load_recipe_file(model: str, recipe_dir: str = RECIPE_DIR) -> dict:
+    """Đọc nguyên file recipe của model; chưa có file thì trả về recipe mặc định"""
+    path = recipe_path(model, recipe_dir)
+    if not os.path.exists(path):
+        return {'version': RECIPE_VERSION, 'model': model, 'decode': copy.deepcopy(DEFAULT_RECIPE),
+                'inspection': copy.deepcopy(DEFAULT_INSPECTION)}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get('version') not in (1, RECIPE_VERSION):
+        raise ValueError(f"Unsupported recipe version in {path}: {data.get('version')}")
+    # Version 1 chưa có phần "inspection": dùng thiết lập mặc định
+    data['version'] = RECIPE_VERSION
+    data['decode'] = dict(copy.deepcopy(DEFAULT_RECIPE), **data.get('decode', {}))
+    inspection = dict(copy.deepcopy(DEFAULT_INSPECTION), **data.get('inspection', {}))
+    inspection['roi'] = dict(DEFAULT_INSPECTION['roi'], **inspection['roi'])
+    data['inspection'] = inspection
+    return data
+
+
+def load_recipe(model: str, recipe_dir: str = RECIPE_DIR) -> dict:
+    """Tham số pipeline giải mã của model"""
+    return load_recipe_file(model, recipe_dir)['decode']
+
+
+def load_inspection(model: str, recipe_dir: str = RECIPE_DIR) -> dict:
+    """Thiết lập teaching của model"""
+    return load_recipe_file(model, recipe_dir)['inspection']
+
+
+def roi_rect(roi: dict):
+    """ROI của teaching -> [x, y, rộng, cao] cho recipe giải mã, None nếu dùng toàn bộ ảnh"""
+    if roi.get('type') == "Toàn bộ ảnh" or roi.get('width', 0) <= 0 or roi.get('height', 0) <= 0:
+        return None
+    return [int(roi['x']), int(roi['y']), int(roi['width']), int(roi['height'])]
+
+
+def apply_check_type(recipe: dict, check_type: str) -> dict:
+    """Trả về bản sao recipe chỉ quét các symbology của loại kiểm tra đã chọn"""
+    if check_type not in CHECK_TYPES:
+        raise ValueError(f"Loại kiểm tra '{check_type}' chưa có bộ giải mã barcode")
+    return dict(copy.deepcopy(recipe), **copy.deepcopy(CHECK_TYPES[check_type]))
+
+
+def compile_inspection(model: str, inspection: dict = None, recipe_dir: str = RECIPE_DIR) -> dict:
+    """Recipe giải mã của model đã ghép loại kiểm tra và ROI của thiết lập teaching
+
+    inspection mặc định là thiết lập đã lưu; truyền vào để kiểm tra thiết lập mới trước khi lưu.
+    """
+    data = load_recipe_file(model, recipe_dir)
+    inspection = inspection or data['inspection']
+    recipe = apply_check_type(data['decode'], inspection['check_type'])
+    recipe['roi'] = roi_rect(inspection['roi'])
+    return recipe
+
+
+def save_inspection(model: str, inspection: dict, recipe_dir: str = RECIPE_DIR) -> str:
+    """Ghi thiết lập teaching của model, giữ nguyên phần decode / tuning đã có"""
+    data = load_recipe_file(model, recipe_dir)
+    return save_recipe(model, data['decode'], recipe_dir, inspection=inspection)
+
+
+def load_active_model(recipe_dir: str = RECIPE_DIR):
+    """Model đã chọn ở lần teaching gần nhất, None nếu chưa có"""
+    path = os.path.join(recipe_dir, ACTIVE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get('model')
+
+
+def save_active_model(model: str, recipe_dir: str = RECIPE_DIR):
+    os.makedirs(recipe_dir, exist_ok=True)
+    with open(os.path.join(recipe_dir, ACTIVE_FILE), "w", encoding="utf-8") as f:
+        json.dump({'model': model}, f, ensure_ascii=False)
+
+
+def save_recipe(model: str, recipe: dict, recipe_dir: str = RECIPE_DIR, **extra) -> str:
+    """Ghi recipe giải mã của model, giữ nguyên các phần khác đã có trong file"""
+    os.makedirs(recipe_dir, exist_ok=True)
+    path = recipe_path(model, recipe_dir)
+    data = load_recipe_file(model, recipe_dir)
+    data.update(extra)
+    data['version'] = RECIPE_VERSION
+    data['model'] = model
+    data['decode'] = recipe
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
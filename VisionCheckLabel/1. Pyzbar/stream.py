@@ -0,0 +1,362 @@
+"""Pipeline giải mã dạng luồng cho thư mục ảnh mà phần mềm camera đổ vào
+
+    watcher -> loader -> preprocess -> decode -> verdict -> sink
+
+Giữa hai stage là một queue có giới hạn: stage nhanh bị chặn lại khi stage sau
+chưa kịp xử lý, nên ảnh không dồn hết vào RAM. Mỗi stage có số thread riêng;
+OpenCV và zbar (qua ctypes) nhả GIL khi tính nên đọc đĩa, giải mã ảnh và giải
+mã barcode chạy chồng lên nhau và tăng theo số core.
+
+Ví dụ:
+    python stream.py                                   # theo dõi image/Result
+    python stream.py ../image/OK --existing --once --decode-workers 4
+    python stream.py "D:/Result" --expect RT4405-40A --log result.jsonl
+    python stream.py --pylon                           # lấy frame thẳng từ camera Basler
+    python stream.py ../image/OK --replay --fps 10     # phát lại ảnh như camera
+
+Với --pylon / --replay frame đi thẳng từ FrameRing vào stage preprocess, không
+qua bước ghi/đọc file ảnh.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from pipeline import (DEFAULT_RECIPE, compile_recipe, crop_roi, is_image_file, localize, pyramid_levels, stage,
+                      to_record)
+from capture import Frame, PylonCaptureSource, ReplayCaptureSource
+from decode_cache import DecodeCache, content_hash, recipe_fingerprint
+from ingest import decode_gray
+from main import parse_levels, parse_symbols
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FOLDER = os.path.join(HERE, "..", "image", "Result")
+
+STAGE_NAMES = ('loader', 'preprocess', 'decode', 'verdict', 'sink')
+DEFAULT_WORKERS = {
+    'loader': 2,
+    'preprocess': 2,
+    'decode': os.cpu_count() or 1,
+    'verdict': 1,
+    'sink': 1,
+}
+
+# Đánh dấu hết việc, mỗi worker của stage sau nhận đúng một cái
+_STOP = object()
+
+
+def watch_folder(folder: str, stop: threading.Event, interval: float = 0.2, existing: bool = False,
+                 once: bool = False):
+    """Sinh đường dẫn các ảnh mới xuất hiện trong folder
+
+    Ảnh chỉ được trả ra khi kích thước và mtime không đổi giữa hai lần quét, để
+    không đọc phải file camera đang ghi dở. existing=True thì xử lý cả ảnh có sẵn;
+    once=True thì dừng khi không còn ảnh nào đang chờ (chạy lô trên thư mục có sẵn).
+    """
+    seen = set()
+    pending = {}
+    if not existing:
+        with os.scandir(folder) as entries:
+            seen.update(entry.name for entry in entries)
+    while not stop.is_set():
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name in seen or not entry.is_file() or not is_image_file(entry.path):
+                    continue
+                info = entry.stat()
+                signature = (info.st_size, info.st_mtime_ns)
+                if pending.get(entry.name) == signature:
+                    del pending[entry.name]
+                    seen.add(entry.name)
+                    yield entry.path
+                else:
+                    pending[entry.name] = signature
+        if once and not pending:
+            return
+        stop.wait(interval)
+
+
+def decoded_verdict(job: dict) -> str:
+    """Verdict mặc định: đọc được ít nhất một mã là OK"""
+    return 'OK' if job['ok'] else 'NG'
+
+
+def expected_verdict(expected: list[str]):
+    """Verdict OK khi label có đủ mọi mã trong expected"""
+    expected = set(expected)
+
+    def verdict(job: dict) -> str:
+        read = {code['data'] for code in job['codes']}
+        return 'OK' if expected <= read else 'NG'
+    return verdict
+
+
+def print_sink(job: dict):
+    sys.stdout.write(json.dumps(job, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+class StreamPipeline:
+    """Các stage chạy trên thread riêng, nối với nhau bằng queue có giới hạn"""
+
+    def __init__(self, recipe: dict = None, workers: dict = None, queue_size: int = 8,
+                 verdict=decoded_verdict, sink=print_sink, cache: DecodeCache = None):
+        self.recipe = recipe or DEFAULT_RECIPE
+        self.workers = dict(DEFAULT_WORKERS, **(workers or {}))
+        self.queue_size = queue_size
+        self.verdict = verdict
+        self.sink = sink
+        self.cache = cache
+        self.decode = compile_recipe(self.recipe)
+        self.fingerprint = recipe_fingerprint(self.recipe)
+        # Pyramid thu nhỏ ảnh trước khi khoanh vùng nên chỉ khoanh sẵn khi giải mã thẳng ảnh gốc
+        self._prelocalize = self.recipe.get('localize') and pyramid_levels(self.recipe) == [1.0]
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.verdicts = {}
+        self.busy = {name: 0.0 for name in STAGE_NAMES}
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _load(self, job: dict):
+        if job['frame'] is not None:
+            return
+        with stage(job['timings'], 'load'):
+            # Mảng riêng của job (không dùng WorkBuffers): job đi qua nhiều thread
+            job['data'] = np.fromfile(job['path'], dtype=np.uint8)
+        if self.cache is not None:
+            with stage(job['timings'], 'cache'):
+                job['key'] = content_hash(job['data'])
+                cached = self.cache.get(job['key'], self.fingerprint)
+            job['cached'] = cached is not None
+            if cached is not None:
+                job.update(cached)
+                job['done'] = True
+
+    def _preprocess(self, job: dict):
+        if job['frame'] is not None:
+            # Frame camera đã là ảnh xám độ phân giải gốc, đọc thẳng trong slot của ring
+            gray = job['frame'].image
+            job['reduce'] = 1
+        else:
+            job['reduce'] = self.recipe.get('load_reduce', 1)
+            with stage(job['timings'], 'load'):
+                gray = decode_gray(job.pop('data'), job['reduce'])
+        if gray is None:
+            job['error'] = 'Không đọc được ảnh'
+            job['done'] = True
+            return
+        job['gray'] = gray
+        if self._prelocalize:
+            # Khoanh vùng trên ROI, đúng ảnh mà stage decode sẽ cắt ra
+            with stage(job['timings'], 'localize'):
+                job['rects'] = localize(crop_roi(gray, self.recipe.get('roi'), job['reduce'])[0], self.recipe)
+
+    def _decode(self, job: dict):
+        try:
+            codes, strategy, scale = self.decode(job.pop('gray'), job['timings'], reduce=job['reduce'],
+                                                 rects=job.pop('rects', None))
+        finally:
+            # Trả slot cho camera ngay khi giải mã xong
+            if job['frame'] is not None:
+                job['frame'].release()
+        job['codes'] = [to_record(obj) for obj in codes]
+        job['strategy'] = strategy
+        job['scale'] = scale
+        job['ok'] = bool(codes)
+        if 'key' in job:
+            self.cache.put(job['key'], {'ok': job['ok'], 'codes': job['codes'], 'strategy': strategy, 'scale': scale},
+                           self.fingerprint)
+
+    def _verdict(self, job: dict):
+        job['verdict'] = self.verdict(job)
+
+    def _sink(self, job: dict):
+        frame = job.pop('frame')
+        if frame is not None:
+            frame.release()  # job lỗi trước stage decode
+            job['seq'] = frame.meta.get('seq')
+        job['latency_ms'] = round((time.perf_counter() - job.pop('queued_at')) * 1000, 2)
+        job['stages'] = {name: round(seconds * 1000, 3) for name, seconds in job.pop('timings').items()}
+        for name in ('data', 'gray', 'rects', 'key', 'reduce', 'done'):
+            job.pop(name, None)
+        with self._lock:
+            self.processed += 1
+            verdict = job.setdefault('verdict', None)
+            self.verdicts[verdict] = self.verdicts.get(verdict, 0) + 1
+        self.sink(job)
+
+    def _work(self, name: str, func, inbox: queue.Queue, outbox: queue.Queue, remaining: dict, next_workers: int):
+        # Stage verdict / sink luôn chạy, kể cả với job lỗi hoặc lấy từ cache
+        always = name in ('verdict', 'sink')
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                break
+            if always or not job.get('done'):
+                start = time.perf_counter()
+                try:
+                    func(job)
+                except Exception as e:
+                    job['error'] = str(e)
+                    job['done'] = True
+                with self._lock:
+                    self.busy[name] += time.perf_counter() - start
+            if outbox is not None:
+                outbox.put(job)
+
+        with self._lock:
+            remaining[name] -= 1
+            last = remaining[name] == 0
+        # Worker cuối cùng của stage báo hết việc cho mọi worker của stage sau
+        if last and outbox is not None:
+            for _ in range(next_workers):
+                outbox.put(_STOP)
+
+    @staticmethod
+    def _new_job(item) -> dict:
+        if isinstance(item, Frame):
+            path, frame = item.meta.get('path'), item
+        else:
+            path, frame = item, None
+        return {'path': path, 'frame': frame, 'ok': False, 'codes': [], 'strategy': None, 'scale': None,
+                'error': None, 'timings': {}, 'queued_at': time.perf_counter()}
+
+    def run(self, items) -> dict:
+        """Đẩy các đường dẫn (ví dụ từ watch_folder) hoặc Frame (CaptureSource.frames()) qua pipeline,
+        chặn tới khi xử lý xong"""
+        funcs = {
+            'loader': self._load,
+            'preprocess': self._preprocess,
+            'decode': self._decode,
+            'verdict': self._verdict,
+            'sink': self._sink,
+        }
+        counts = [max(1, int(self.workers[name])) for name in STAGE_NAMES]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGE_NAMES]
+        remaining = dict(zip(STAGE_NAMES, counts))
+        threads = []
+        for index, name in enumerate(STAGE_NAMES):
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            next_workers = counts[index + 1] if index + 1 < len(counts) else 0
+            for number in range(counts[index]):
+                thread = threading.Thread(
+                    target=self._work, name=f"{name}-{number}", daemon=True,
+                    args=(name, funcs[name], queues[index], outbox, remaining, next_workers))
+                thread.start()
+                threads.append(thread)
+
+        start = time.perf_counter()
+        try:
+            for item in items:
+                if self.stop_event.is_set():
+                    if isinstance(item, Frame):
+                        item.release()
+                    break
+                queues[0].put(self._new_job(item))
+        finally:
+            for _ in range(counts[0]):
+                queues[0].put(_STOP)
+            for thread in threads:
+                thread.join()
+
+        elapsed = time.perf_counter() - start
+        return {
+            'processed': self.processed,
+            'verdicts': dict(self.verdicts),
+            'wall_s': round(elapsed, 3),
+            'throughput': round(self.processed / elapsed, 2) if elapsed > 0 else 0.0,
+            'busy_s': {name: round(seconds, 3) for name, seconds in self.busy.items()},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Giải mã liên tục ảnh mới trong thư mục kết quả camera")
+    parser.add_argument("folder", nargs="?", default=DEFAULT_FOLDER)
+    parser.add_argument("--existing", action="store_true", help="Xử lý cả ảnh đã có sẵn trong thư mục")
+    parser.add_argument("--once", action="store_true", help="Dừng khi không còn ảnh mới (chạy lô)")
+    parser.add_argument("--interval", type=float, default=0.2, help="Chu kỳ quét thư mục (giây)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Số ảnh tối đa chờ giữa hai stage")
+    for name in STAGE_NAMES:
+        parser.add_argument(f"--{name}-workers", type=int, default=DEFAULT_WORKERS[name])
+    parser.add_argument("--symbols", help="Chỉ quét các symbology này, ví dụ: CODE128,CODE39")
+    parser.add_argument("--pyramid", metavar="LEVELS", help="Các mức pyramid, ví dụ: 0.5,0.75")
+    parser.add_argument("--expect", action="append", help="Mã bắt buộc phải có trên label (lặp lại được)")
+    parser.add_argument("--cache", metavar="DB", help="File SQLite cache kết quả theo nội dung ảnh + recipe")
+    parser.add_argument("--log", help="Ghi thêm kết quả từng ảnh (JSON lines) vào file này")
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument("--pylon", nargs="?", const="", metavar="SERIAL",
+                              help="Lấy frame từ camera Basler (serial tùy chọn) thay vì theo dõi thư mục")
+    source_group.add_argument("--replay", action="store_true", help="Phát lại ảnh trong thư mục như camera")
+    parser.add_argument("--fps", type=float, help="Nhịp phát lại với --replay (mặc định: nhanh nhất có thể)")
+    parser.add_argument("--slots", type=int, default=8, help="Số frame trong ring buffer của camera")
+    args = parser.parse_args()
+
+    if args.pylon is None and not os.path.isdir(args.folder):
+        print(f"Folder not found: {args.folder}", file=sys.stderr)
+        return 1
+
+    recipe = dict(DEFAULT_RECIPE, symbols=parse_symbols(args.symbols), pyramid=parse_levels(args.pyramid))
+    cache = DecodeCache(recipe, db_path=args.cache) if args.cache else None
+    log = open(args.log, "a", encoding="utf-8") if args.log else None
+
+    def sink(job):
+        print_sink(job)
+        if log is not None:
+            log.write(json.dumps(job, ensure_ascii=False) + "\n")
+            log.flush()
+
+    workers = {name: getattr(args, f"{name}_workers") for name in STAGE_NAMES}
+    pipeline = StreamPipeline(recipe, workers, max(1, args.queue_size),
+                              verdict=expected_verdict(args.expect) if args.expect else decoded_verdict,
+                              sink=sink, cache=cache)
+    source = None
+    try:
+        if args.pylon is not None:
+            source = PylonCaptureSource(args.pylon or None, slots=max(1, args.slots)).start()
+        elif args.replay:
+            paths = sorted(entry.path for entry in os.scandir(args.folder)
+                           if entry.is_file() and is_image_file(entry.path))
+            source = ReplayCaptureSource(paths, fps=args.fps, slots=max(1, args.slots)).start()
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    workers_text = ", ".join(f"{name}={count}" for name, count in pipeline.workers.items())
+    if source is None:
+        print(f"Watching {os.path.abspath(args.folder)} ({workers_text})", file=sys.stderr)
+        items = watch_folder(args.folder, pipeline.stop_event, args.interval, args.existing, args.once)
+    else:
+        print(f"Capturing from {type(source).__name__} {source.ring.shape} ({workers_text})", file=sys.stderr)
+        items = source.frames()
+    try:
+        stats = pipeline.run(items)
+    except KeyboardInterrupt:
+        pipeline.stop()
+        return 130
+    finally:
+        if source is not None:
+            source.stop()
+        if log is not None:
+            log.close()
+        if cache is not None:
+            cache.close()
+
+    print(f"Processed {stats['processed']} images in {stats['wall_s']}s ({stats['throughput']} images/s), "
+          f"verdicts {stats['verdicts']}", file=sys.stderr)
+    if source is not None:
+        print(f"Captured {source.frames_captured} frames, dropped {source.ring.dropped} (ring full)", file=sys.stderr)
+    print("Busy time (s): " + ", ".join(f"{name}={seconds}" for name, seconds in stats['busy_s'].items()),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
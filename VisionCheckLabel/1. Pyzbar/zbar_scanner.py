@@ -0,0 +1,83 @@
+"""Gọi zbar trực tiếp trên buffer numpy, không chép ảnh và không tạo lại scanner mỗi lần quét
+
+pyzbar.decode() chép ảnh bằng tobytes() rồi tạo + cấu hình một zbar scanner mới
+cho từng ảnh. Ở đây mỗi thread giữ sẵn scanner đã cấu hình cho từng bộ
+symbology, và zbar đọc thẳng vùng nhớ của mảng uint8 liên tục.
+"""
+import threading
+from ctypes import c_void_p
+
+import numpy as np
+# Hàm nội bộ của pyzbar, không có trong API công khai: requirements.txt giữ đúng pyzbar==0.1.9
+from pyzbar.pyzbar import _decode_symbols, _symbols_for_image
+from pyzbar.pyzbar_error import PyZbarError
+from pyzbar.wrapper import (
+    zbar_image_scanner_create, zbar_image_scanner_destroy, zbar_image_scanner_set_config,
+    zbar_image_create, zbar_image_destroy, zbar_image_set_format, zbar_image_set_size,
+    zbar_image_set_data, zbar_scan_image, ZBarConfig, ZBarSymbol,
+)
+
+# fourcc 'Y800': ảnh xám 8 bit
+FOURCC_Y800 = 0x30303859
+
+_local = threading.local()
+
+
+class ZbarScanner:
+    """Một zbar image scanner sống lâu, chỉ bật các symbology cần quét"""
+
+    def __init__(self, symbols=None):
+        self.symbols = tuple(symbols) if symbols else None
+        self._scanner = zbar_image_scanner_create()
+        if not self._scanner:
+            raise PyZbarError('Could not create zbar image scanner')
+        if self.symbols:
+            for symbol in set(ZBarSymbol).difference(self.symbols):
+                zbar_image_scanner_set_config(self._scanner, symbol, ZBarConfig.CFG_ENABLE, 0)
+            for symbol in self.symbols:
+                zbar_image_scanner_set_config(self._scanner, symbol, ZBarConfig.CFG_ENABLE, 1)
+
+    def scan(self, gray: np.ndarray) -> list:
+        """Quét ảnh xám uint8 2 chiều; mảng không liên tục mới bị chép"""
+        if gray.ndim != 2 or gray.dtype != np.uint8:
+            raise ValueError(f"zbar needs a 2-D uint8 image, got {gray.dtype} {gray.shape}")
+        gray = np.ascontiguousarray(gray)
+        height, width = gray.shape
+        image = zbar_image_create()
+        if not image:
+            raise PyZbarError('Could not create zbar image')
+        try:
+            zbar_image_set_format(image, FOURCC_Y800)
+            zbar_image_set_size(image, width, height)
+            # Không truyền hàm cleanup: zbar chỉ mượn vùng nhớ, gray còn sống tới khi hủy image
+            zbar_image_set_data(image, c_void_p(gray.ctypes.data), gray.nbytes, None)
+            if zbar_scan_image(self._scanner, image) < 0:
+                raise PyZbarError('Unsupported image format')
+            return list(_decode_symbols(_symbols_for_image(image)))
+        finally:
+            zbar_image_destroy(image)
+
+    def close(self):
+        if self._scanner:
+            zbar_image_scanner_destroy(self._scanner)
+            self._scanner = None
+
+    def __del__(self):
+        self.close()
+
+
+def scanner_for(symbols=None) -> ZbarScanner:
+    """Scanner của thread hiện tại cho bộ symbology này (tạo ở lần gọi đầu)"""
+    scanners = getattr(_local, 'scanners', None)
+    if scanners is None:
+        scanners = _local.scanners = {}
+    key = tuple(symbols) if symbols else None
+    scanner = scanners.get(key)
+    if scanner is None:
+        scanner = scanners[key] = ZbarScanner(key)
+    return scanner
+
+
+def scan(gray: np.ndarray, symbols=None) -> list:
+    """Thay thế pyzbar.decode cho ảnh xám numpy"""
+    return scanner_for(symbols).scan(gray)
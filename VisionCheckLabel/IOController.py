@@ -1,10 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import serial
+import abc
+import asyncio
 import enum
-import time
 import threading
-from typing import Callable, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+try:
+    import serial_asyncio
+except ImportError:
+    serial_asyncio = None
 
 class OutPorts(enum.Enum):
     All = 0
@@ -36,12 +42,120 @@ class IOType(enum.Enum):
     FourPorts = 0
     EightPorts = 1
 
+FRAME_HEADER = 0x98
+FRAME_TRAILER = 0x99
+
+class FrameParser:
+    """Split a byte stream into fixed-length HEADER ... TRAILER frames
+
+    Bytes are kept between feed() calls, so a frame split across reads is
+    completed by the next read and several frames in one read are all returned.
+    Bytes that cannot start a valid frame are skipped (and counted) until the
+    next header.
+    """
+
+    def __init__(self, frame_length: int = 3):
+        self.frame_length = frame_length
+        self.buffer = bytearray()
+        self.discarded = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Append data and return the complete frames now in the buffer, in order"""
+        self.buffer += data
+        buffer = self.buffer
+        end = len(buffer)
+        frames = []
+        start = 0
+        while True:
+            header = buffer.find(FRAME_HEADER, start)
+            if header < 0:
+                self.discarded += end - start
+                start = end
+                break
+            self.discarded += header - start
+            if end - header < self.frame_length:
+                # Incomplete frame: wait for the rest
+                start = header
+                break
+            if buffer[header + self.frame_length - 1] == FRAME_TRAILER:
+                frames.append(bytes(buffer[header:header + self.frame_length]))
+                start = header + self.frame_length
+            else:
+                # Header byte without a trailer where it should be: resync on the next header
+                self.discarded += 1
+                start = header + 1
+        del buffer[:start]
+        return frames
+
+    def reset(self):
+        self.buffer.clear()
+
+
+class StagedOutputs:
+    """Output changes staged with set(), sent together by a transaction"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.changes: Dict[OutPorts, PortState] = {}
+        self.result = None
+
+    def set(self, command: OutPorts, state: PortState) -> 'StagedOutputs':
+        if command == OutPorts.All:
+            # All overrides every port staged before it
+            self.changes.clear()
+        else:
+            self.changes.pop(command, None)
+        self.changes[command] = state
+        return self
+
+    def take(self) -> Dict[OutPorts, PortState]:
+        """Return the staged changes and start over with none"""
+        changes, self.changes = self.changes, {}
+        return changes
+
+
+class OutputTransaction(StagedOutputs):
+    """Changes sent with IOController.write_outs() when the with block ends (nothing if it raises)"""
+
+    def commit(self) -> bool:
+        return self.controller.write_outs(self.take())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.result = self.commit()
+
+
+class AsyncOutputTransaction(StagedOutputs):
+    """Changes sent with AsyncIOController.write_outs() when the async with block ends (nothing if it raises)"""
+
+    async def commit(self) -> bool:
+        return await self.controller.write_outs(self.take())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.result = await self.commit()
+
+
 class IODataReceivedEventArgs:
     def __init__(self, command: InPorts, state: PortState):
         self.command = command
         self.state = state
 
-class IOController:
+class IOControllerBase(abc.ABC):
+    """Port settings, frame parsing, input decoding and the output shadow register
+
+    Shared by IOController (reader thread, blocking writes) and AsyncIOController
+    (asyncio streams). A subclass owns the port: it opens it, calls reset_stream(),
+    sends the frames planned by plan_outputs() and feeds what it reads to
+    handle_chunk().
+    """
+
     def __init__(self, port_name: str, baud_rate: int = 19200, io_type: IOType = IOType.EightPorts):
         self.port_name = port_name
         self.baud_rate = baud_rate
@@ -49,10 +163,14 @@ class IOController:
         self.data_bits = 8
         self.parity = serial.PARITY_NONE
         self.stop_bits = serial.STOPBITS_ONE
+        # Length of an input frame: header, input state, trailer
         self.received_bytes_threshold = 3
         self.stored_byte_in = 0
-        self.serial_port = None
+        # Shadow register of the outputs: last state sent, and which bits are known (nothing until the first write)
+        self.stored_byte_out = 0
+        self.known_byte_out = 0
         self.data_received_callbacks = []
+        self.parser = FrameParser(self.received_bytes_threshold)
         self.running = False
 
         if self.io_type == IOType.FourPorts:
@@ -61,14 +179,168 @@ class IOController:
         else:
             self.port_out = [0xFF, 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80]
             self.port_in = [0x00, 0x80, 0x40, 0x20, 0x10, 0x08, 0x04, 0x02, 0x01]
+        self.out_ports = [OutPorts(index) for index in range(1, len(self.port_out))]
+        self.all_out_mask = 0
+        for port in self.out_ports:
+            self.all_out_mask |= self.port_out[port.value]
+        self.all_in_mask = 0
+        for mask in self.port_in:
+            self.all_in_mask |= mask
 
+        # changed_bits (old XOR new) -> ((port, bit mask), ...) for every mapped input in it, by port number
+        self.changed_inputs: List[Tuple[Tuple[InPorts, int], ...]] = [
+            tuple((InPorts(index), mask) for index, mask in enumerate(self.port_in)
+                  if index and changed_bits & mask)
+            for changed_bits in range(256)
+        ]
+
+    @abc.abstractmethod
     def is_open(self) -> bool:
-        return self.serial_port is not None and self.serial_port.is_open
+        """Whether the port is open and frames can be sent"""
 
     def add_data_received_callback(self, callback: Callable[[object, IODataReceivedEventArgs], None]):
         """Add a callback function that will be called when data is received"""
         self.data_received_callbacks.append(callback)
 
+    def reset_stream(self):
+        """Start a new connection: drop partial frames and forget the output shadow"""
+        self.parser = FrameParser(self.received_bytes_threshold)
+        self.invalidate_outputs()
+        self.running = True
+
+    def out_frame(self, command: OutPorts, state: PortState) -> Optional[bytearray]:
+        """Build the frame for one output command, None if the port does not exist on this IO type"""
+        # Check if trying to use ports > 4 when in FourPorts mode
+        if self.io_type == IOType.FourPorts and command.value > OutPorts.Out_4.value:
+            self.write_line(f"Cannot use {command} with Four Ports mode")
+            return None
+        return bytearray([
+            FRAME_HEADER,
+            self.port_out[command.value],
+            state.value,
+            FRAME_TRAILER
+        ])
+
+    def invalidate_outputs(self):
+        """Forget the shadow register (e.g. the box was power-cycled): the next writes are all sent"""
+        self.known_byte_out = 0
+
+    def plan_outputs(self, changes, force: bool = False):
+        """Work out the frames for a set of output changes
+
+        changes is a dict (or pairs) OutPorts -> PortState, later entries win and
+        All applies to every port. Ports the shadow register already shows in the
+        requested state are left out unless force. When the result leaves every
+        port in the same state and needs more than one frame, a single All frame
+        is used instead. Returns (commands, bytes), or None if a port does not
+        exist on this IO type.
+        """
+        target: Dict[OutPorts, PortState] = {}
+        for command, state in (changes.items() if isinstance(changes, dict) else changes):
+            if command == OutPorts.All:
+                target = {port: state for port in self.out_ports}
+            elif self.out_frame(command, state) is None:
+                return None
+            else:
+                target.pop(command, None)
+                target[command] = state
+
+        commands = []
+        for port, state in target.items():
+            mask = self.port_out[port.value]
+            if force or not self.known_byte_out & mask or bool(self.stored_byte_out & mask) != (state == PortState.On):
+                commands.append((port, state))
+
+        if len(commands) > 1:
+            on_byte, known_byte = self.apply_outputs(commands, self.stored_byte_out, self.known_byte_out)
+            # Only when no port would end up in a different state: All never glitches an output
+            if known_byte == self.all_out_mask and on_byte in (0, self.all_out_mask):
+                commands = [(OutPorts.All, PortState.On if on_byte else PortState.Off)]
+
+        return commands, b''.join(self.out_frame(command, state) for command, state in commands)
+
+    def apply_outputs(self, commands, on_byte: int, known_byte: int) -> Tuple[int, int]:
+        """Shadow register (on, known) after sending commands"""
+        for command, state in commands:
+            mask = self.all_out_mask if command == OutPorts.All else self.port_out[command.value]
+            known_byte |= mask
+            on_byte = on_byte | mask if state == PortState.On else on_byte & ~mask
+        return on_byte, known_byte
+
+    def handle_chunk(self, chunk: bytes):
+        """Feed bytes read from the port to the parser and process every complete frame"""
+        self.write_line(f"Raw data received: {' '.join([f'{b:02X}' for b in chunk])}")
+        discarded = self.parser.discarded
+        for frame in self.parser.feed(chunk):
+            try:
+                self.process_in_data(frame)
+            except Exception as ex:
+                self.write_line(f"Error processing input data: {ex}")
+        if self.parser.discarded != discarded:
+            self.write_line(f"Discarded {self.parser.discarded - discarded} byte(s) outside a frame")
+
+    def process_in_data(self, buffer: bytes):
+        """Process one input frame: raise an event for every input that changed"""
+        if len(buffer) < 3:
+            return
+
+        new_byte = buffer[1]
+        changed = self.changed_inputs[self.stored_byte_in ^ new_byte]
+        # Update stored byte before the callbacks run, so input_state() already shows this frame
+        self.stored_byte_in = new_byte
+
+        for command, mask in changed:
+            state = PortState.On if new_byte & mask else PortState.Off
+            self.write_line(f"I/O Controller Received {command}, State {state}")
+
+            # Notify callbacks
+            event_args = IODataReceivedEventArgs(command, state)
+            for callback in self.data_received_callbacks:
+                callback(self, event_args)
+
+    def input_state(self) -> Dict[InPorts, PortState]:
+        """Snapshot of every input port from the last received frame"""
+        state_byte = self.stored_byte_in
+        return {InPorts(index): PortState.On if state_byte & mask else PortState.Off
+                for index, mask in enumerate(self.port_in) if index}
+
+    def input_mask(self, port: InPorts) -> int:
+        """Bit mask of an input port in the state byte; InPorts.All is every input of this IO type"""
+        if port == InPorts.All:
+            return self.all_in_mask
+        if port.value >= len(self.port_in):
+            raise ValueError(f"{port} does not exist with {self.io_type.name} mode")
+        return self.port_in[port.value]
+
+    def is_input_in(self, port: InPorts, state: PortState) -> bool:
+        """Whether an input is in state in the last received frame (InPorts.All: every input is)"""
+        mask = self.input_mask(port)
+        return self.stored_byte_in & mask == (mask if state == PortState.On else 0)
+
+    def is_input_on(self, port: InPorts) -> bool:
+        """Whether one input port (InPorts.All: every input) was On in the last received frame"""
+        return self.is_input_in(port, PortState.On)
+
+    def write_line(self, msg: str):
+        """Write log message - overridden in GUI application"""
+        print(msg)
+
+
+class IOController(IOControllerBase):
+    """I/O controller on a blocking serial port, read by a background thread"""
+
+    def __init__(self, port_name: str, baud_rate: int = 19200, io_type: IOType = IOType.EightPorts):
+        super().__init__(port_name, baud_rate, io_type)
+        # read() blocks at most this long, so close() is noticed quickly while an idle port costs no CPU
+        self.read_timeout = 0.05
+        self._out_lock = threading.Lock()
+        self.serial_port = None
+        self.read_thread = None
+        self._stop_event = threading.Event()
+
+    def is_open(self) -> bool:
+        return self.serial_port is not None and self.serial_port.is_open
+
     def open(self) -> bool:
         """Open the serial connection to the I/O controller"""
         try:
@@ -78,12 +350,13 @@ class IOController:
                 bytesize=self.data_bits,
                 parity=self.parity,
                 stopbits=self.stop_bits,
-                timeout=1
+                timeout=self.read_timeout
             )
             self.write_line(f"I/O Controller Connected {self.port_name}")
             
             # Start a thread to read from the serial port
-            self.running = True
+            self._stop_event.clear()
+            self.reset_stream()
             self.read_thread = threading.Thread(target=self.read_loop)
             self.read_thread.daemon = True
             self.read_thread.start()
@@ -96,113 +369,290 @@ class IOController:
     def close(self):
         """Close the serial connection"""
         self.running = False
+        self._stop_event.set()
         if self.read_thread and self.read_thread.is_alive():
+            # Wake the blocked read() right away instead of waiting for its timeout
+            cancel_read = getattr(self.serial_port, 'cancel_read', None)
+            if cancel_read is not None:
+                try:
+                    cancel_read()
+                except Exception:
+                    pass
             self.read_thread.join(timeout=1.0)
             
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
             self.write_line(f"I/O Controller Disconnected {self.port_name}")
 
-    def write_out(self, command: OutPorts, state: PortState) -> bool:
-        """Send a command to the output port"""
+    def transaction(self) -> OutputTransaction:
+        """Stage changes to several outputs and send them in one write:
+
+            with io.transaction() as tx:
+                tx.set(OutPorts.Out_1, PortState.On)
+                tx.set(OutPorts.Out_3, PortState.Off)
+        """
+        return OutputTransaction(self)
+
+    def write_out(self, command: OutPorts, state: PortState, force: bool = False) -> bool:
+        """Send a command to the output port (skipped if the output is already in that state)"""
+        return self.write_outs({command: state}, force)
+
+    def write_outs(self, changes, force: bool = False) -> bool:
+        """Send changes to several outputs with one write and one flush, see plan_outputs()"""
         result = False
-        
+
         if not self.is_open():
             self.write_line("Cannot send command - port is not open")
             return result
-            
-        # Check if trying to use ports > 4 when in FourPorts mode
-        if self.io_type == IOType.FourPorts and command.value > OutPorts.Out_4.value:
-            self.write_line(f"Cannot use {command} with Four Ports mode")
-            return result
 
-        try:
-            bytes_to_send = bytearray([
-                0x98,
-                self.port_out[command.value],
-                state.value,
-                0x99
-            ])
-            self.write_line(f"Sending raw data: {' '.join([f'{b:02X}' for b in bytes_to_send])}")
-            self.serial_port.write(bytes_to_send)
-            self.serial_port.flush()  # Đảm bảo dữ liệu được gửi đi
-            self.write_line(f"I/O Controller Send {command}, State {state}")
-            result = True
-        except Exception as ex:
-            self.write_line(f"Error writing to port: {ex}")
+        with self._out_lock:
+            plan = self.plan_outputs(changes, force)
+            if plan is None:
+                return result
+            commands, bytes_to_send = plan
+            if not commands:
+                return True
+
+            try:
+                self.write_line(f"Sending raw data: {' '.join([f'{b:02X}' for b in bytes_to_send])}")
+                self.serial_port.write(bytes_to_send)
+                self.serial_port.flush()  # Đảm bảo dữ liệu được gửi đi
+                self.stored_byte_out, self.known_byte_out = self.apply_outputs(
+                    commands, self.stored_byte_out, self.known_byte_out)
+                for command, state in commands:
+                    self.write_line(f"I/O Controller Send {command}, State {state}")
+                result = True
+            except Exception as ex:
+                # Part of the frames may have gone out
+                self.invalidate_outputs()
+                self.write_line(f"Error writing to port: {ex}")
 
         return result
 
     def read_loop(self):
-        """Read continuously from the serial port in a separate thread"""
-        while self.running and self.is_open():
+        """Read from the serial port in a separate thread
+
+        Blocks in read() until a byte arrives (or read_timeout passes), then takes
+        whatever else is already buffered, so a frame is handled as soon as its
+        last byte is in. There is no polling sleep. The parser keeps partial
+        frames between reads and hands back every frame of a burst in order.
+        A port that is gone ends the loop; other read errors are retried with a
+        growing delay so a persistent one cannot spin or flood the log.
+        """
+        retry_delay = 0.0
+        while not self._stop_event.is_set() and self.is_open():
             try:
-                # Check if there's data available to read
-                if self.serial_port.in_waiting > 0:  # Thay đổi để đọc bất kỳ dữ liệu nào
-                    # Read available bytes
-                    buffer = self.serial_port.read(self.serial_port.in_waiting)
-                    self.write_line(f"Raw data received: {' '.join([f'{b:02X}' for b in buffer])}")
-                    if len(buffer) >= 3:  # Chỉ xử lý nếu đủ 3 byte
-                        self.process_in_data(buffer)
-                    
-                # Small delay to prevent high CPU usage
-                time.sleep(0.1)
+                chunk = self.serial_port.read(1)
+                if not chunk:
+                    continue
+                waiting = self.serial_port.in_waiting
+                if waiting:
+                    chunk += self.serial_port.read(waiting)
+            except (serial.SerialException, OSError) as ex:
+                # Port is gone (cable unplugged, adapter removed): stop instead of retrying in a loop
+                if not self._stop_event.is_set():
+                    self.write_line(f"Error reading from port: {ex}")
+                break
             except Exception as ex:
-                self.write_line(f"Error reading from port: {ex}")
-                time.sleep(1)  # Longer delay after error
-            """Read continuously from the serial port in a separate thread"""
+                if self._stop_event.is_set():
+                    break
+                retry_delay = min(max(retry_delay * 2, self.read_timeout), 1.0)
+                self.write_line(f"Error reading from port: {ex} (retry in {retry_delay:.2f} s)")
+                self._stop_event.wait(retry_delay)
+                continue
+            retry_delay = 0.0
+            self.handle_chunk(chunk)
+        self.running = False
+
+
+class AsyncIOController(IOControllerBase):
+    """I/O controller for asyncio code: no reader thread, one event loop can drive many boxes
+
+    The port is opened as a non-blocking stream (pyserial-asyncio) and read by a
+    task on the event loop. Frames are parsed and decoded as in IOController, and
+    the registered callbacks run on the loop. Events can also be consumed with
+    `async for event in controller.events()` or awaited with wait_for().
+    """
+
+    def __init__(self, port_name: str, baud_rate: int = 19200, io_type: IOType = IOType.EightPorts):
+        super().__init__(port_name, baud_rate, io_type)
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.read_task: Optional[asyncio.Task] = None
+        self._subscribers: List[asyncio.Queue] = []
+        self._waiters: List[Tuple[InPorts, PortState, asyncio.Future]] = []
+        self.add_data_received_callback(self._dispatch)
+
+    def is_open(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def open(self) -> bool:
+        """Open the serial connection and start reading on the running event loop"""
+        if serial_asyncio is None:
+            self.write_line("AsyncIOController needs pyserial-asyncio: pip install pyserial-asyncio")
+            return False
+        try:
+            self.reader, self.writer = await serial_asyncio.open_serial_connection(
+                url=self.port_name,
+                baudrate=self.baud_rate,
+                bytesize=self.data_bits,
+                parity=self.parity,
+                stopbits=self.stop_bits
+            )
+        except Exception as ex:
+            self.write_line(f"Error opening port: {ex}")
+            return False
+        self.write_line(f"I/O Controller Connected {self.port_name}")
+        self.start_reading()
+        return True
+
+    def start_reading(self):
+        """Start the reader task on self.reader (called by open())"""
+        self.reset_stream()
+        self.read_task = asyncio.get_running_loop().create_task(self.read_stream())
+
+    async def close(self):
+        """Stop reading, close the port and end every events() stream and wait_for()"""
+        self.running = False
+        if self.read_task is not None:
+            self.read_task.cancel()
+            try:
+                await self.read_task
+            except asyncio.CancelledError:
+                pass
+            self.read_task = None
+        else:
+            # Never read: end the events() streams still waiting for open()
+            self._end_streams()
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+            self.write_line(f"I/O Controller Disconnected {self.port_name}")
+
+    def transaction(self) -> AsyncOutputTransaction:
+        """Stage changes to several outputs and send them in one write:
 
-            while self.running and self.is_open():
+            async with io.transaction() as tx:
+                tx.set(OutPorts.Out_1, PortState.On)
+                tx.set(OutPorts.Out_3, PortState.Off)
+        """
+        return AsyncOutputTransaction(self)
+
+    async def write_out(self, command: OutPorts, state: PortState, force: bool = False) -> bool:
+        """Send a command to the output port (skipped if the output is already in that state)"""
+        return await self.write_outs({command: state}, force)
+
+    async def write_outs(self, changes, force: bool = False) -> bool:
+        """Send changes to several outputs with one write, returns once the frames are handed to the OS"""
+        if not self.is_open():
+            self.write_line("Cannot send command - port is not open")
+            return False
+
+        plan = self.plan_outputs(changes, force)
+        if plan is None:
+            return False
+        commands, bytes_to_send = plan
+        if not commands:
+            return True
+
+        try:
+            self.write_line(f"Sending raw data: {' '.join([f'{b:02X}' for b in bytes_to_send])}")
+            self.writer.write(bytes_to_send)
+            # Update the shadow before awaiting, so a write_outs() running meanwhile plans against it
+            self.stored_byte_out, self.known_byte_out = self.apply_outputs(
+                commands, self.stored_byte_out, self.known_byte_out)
+            await self.writer.drain()
+            for command, state in commands:
+                self.write_line(f"I/O Controller Send {command}, State {state}")
+            return True
+        except Exception as ex:
+            self.invalidate_outputs()
+            self.write_line(f"Error writing to port: {ex}")
+            return False
+
+    async def read_stream(self):
+        """Reader task: feed every chunk to the frame parser and process the frames"""
+        try:
+            while True:
                 try:
-                    # Check if there's data available to read
-                    if self.serial_port.in_waiting >= self.received_bytes_threshold:
-                        # Read available bytes
-                        buffer = self.serial_port.read(self.serial_port.in_waiting)
-                        self.process_in_data(buffer)
-                        
-                        # Print received bytes for debugging
-                        debug_str = "Received bytes: " + " ".join([f"{b:02X}" for b in buffer])
-                        self.write_line(debug_str)
-                        
-                    # Small delay to prevent high CPU usage
-                    time.sleep(0.1)
-                except Exception as ex:
+                    chunk = await self.reader.read(256)
+                except (serial.SerialException, OSError) as ex:
                     self.write_line(f"Error reading from port: {ex}")
-                    time.sleep(1)  # Longer delay after error
+                    break
+                if not chunk:
+                    # Port closed
+                    break
+                self.handle_chunk(chunk)
+        finally:
+            self.running = False
+            self._end_streams()
 
-    def process_in_data(self, buffer: bytes):
-        """Process incoming data from the I/O controller"""
-        if len(buffer) < 3:
-            return
+    def _dispatch(self, sender, event_args: IODataReceivedEventArgs):
+        for subscriber in self._subscribers:
+            subscriber.put_nowait(event_args)
+        for waiter in list(self._waiters):
+            port, state, future = waiter
+            # The state byte is already updated, so All is checked on the whole byte
+            if (event_args.command == port and event_args.state == state) or \
+                    (port == InPorts.All and self.is_input_in(port, state)):
+                self._waiters.remove(waiter)
+                if not future.done():
+                    future.set_result(True)
 
-        # Calculate the difference between current and stored byte
-        temp = self.stored_byte_in - buffer[1] if buffer[1] < self.stored_byte_in else buffer[1] - self.stored_byte_in
-        
-        # Find the command based on the port_in mapping
+    def _end_streams(self):
+        for subscriber in self._subscribers:
+            subscriber.put_nowait(None)
+        for _, _, future in self._waiters:
+            if not future.done():
+                future.set_result(False)
+        self._waiters.clear()
+
+    async def events(self) -> AsyncIterator[IODataReceivedEventArgs]:
+        """Yield every input event from now on until the controller is closed
+
+        Can be started before open(): the stream then waits for the first event.
+        """
+        subscriber = asyncio.Queue()
+        self._subscribers.append(subscriber)
         try:
-            command_index = self.port_in.index(temp)
-            command = InPorts(command_index)
-        except ValueError:
-            # If the byte is not found in port_in
-            self.write_line(f"Unknown input byte: {temp:02X}")
-            return
-            
-        # Determine state based on whether value increased or decreased
-        state = PortState.On if buffer[1] > self.stored_byte_in else PortState.Off
-        
-        # Update stored byte
-        self.stored_byte_in = buffer[1]
-        
-        self.write_line(f"I/O Controller Received {command}, State {state}")
-        
-        # Notify callbacks
-        event_args = IODataReceivedEventArgs(command, state)
-        for callback in self.data_received_callbacks:
-            callback(self, event_args)
+            while True:
+                event_args = await subscriber.get()
+                if event_args is None:
+                    break
+                yield event_args
+        finally:
+            self._subscribers.remove(subscriber)
 
-    def write_line(self, msg: str):
-        """Write log message - overridden in GUI application"""
-        print(msg)
+    async def wait_for(self, port: InPorts, state: PortState = PortState.On, timeout: Optional[float] = None) -> bool:
+        """Wait until an input is in the given state (InPorts.All: until every input is)
+
+        Returns True at once if the last received frame already has it, False on
+        timeout or when the controller is closed first. Raises ValueError for a
+        port that does not exist on this IO type.
+        """
+        if self.is_input_in(port, state):
+            return True
+        return await self.wait_for_edge(port, state, timeout)
+
+    async def wait_for_edge(self, port: InPorts, state: PortState = PortState.On,
+                            timeout: Optional[float] = None) -> bool:
+        """Wait for the next event that switches an input to the given state (ignores its current state)"""
+        self.input_mask(port)  # ValueError for a port this IO type does not have
+        if not self.running:
+            return False
+        waiter = (port, state, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter[2], timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
 
 
 class IOControllerApp:
@@ -367,7 +817,8 @@ class IOControllerApp:
             return
             
         port = OutPorts(port_num)
-        self.io_controller.write_out(port, state)
+        # A button press always reaches the box, even if the shadow register says the port is already there
+        self.io_controller.write_out(port, state, force=True)
     
     def on_data_received(self, sender, event_args):
         # Update the input indicator in the UI
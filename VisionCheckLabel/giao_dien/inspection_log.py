@@ -0,0 +1,184 @@
+"""Log kiểm tra: lưu toàn bộ vào SQLite, bảng trên giao diện chỉ giữ một cửa sổ giới hạn
+
+InspectionLogModel là model cho QTableView, dòng mới nhất ở trên cùng. Dòng mới
+được gom lại và thêm theo lô (một transaction SQLite, một lần insertRows), số
+dòng trong bộ nhớ bị cắt về capacity khi người dùng đang theo dõi dòng mới nhất.
+Ghi SQLite lỗi (file bị khóa, đĩa đầy) thì các dòng được giữ lại và ghi lại sau.
+Cuộn xuống cuối bảng thì các dòng cũ hơn được nạp dần từ SQLite (fetchMore).
+Nhờ vậy bộ nhớ và chi phí vẽ không tăng theo thời gian chạy máy.
+"""
+import datetime
+import sqlite3
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+
+COLUMNS = ["Thời gian", "S/N", "Model", "Kết quả", "Thời gian xử lý"]
+
+
+class InspectionLogStore:
+    """Bảng inspection_log trong SQLite, chỉ thêm mới"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS inspection_log ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " ts TEXT NOT NULL,"
+            " sn TEXT,"
+            " model TEXT,"
+            " result TEXT,"
+            " duration_ms REAL)")
+        self._db.commit()
+
+    def append_many(self, rows):
+        """Ghi các dòng (ts, sn, model, result, duration_ms) trong một transaction, trả về các dòng kèm id"""
+        stored = []
+        with self._db:
+            for row in rows:
+                cursor = self._db.execute(
+                    "INSERT INTO inspection_log (ts, sn, model, result, duration_ms) VALUES (?, ?, ?, ?, ?)", row)
+                stored.append((cursor.lastrowid,) + tuple(row))
+        return stored
+
+    def fetch_before(self, row_id, limit):
+        """Các dòng có id < row_id (None = từ dòng mới nhất), mới nhất trước"""
+        if row_id is None:
+            query = "SELECT id, ts, sn, model, result, duration_ms FROM inspection_log ORDER BY id DESC LIMIT ?"
+            params = (limit,)
+        else:
+            query = ("SELECT id, ts, sn, model, result, duration_ms FROM inspection_log"
+                     " WHERE id < ? ORDER BY id DESC LIMIT ?")
+            params = (row_id, limit)
+        return self._db.execute(query, params).fetchall()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class InspectionLogModel(QAbstractTableModel):
+    """Cửa sổ các dòng log gần nhất (mới nhất ở dòng 0), nạp thêm dòng cũ khi cuộn xuống cuối"""
+    rows_prepended = pyqtSignal(int)
+
+    def __init__(self, store=None, capacity=500, page_size=200, batch_ms=100, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.capacity = capacity
+        self.page_size = page_size
+        # Khi đang xem dòng cũ thì không cắt, nhưng vẫn có giới hạn cứng để bộ nhớ không tăng mãi
+        self.hard_limit = capacity * 4
+        # True khi view đang ở đầu bảng (theo dõi dòng mới nhất)
+        self.follow_live = True
+        # (id, ts, sn, model, result, duration_ms), mới nhất ở đầu; list để data() truy cập O(1)
+        self._rows = []
+        self._pending = []
+        self.retry_ms = 1000
+        self._has_older = store is not None
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self.batch_ms = batch_ms
+        self._flush_timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        _, ts, sn, model, result, duration_ms = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return self._format_time(ts)
+            if column == 4:
+                return "" if duration_ms is None else f"{duration_ms:.0f} ms"
+            return (sn, model, result)[column - 1]
+        if role == Qt.ItemDataRole.BackgroundRole and column == 3:
+            if "PASS" in result:
+                return Qt.GlobalColor.green
+            if "FAIL" in result:
+                return Qt.GlobalColor.red
+        return None
+
+    @staticmethod
+    def _format_time(ts):
+        # Dòng trong ngày chỉ hiện giờ như trước, dòng cũ hơn (nạp từ SQLite) hiện thêm ngày
+        today = datetime.date.today().isoformat()
+        return ts[11:] if ts.startswith(today) else f"{ts[8:10]}/{ts[5:7]} {ts[11:]}"
+
+    def append(self, sn, model, result, duration_ms=None):
+        """Thêm một dòng; dòng được gom lại và đưa vào bảng ở lần flush kế tiếp"""
+        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._pending.append((ts, sn, model, result, duration_ms))
+        if not self._flush_timer.isActive():
+            self._flush_timer.start(self.batch_ms)
+
+    def flush(self):
+        """Ghi các dòng đang chờ vào SQLite và thêm vào đầu bảng trong một lần"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        if self.store is not None:
+            try:
+                rows = self.store.append_many(pending)
+            except sqlite3.Error as e:
+                # Hàm này chạy trong slot của QTimer: exception ở đây làm tắt chương trình
+                print(f"Cannot write inspection log: {e}")
+                self._pending[:0] = pending
+                self._flush_timer.start(self.retry_ms)
+                return
+        else:
+            rows = [(None,) + row for row in pending]
+
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        self._rows[:0] = reversed(rows)  # dòng mới nhất lên đầu
+        self.endInsertRows()
+        self.rows_prepended.emit(len(rows))
+        self._trim(self.capacity if self.follow_live else self.hard_limit)
+
+    def _trim(self, limit):
+        extra = len(self._rows) - limit
+        if extra <= 0:
+            return
+        first = len(self._rows) - extra
+        self.beginRemoveRows(QModelIndex(), first, len(self._rows) - 1)
+        del self._rows[first:]
+        self.endRemoveRows()
+        # Các dòng bị cắt vẫn nằm trong SQLite, cuộn xuống sẽ nạp lại
+        self._has_older = self.store is not None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_older
+
+    def fetchMore(self, parent=QModelIndex()):
+        """Nạp thêm một trang dòng cũ hơn dòng cuối bảng từ SQLite"""
+        if parent.isValid() or self.store is None:
+            return
+        oldest = self._rows[-1][0] if self._rows else None
+        rows = self.store.fetch_before(oldest, self.page_size)
+        if len(rows) < self.page_size:
+            self._has_older = False
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def clear(self):
+        """Xóa bảng trên giao diện (dữ liệu trong SQLite giữ nguyên)"""
+        self._pending.clear()
+        self.beginResetModel()
+        self._rows.clear()
+        self.endResetModel()
+        self._has_older = False
@@ -0,0 +1,195 @@
+"""Đo độ trễ từng chặng của mỗi lần kiểm tra, từ lúc nhấn Start tới lúc ảnh và kết quả lên màn hình
+
+Mỗi lần kiểm tra là một bản ghi các mốc thời gian (time.time(), để so được với
+mtime của file ảnh):
+    start      nhấn Start (Recheck chỉ chấm lại ảnh đang hiển thị, không tạo lần kiểm tra mới)
+    sent       TRIGGER được ghi ra cổng COM
+    answered   nhận phản hồi TRIGGER
+    written    camera ghi xong file ảnh (mtime của file)
+    detected   ResultFolderWatcher báo ảnh mới
+    loaded     ImageLoadWorker nạp và thu nhỏ xong
+    displayed  pixmap được đặt lên camera_label / image_view
+    decoded    nhận kết quả giải mã + chấm PASS/FAIL
+Chặng (span) là khoảng giữa hai mốc, xem SPANS. Lần kiểm tra xong khi đã hiển
+thị ảnh và có kết quả; các chặng có đủ hai mốc được đưa vào cửa sổ trượt để
+tính p50 / p95 và lưu lại để xuất CSV.
+
+Ảnh được ghép với TRIGGER cũ nhất còn đang chờ ảnh. Ảnh không có TRIGGER
+(camera tự chụp) tạo lần kiểm tra mới bắt đầu từ mốc written. Nếu camera ghi
+vào thư mục mạng thì mtime theo đồng hồ của máy kia, chặng camera / detect
+khi đó chỉ đúng khi hai máy đồng bộ giờ.
+"""
+import csv
+import itertools
+import time
+from collections import OrderedDict, deque
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFont
+from PyQt6.QtWidgets import QFrame, QGridLayout, QLabel
+
+from pipeline import percentile
+
+EVENTS = ('start', 'sent', 'answered', 'written', 'detected', 'loaded', 'displayed', 'decoded')
+
+# tên chặng -> (mốc đầu, mốc cuối)
+SPANS = OrderedDict([
+    ('queue', ('start', 'sent')),           # chờ trong hàng đợi TRIGGER
+    ('serial', ('sent', 'answered')),       # round-trip cổng COM
+    ('camera', ('answered', 'written')),    # chụp + ghi file
+    ('detect', ('written', 'detected')),    # thông báo thư mục + chờ file đứng yên
+    ('load', ('detected', 'loaded')),       # đọc đĩa + thu nhỏ
+    ('display', ('loaded', 'displayed')),   # chuyển QPixmap + vẽ
+    ('decode', ('detected', 'decoded')),    # giải mã + chấm PASS/FAIL
+    ('total', ('first', 'done')),           # mốc đầu tiên -> ảnh và kết quả đều đã lên màn hình
+])
+
+
+class LatencyTracker:
+    """Ghi mốc thời gian của các lần kiểm tra, giữ cửa sổ trượt của từng chặng
+
+    Chỉ gọi từ GUI thread (các worker báo về qua signal).
+    """
+
+    def __init__(self, window=200, history=5000, max_active=64):
+        self.window = window
+        self.max_active = max_active
+        self.samples = {name: deque(maxlen=window) for name in SPANS}
+        self.completed = deque(maxlen=history)  # bản ghi các lần kiểm tra đã xong, để xuất CSV
+        self._active = OrderedDict()            # id -> {'path': ..., 'events': {...}}
+        self._by_path = {}
+        self._ids = itertools.count(1)
+
+    def begin(self, timestamp=None):
+        """Bắt đầu một lần kiểm tra (nhấn Start / Recheck), trả về id"""
+        inspection_id = next(self._ids)
+        self._active[inspection_id] = {'path': None, 'events': {'start': timestamp or time.time()}}
+        self._evict()
+        return inspection_id
+
+    def mark(self, inspection_id, event, timestamp=None):
+        """Ghi mốc event; mốc đã có thì giữ nguyên (lần vẽ lại sau đó không tính)"""
+        record = self._active.get(inspection_id)
+        if record is None:
+            return
+        record['events'].setdefault(event, timestamp or time.time())
+        if 'displayed' in record['events'] and 'decoded' in record['events']:
+            self._finish(inspection_id)
+
+    def event_time(self, inspection_id, event):
+        """Mốc đã ghi của lần kiểm tra đang chạy, None nếu chưa có"""
+        record = self._active.get(inspection_id)
+        return None if record is None else record['events'].get(event)
+
+    def attach_image(self, path, written_at):
+        """Ghép ảnh mới với TRIGGER cũ nhất đang chờ ảnh (không có thì tạo lần kiểm tra mới), trả về id"""
+        inspection_id = None
+        for candidate, record in self._active.items():
+            if record['path'] is None:
+                inspection_id = candidate
+                break
+        if inspection_id is None:
+            inspection_id = next(self._ids)
+            self._active[inspection_id] = {'path': None, 'events': {}}
+            self._evict()
+        record = self._active[inspection_id]
+        record['path'] = path
+        record['events'].setdefault('written', written_at)
+        self._by_path[path] = inspection_id
+        return inspection_id
+
+    def mark_image(self, path, event, timestamp=None):
+        inspection_id = self._by_path.get(path)
+        if inspection_id is not None:
+            self.mark(inspection_id, event, timestamp)
+
+    def abandon(self, inspection_id):
+        """Kết thúc sớm (TRIGGER lỗi): các chặng đã đủ mốc vẫn được ghi nhận"""
+        if inspection_id in self._active:
+            self._finish(inspection_id)
+
+    def _evict(self):
+        # Ảnh bị bỏ qua (có ảnh mới hơn trước khi kịp hiển thị) không bao giờ xong: đóng bớt bản ghi cũ
+        while len(self._active) > self.max_active:
+            self._finish(next(iter(self._active)))
+
+    def _finish(self, inspection_id):
+        record = self._active.pop(inspection_id)
+        if self._by_path.get(record['path']) == inspection_id:
+            del self._by_path[record['path']]
+        events = record['events']
+        if not events:
+            return
+        bounds = dict(events, first=min(events.values()))
+        if 'displayed' in events and 'decoded' in events:
+            bounds['done'] = max(events['displayed'], events['decoded'])
+        spans = {}
+        for name, (begin, end) in SPANS.items():
+            if begin in bounds and end in bounds:
+                spans[name] = (bounds[begin], bounds[end])
+                self.samples[name].append((bounds[end] - bounds[begin]) * 1000)
+        self.completed.append({'id': inspection_id, 'path': record['path'], 'spans': spans})
+
+    def stats(self):
+        """{chặng: (số mẫu, p50 ms, p95 ms)} trên cửa sổ trượt"""
+        result = {}
+        for name, values in self.samples.items():
+            result[name] = (len(values), percentile(values, 50), percentile(values, 95))
+        return result
+
+    def export_csv(self, path):
+        """Ghi mọi chặng đã đo ra CSV (một dòng một chặng), trả về số dòng"""
+        rows = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["inspection", "image", "span", "start", "end", "ms"])
+            for record in self.completed:
+                for name, (start, end) in record['spans'].items():
+                    writer.writerow([record['id'], record['path'] or "", name,
+                                     f"{start:.6f}", f"{end:.6f}", f"{(end - start) * 1000:.2f}"])
+                    rows += 1
+        return rows
+
+    def clear(self):
+        for values in self.samples.values():
+            values.clear()
+        self.completed.clear()
+        self._active.clear()
+        self._by_path.clear()
+
+
+class LatencyPanel(QFrame):
+    """Bảng p50 / p95 của từng chặng, cập nhật bằng refresh()"""
+
+    def __init__(self, tracker, parent=None):
+        super().__init__(parent)
+        self.tracker = tracker
+        layout = QGridLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setHorizontalSpacing(12)
+        layout.setVerticalSpacing(0)
+        font = QFont("Consolas")
+        font.setStyleHint(QFont.StyleHint.Monospace)
+        font.setPointSize(8)
+        for column, title in enumerate(("Chặng", "p50", "p95", "n")):
+            header = QLabel(f"<b>{title}</b>")
+            header.setStyleSheet("border: none;")
+            layout.addWidget(header, 0, column, Qt.AlignmentFlag.AlignRight if column else Qt.AlignmentFlag.AlignLeft)
+        self._cells = {}
+        for row, name in enumerate(SPANS, start=1):
+            cells = []
+            for column in range(4):
+                label = QLabel(name if column == 0 else "-")
+                label.setFont(font)
+                label.setStyleSheet("border: none;")
+                label.setAlignment(Qt.AlignmentFlag.AlignRight if column else Qt.AlignmentFlag.AlignLeft)
+                layout.addWidget(label, row, column)
+                cells.append(label)
+            self._cells[name] = cells
+
+    def refresh(self):
+        for name, (count, p50, p95) in self.tracker.stats().items():
+            cells = self._cells[name]
+            cells[1].setText("-" if p50 is None else f"{p50:.0f} ms")
+            cells[2].setText("-" if p95 is None else f"{p95:.0f} ms")
+            cells[3].setText(str(count))
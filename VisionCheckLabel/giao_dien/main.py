@@ -3,10 +3,10 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QLabel, QLineEd
                              QPushButton, QFrame, QHBoxLayout, QVBoxLayout, QGridLayout,
                              QTabWidget, QComboBox, QCheckBox, QSlider, QSpinBox, 
                              QDoubleSpinBox, QGroupBox, QRadioButton, QScrollArea,
-                             QFileDialog, QTableWidget, QTableWidgetItem, QHeaderView,
+                             QFileDialog, QTableView, QHeaderView,
                              QTreeWidget, QTreeWidgetItem, QMessageBox, QDialog,
                              QFormLayout, QSplitter, QSizePolicy)
-from PyQt6.QtCore import Qt, QRect, QTimer, QThread, pyqtSignal, pyqtSlot, QEvent
+from PyQt6.QtCore import Qt, QRect, QTimer, QThread, pyqtSignal, pyqtSlot, QEvent, QObject, QFileSystemWatcher
 from PyQt6.QtGui import QFont, QPixmap, QImage
 import cv2
 import numpy as np
@@ -16,42 +16,391 @@ import os
 import datetime
 import subprocess
 import json
+import queue
+import sqlite3
 import serial  # Thêm thư viện pyserial
+import threading
 import time
+from collections import OrderedDict
 
+# Dùng chung pipeline giải mã và recipe với script trong thư mục "1. Pyzbar"
+PYZBAR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "1. Pyzbar")
+sys.path.insert(0, PYZBAR_DIR)
+from pipeline import DEFAULT_RECIPE, compile_recipe, decode_file, make_decoder
+from decode_cache import DecodeCache
+from capture import PylonCaptureSource
+from matcher import TEACHING_MODES, SerialMatcher, load_serials, match_code
+from recipes import (DEFAULT_INSPECTION, apply_check_type, compile_inspection, load_active_model, load_inspection,
+                     recipe_path, save_active_model, save_inspection)
 
-class SerialTriggerWorker(QThread):
-    finished = pyqtSignal(bool, str)
+from inspection_log import InspectionLogModel, InspectionLogStore
+from latency import LatencyPanel, LatencyTracker
+
+# Lịch sử kiểm tra đầy đủ nằm trong SQLite, bảng log chỉ giữ LOG_CAPACITY dòng gần nhất
+LOG_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inspection_log.db")
+LOG_CAPACITY = 500
+
+# Ảnh mẫu chụp từ camera trong hộp thoại teaching
+SAMPLE_DIR = os.path.normpath(os.path.join(PYZBAR_DIR, "..", "image", "Sample"))
+
+
+class SerialTriggerChannel(QThread):
+    """Kênh TRIGGER sống lâu: giữ cổng COM mở và gửi lần lượt các yêu cầu trong hàng đợi
+
+    Giao thức là hỏi - đáp một dòng, nên mỗi lúc chỉ có một yêu cầu đang chờ và
+    phản hồi được ghép với yêu cầu theo đúng thứ tự gửi. Trước mỗi lần gửi, dữ
+    liệu cũ trong bộ đệm nhận (phản hồi đến muộn của yêu cầu đã timeout) bị bỏ
+    để không ghép nhầm. Cổng chỉ được mở lại khi lỗi hoặc khi đổi cấu hình.
+    """
+    # mã yêu cầu, thành công, thông báo, round-trip (ms, tính từ lúc ghi tới lúc nhận đủ dòng phản hồi)
+    finished = pyqtSignal(int, bool, str, float)
+    sent = pyqtSignal(int, float)  # mã yêu cầu, thời điểm đã ghi xong TRIGGER ra cổng (time.time())
     status_update = pyqtSignal(str)
 
-    def __init__(self, port, baudrate=9600):
-        super().__init__()
+    def __init__(self, port, baudrate=9600, response_timeout=5.0, parent=None):
+        super().__init__(parent)
         self.port = port
         self.baudrate = baudrate
+        self.response_timeout = response_timeout
+        self._requests = queue.Queue()
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+        self._config_lock = threading.Lock()
+        self._reconfigure = False
+        self._stopping = False
+        self._serial = None
 
-    def run(self):
-        try:
-            self.status_update.emit("Đang mở cổng COM...")
+    def configure(self, port, baudrate):
+        """Đổi cổng / baudrate; cổng được mở lại trước yêu cầu kế tiếp"""
+        with self._config_lock:
+            if (port, baudrate) != (self.port, self.baudrate):
+                self.port, self.baudrate = port, baudrate
+                self._reconfigure = True
 
-            with serial.Serial(self.port, self.baudrate, timeout=5) as ser:
-                self.status_update.emit(f"Đã kết nối với {self.port} - đang gửi message 'TRIGGER'...")
-                
-                command = b"TRIGGER"
+    def trigger(self, command=b"TRIGGER"):
+        """Xếp một yêu cầu vào hàng đợi, trả về mã yêu cầu để đối chiếu với tín hiệu finished"""
+        with self._id_lock:
+            self._next_id += 1
+            request_id = self._next_id
+        self._requests.put((request_id, command))
+        return request_id
+
+    def pending(self):
+        return self._requests.qsize()
+
+    def stop(self):
+        self._stopping = True
+        self._requests.put(None)
+        self.wait()
+
+    def _open(self):
+        with self._config_lock:
+            if self._reconfigure:
+                self._close()
+                self._reconfigure = False
+            port, baudrate = self.port, self.baudrate
+        if self._serial is None:
+            self.status_update.emit(f"Đang mở cổng {port}...")
+            self._serial = serial.Serial(port, baudrate, timeout=self.response_timeout, write_timeout=1)
+            self.status_update.emit(f"Đã kết nối với {port} - {baudrate} baud")
+        return self._serial
+
+    def _close(self):
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except serial.SerialException:
+                pass
+            self._serial = None
+
+    def run(self):
+        while True:
+            request = self._requests.get()
+            if request is None or self._stopping:
+                break
+            request_id, command = request
+            try:
+                ser = self._open()
+                ser.reset_input_buffer()
+                self.status_update.emit(f"Đang gửi message 'TRIGGER' #{request_id}...")
+                start = time.perf_counter()
                 ser.write(command)
+                self.sent.emit(request_id, time.time())
 
                 # Đọc phản hồi từ comp4
-                response = ser.readline().decode().strip()
-                self.finished.emit(True, f"Message 'TRIGGER' đã gửi thành công. Phản hồi: {response}")
+                line = ser.readline()
+                rtt_ms = (time.perf_counter() - start) * 1000
+                if not line:
+                    self.finished.emit(request_id, False, "Không nhận được phản hồi (timeout)", rtt_ms)
+                    continue
+                response = line.decode(errors="replace").strip()
+                self.finished.emit(request_id, True,
+                                   f"Message 'TRIGGER' đã gửi thành công. Phản hồi: {response}", rtt_ms)
+
+            except serial.SerialTimeoutException:
+                self._close()
+                self.status_update.emit("Timeout khi kết nối serial!")
+                self.finished.emit(request_id, False, "Kết nối serial timeout", 0.0)
+            except serial.SerialException as e:
+                # Cổng lỗi (rút cáp...): đóng để lần sau mở lại
+                self._close()
+                self.status_update.emit(f"Lỗi serial: {str(e)}")
+                self.finished.emit(request_id, False, f"Lỗi serial: {str(e)}", 0.0)
+            except Exception as e:
+                self._close()
+                self.status_update.emit(f"Lỗi không xác định: {str(e)}")
+                self.finished.emit(request_id, False, f"Lỗi không xác định: {str(e)}", 0.0)
+        self._close()
+
+
+class ResultFolderWatcher(QObject):
+    """Theo dõi thư mục ảnh kết quả bằng thông báo thay đổi của hệ điều hành
+
+    Không quét định kỳ: mỗi khi thư mục thay đổi chỉ liệt kê tên file một lần,
+    stat riêng các file mới, và chờ kích thước file đứng yên (camera ghi xong)
+    rồi mới báo. image_ready được phát cho mọi ảnh ghi xong, theo thứ tự mtime
+    (để giải mã từng ảnh); new_image chỉ phát cho ảnh mới nhất (để hiển thị).
+    """
+    image_ready = pyqtSignal(str)
+    new_image = pyqtSignal(str)
+    initial_image = pyqtSignal(str)  # ảnh mới nhất đã có sẵn lúc bắt đầu theo dõi (chỉ để hiển thị)
+
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+    def __init__(self, parent=None, settle_ms=100):
+        super().__init__(parent)
+        self.folder = None
+        self.known = set()
+        self.pending = {}  # tên file mới -> kích thước ở lần stat trước
+        self.newest_path = None
+        self.newest_mtime = -1
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._schedule_scan)
+        # Gộp loạt sự kiện của một lần ghi file thành một lần quét
+        self._scan_timer = QTimer(self)
+        self._scan_timer.setSingleShot(True)
+        self._scan_timer.setInterval(settle_ms)
+        self._scan_timer.timeout.connect(self._scan)
+
+    def start(self, folder):
+        """Bắt đầu theo dõi folder, báo ngay ảnh mới nhất đang có; False nếu thư mục không tồn tại
+
+        Đang theo dõi đúng folder thì giữ nguyên: ảnh đang chờ ghi xong không bị coi là ảnh cũ.
+        """
+        if folder == self.folder and self._watcher.directories():
+            return True
+        if self.folder is not None:
+            # Đổi thư mục: báo nốt các ảnh của thư mục cũ đã ghi xong
+            self._scan()
+        self.stop()
+        if not os.path.isdir(folder):
+            return False
+        self.folder = folder
+        # Chỉ lúc bắt đầu mới stat toàn bộ thư mục để tìm ảnh mới nhất hiện có
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                self.known.add(entry.name)
+                if entry.name.lower().endswith(self.IMAGE_EXTENSIONS) and entry.is_file():
+                    self._track_newest(entry.path, entry.stat().st_mtime)
+        self._watcher.addPath(folder)
+        if self.newest_path:
+            self.initial_image.emit(self.newest_path)
+        return True
+
+    def stop(self):
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+        self._scan_timer.stop()
+        self.folder = None
+        self.known.clear()
+        self.pending.clear()
+        self.newest_path = None
+        self.newest_mtime = -1
+
+    def _schedule_scan(self, path):
+        if not self._scan_timer.isActive():
+            self._scan_timer.start()
+
+    def _track_newest(self, path, mtime):
+        if mtime >= self.newest_mtime:
+            self.newest_path = path
+            self.newest_mtime = mtime
+            return True
+        return False
+
+    def _scan(self):
+        if self.folder is None:
+            return
+        try:
+            with os.scandir(self.folder) as entries:
+                names = {entry.name for entry in entries}
+        except OSError as e:
+            print(f"Cannot read result folder {self.folder}: {e}")
+            return
+
+        # File bị xóa thì quên đi, file mới thì chờ ghi xong
+        self.known &= names
+        for name in names - self.known - self.pending.keys():
+            if name.lower().endswith(self.IMAGE_EXTENSIONS):
+                self.pending[name] = None
+
+        ready = []
+        for name in list(self.pending):
+            path = os.path.join(self.folder, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                del self.pending[name]
+                continue
+            if info.st_size > 0 and info.st_size == self.pending[name]:
+                del self.pending[name]
+                self.known.add(name)
+                ready.append((info.st_mtime, path))
+            else:
+                self.pending[name] = info.st_size
+
+        newest = None
+        for mtime, path in sorted(ready):
+            self.image_ready.emit(path)
+            if self._track_newest(path, mtime):
+                newest = path
+        if newest:
+            self.new_image.emit(newest)
+        # Còn file đang ghi dở: quét lại riêng chúng sau settle_ms
+        if self.pending:
+            self._scan_timer.start()
+
+
+def fit_view_size(image_size, view_width, view_height):
+    """Kích thước ảnh trong image_view: cạnh dài bằng cạnh ngắn của khung, giữ tỉ lệ ảnh gốc"""
+    max_dimension = min(view_width, view_height)
+    # Tính toán tỷ lệ giữa chiều rộng và chiều cao của ảnh gốc
+    if image_size.height() > 0:  # Tránh chia cho 0
+        original_ratio = image_size.width() / image_size.height()
+    else:
+        original_ratio = 1.0
+    if original_ratio > 1.0:  # Ảnh ngang
+        return max_dimension, int(max_dimension / original_ratio)
+    return int(max_dimension * original_ratio), max_dimension  # Ảnh dọc hoặc vuông
 
-        except serial.SerialTimeoutException:
-            self.status_update.emit("Timeout khi kết nối serial!")
-            self.finished.emit(False, "Kết nối serial timeout")
-        except serial.SerialException as e:
-            self.status_update.emit(f"Lỗi serial: {str(e)}")
-            self.finished.emit(False, f"Lỗi serial: {str(e)}")
-        except Exception as e:
-            self.status_update.emit(f"Lỗi không xác định: {str(e)}")
-            self.finished.emit(False, f"Lỗi không xác định: {str(e)}")
+
+class ImageLoadWorker(QThread):
+    """Thread sống lâu nạp file ảnh và thu nhỏ sẵn cho camera_label / image_view
+
+    Chỉ giữ yêu cầu mới nhất: ảnh chụp dồn dập thì các ảnh ở giữa bị bỏ qua thay
+    vì xếp hàng. Dùng QImage (an toàn ngoài GUI thread), GUI chỉ còn chuyển ảnh
+    đã thu nhỏ sang QPixmap.
+    """
+    # đường dẫn, ảnh gốc, ảnh camera_label, ảnh image_view, (kích thước camera_label, kích thước image_view)
+    loaded = pyqtSignal(str, QImage, QImage, QImage, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._request = None
+        self._stopping = False
+        # Ảnh gốc của lần nạp trước: đổi kích thước cửa sổ không phải đọc lại file
+        self._path = None
+        self._original = QImage()
+
+    def request(self, path, camera_size, view_size):
+        """Yêu cầu nạp path và thu nhỏ theo kích thước (rộng, cao) của hai khung hiển thị"""
+        with self._condition:
+            self._request = (path, camera_size, view_size)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                path, camera_size, view_size = self._request
+                self._request = None
+
+            if path != self._path:
+                image = QImage(path)
+                if image.isNull():
+                    self.failed.emit(path)
+                    continue
+                self._path, self._original = path, image
+
+            camera_image = self._original.scaled(
+                camera_size[0], camera_size[1],
+                Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+            view_width, view_height = fit_view_size(self._original.size(), *view_size)
+            view_image = self._original.scaled(
+                view_width, view_height,
+                Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+            self.loaded.emit(path, self._original, camera_image, view_image, (camera_size, view_size))
+
+
+def judge(codes, matcher, model, recheck=False):
+    """So các mã đọc được với S/N và Model
+
+    S/N phải khớp matcher (danh sách S/N của lệnh sản xuất hoặc S/N nhập tay, theo
+    kiểu so sánh của teaching) và chưa được dùng; Model phải khớp một mã theo cùng
+    kiểu so sánh (mặc định trùng 100%, không chỉ là chuỗi con của mã nào đó).
+    Khi kiểm tra lại (recheck) cùng một label thì S/N đã dùng vẫn tính là khớp.
+    Trả về (sn_ok, model_ok, kết quả matcher.check).
+    """
+    match = matcher.check(codes)
+    sn_ok = match['serial'] is not None and (recheck or not match['consumed'])
+    model_ok = bool(model) and any(match_code(model, code, matcher.mode) for code in codes)
+    return sn_ok, model_ok, match
+
+
+class DecodeWorker(QThread):
+    """Thread giải mã sống lâu: giải mã lần lượt từng ảnh mới bằng pipeline của "1. Pyzbar" và chấm PASS/FAIL"""
+    decoded = pyqtSignal(object)  # bản ghi decode_file kèm 'sn', 'model', 'sn_ok', 'sn_consumed', 'model_ok', 'recheck', 'verdict'
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._requests = queue.Queue()
+        # Ảnh trùng nội dung (chụp lại, recheck) không phải giải mã lại
+        self._cache = DecodeCache(DEFAULT_RECIPE)
+        # Recipe chỉ được biên dịch lại khi teaching đổi recipe
+        self._recipe = None
+        self._decode = None
+
+    def request(self, image_path, sn, model, recipe, matcher, recheck=False):
+        """Xếp ảnh vào hàng đợi cùng S/N, Model, recipe và matcher S/N tại thời điểm chụp
+
+        recheck: chấm lại ảnh đã chấm, không kiểm tra và không đánh dấu S/N đã dùng.
+        """
+        self._requests.put((image_path, sn, model, recipe, matcher, recheck))
+
+    def stop(self):
+        self._requests.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            image_path, sn, model, recipe, matcher, recheck = request
+            if recipe is not self._recipe:
+                self._recipe = recipe
+                self._decode = compile_recipe(recipe)
+                self._cache.set_recipe(recipe)
+            result = decode_file(image_path, recipe, cache=self._cache, decode=self._decode)
+            codes = [code['data'] for code in result['codes']]
+            sn_ok, model_ok, match = judge(codes, matcher, model, recheck)
+            passed = sn_ok and model_ok
+            if passed and not recheck:
+                matcher.consume(match['serial'])  # Label sau mang cùng S/N sẽ bị báo trùng
+            result.update(sn=match['serial'] or sn, model=model, sn_ok=sn_ok,
+                          sn_consumed=match['consumed'] and not recheck, model_ok=model_ok, recheck=recheck, verdict="PASS" if passed else "FAIL")
+            self.decoded.emit(result)
 
 
 class LinePacking(QMainWindow):
@@ -68,16 +417,69 @@ class LinePacking(QMainWindow):
         self.serial_baudrate = 9600
         
         self.serial_baudrate
+        # Thư mục phần mềm camera đổ ảnh kết quả vào (đổi được trong teaching)
+        self.image_folder = r"C:\Users\a\Desktop\Work\VisionCheckLabel\image\Result"
         # Biến để theo dõi trạng thái hoạt động
         self.is_running = False
-        self.original_pixmap = None  # Để lưu trữ ảnh gốc
+        self.original_image = None  # Ảnh gốc (QImage) của ảnh đang hiển thị
+
+        # Cấu hình decoder biên dịch từ "Loại kiểm tra" của teaching (mặc định Barcode 1D)
+        self.active_model = None
+        self.inspection = dict(DEFAULT_INSPECTION)
+        self.check_type = self.inspection['check_type']
+        self.roi_settings = dict(self.inspection['roi'])
+        self.decode_recipe = apply_check_type(DEFAULT_RECIPE, self.check_type)
+        # Matcher của danh sách S/N trong teaching; None thì so với S/N nhập tay
+        self.serial_matcher = None
+        # Matcher một S/N của S/N nhập tay, giữ lại theo (S/N, kiểu so sánh) để nhận ra label trùng
+        self.typed_matcher = None
+        self.typed_matcher_key = None
+        # Độ trễ từng chặng của mỗi lần kiểm tra; mã yêu cầu TRIGGER -> lần kiểm tra
+        self.latency = LatencyTracker()
+        self.trigger_inspections = {}
         
         self.initUI()  # Đổi tên từ initUI thành init_ui để tuân theo quy ước Python
 
-        # Tạo timer nhưng chưa khởi động
-        self.camera_timer = QTimer(self)
-        self.camera_timer.timeout.connect(self.update_camera_preview)
-        # Chỉ bắt đầu khi nhấn nút Start
+        # Nạp recipe của model đã teaching ở lần chạy trước
+        model = load_active_model()
+        if model:
+            try:
+                self.apply_inspection_recipe(model)
+            except (ValueError, RuntimeError, OSError) as e:
+                print(f"Cannot load recipe of {model}: {e}")
+
+        # Ảnh mới trong thư mục kết quả được báo qua sự kiện hệ thống file, chỉ theo dõi khi nhấn Start
+        self.result_watcher = ResultFolderWatcher(self)
+        self.result_watcher.initial_image.connect(self.update_camera_preview)
+        self.result_watcher.image_ready.connect(self.track_new_image)
+        self.result_watcher.image_ready.connect(self.decode_new_image)
+        self.result_watcher.new_image.connect(self.update_camera_preview)
+
+        # Nạp và thu nhỏ ảnh preview trên thread riêng
+        self.image_loader = ImageLoadWorker(self)
+        self.image_loader.loaded.connect(self.show_loaded_image)
+        self.image_loader.failed.connect(lambda path: print(f"Cannot load image: {path}"))
+        self.image_loader.start()
+
+        # Kênh TRIGGER giữ cổng COM mở suốt phiên làm việc, các yêu cầu được xếp hàng
+        self.trigger_channel = SerialTriggerChannel(self.serial_port, self.serial_baudrate, parent=self)
+        self.trigger_channel.finished.connect(self.handle_trigger_result)
+        self.trigger_channel.sent.connect(self.handle_trigger_sent)
+        self.trigger_channel.status_update.connect(self.update_trigger_status)
+        self.trigger_channel.start()
+
+        # Giải mã + chấm PASS/FAIL ngay trong tiến trình giao diện, trên thread riêng
+        self.decode_worker = DecodeWorker(self)
+        self.decode_worker.decoded.connect(self.handle_decode_result)
+        self.decode_worker.start()
+
+        # Gộp loạt resize / đổi trạng thái cửa sổ thành một lần làm mới ảnh
+        self.display_refresh_timer = QTimer(self)
+        self.display_refresh_timer.setSingleShot(True)
+        self.display_refresh_timer.timeout.connect(self.update_image_displays)
+        # Pixmap đã thu nhỏ theo (đường dẫn, khung, rộng, cao): quay lại kích thước cũ không phải scale lại
+        self.scaled_pixmaps = OrderedDict()
+        self.scaled_pixmap_capacity = 32
 
     # Phương thức này cập nhật trạng thái khi worker gửi tín hiệu
     def update_trigger_status(self, message):
@@ -92,11 +494,28 @@ class LinePacking(QMainWindow):
             self.result_view.setText(f"Lỗi khi cập nhật trạng thái: {str(e)}")
             self.result_view.setStyleSheet("color: red; font-weight: bold;")
 
-    def handle_trigger_result(self, success, message):
+    def handle_trigger_sent(self, request_id, sent_at):
+        """Ghi mốc TRIGGER đã ra tới cổng COM"""
+        inspection_id = self.trigger_inspections.get(request_id)
+        if inspection_id is not None:
+            self.latency.mark(inspection_id, 'sent', sent_at)
+
+    def handle_trigger_result(self, request_id, success, message, rtt_ms):
         """Xử lý kết quả gửi message 'TRIGGER'"""
+        inspection_id = self.trigger_inspections.pop(request_id, None)
+        if inspection_id is not None:
+            sent_at = self.latency.event_time(inspection_id, 'sent')
+            if success and sent_at is not None:
+                # Tính theo round-trip đo trong thread serial, không tính thời gian signal chờ GUI
+                self.latency.mark(inspection_id, 'answered', sent_at + rtt_ms / 1000)
+            elif not success:
+                self.latency.abandon(inspection_id)
         try:
+            self.statusBar().showMessage(
+                f"TRIGGER #{request_id}: {'OK' if success else 'lỗi'} - round-trip {rtt_ms:.0f} ms, "
+                f"còn {self.trigger_channel.pending()} yêu cầu chờ")
             if success:
-                self.result_view.setText(f"Message 'TRIGGER' đã gửi thành công!\n{message}")
+                self.result_view.setText(f"Message 'TRIGGER' đã gửi thành công!\n{message}\nRound-trip: {rtt_ms:.0f} ms")
                 self.result_view.setStyleSheet("color: green; font-weight: bold;")
             else:
                 self.result_view.setText(f"Message 'TRIGGER' thất bại!\n{message}")
@@ -109,8 +528,8 @@ class LinePacking(QMainWindow):
     def resizeEvent(self, event):
         """Xử lý sự kiện thay đổi kích thước cửa sổ"""
         super().resizeEvent(event)
-        # Tăng thời gian trễ để đảm bảo UI đã hoàn toàn cập nhật
-        QTimer.singleShot(200, self.update_image_displays)
+        # Kéo cửa sổ sinh hàng chục resize: chỉ làm mới một lần sau khi dừng kéo
+        self.schedule_display_refresh(200)
         # Lưu lại trạng thái kích thước cửa sổ hiện tại
         self.current_window_state = self.windowState()
 
@@ -118,67 +537,70 @@ class LinePacking(QMainWindow):
         """Xử lý khi cửa sổ được hiển thị"""
         super().showEvent(event)
         # Đảm bảo ảnh được cập nhật khi cửa sổ hiển thị
-        QTimer.singleShot(100, self.update_image_displays)
+        self.schedule_display_refresh(100)
+
+    def schedule_display_refresh(self, delay_ms):
+        """Hẹn làm mới ảnh sau delay_ms; gọi lại trước hạn thì hẹn lại, chỉ chạy một lần"""
+        self.display_refresh_timer.start(delay_ms)
+
     def update_image_displays(self):
-        """Cập nhật hiển thị ảnh theo kích thước hiện tại của các label"""
-        if not hasattr(self, 'original_pixmap') or self.original_pixmap is None or self.original_pixmap.isNull():
+        """Hiển thị lại ảnh hiện tại theo kích thước hiện tại của các label"""
+        if self.current_image_path is None or self.original_image is None:
             return
         
-        # Đảm bảo các label đã được cập nhật kích thước
-        QApplication.processEvents()
-        
-        # Cập nhật camera view
-        camera_width = self.camera_label.width()
-        camera_height = self.camera_label.height()
-        camera_pixmap = self.original_pixmap.scaled(
-            camera_width, 
-            camera_height,
-            Qt.AspectRatioMode.KeepAspectRatio, 
-            Qt.TransformationMode.SmoothTransformation
-        )
-        self.camera_label.setPixmap(camera_pixmap)
-        self.camera_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        # Cập nhật image view
-        view_width = self.image_view.width()
-        view_height = self.image_view.height()
-        
         # Đảm bảo kích thước khung nhìn là hợp lệ
-        if view_width <= 0 or view_height <= 0:
-            QTimer.singleShot(100, self.update_image_displays)  # Thử lại sau
+        if self.image_view.width() <= 0 or self.image_view.height() <= 0:
+            self.schedule_display_refresh(100)  # Thử lại sau
             return
         
-        # Tính toán kích thước tối đa cho ảnh mà không bị cắt
-        max_dimension = min(view_width, view_height)
-        
-        # Tính toán tỷ lệ giữa chiều rộng và chiều cao của ảnh gốc
-        if self.original_pixmap.height() > 0:  # Tránh chia cho 0
-            original_ratio = self.original_pixmap.width() / self.original_pixmap.height()
-        else:
-            original_ratio = 1.0
-        
-        # Xác định kích thước mới dựa trên tỷ lệ ảnh gốc
-        if original_ratio > 1.0:  # Ảnh ngang
-            new_width = max_dimension
-            new_height = int(max_dimension / original_ratio)
-        else:  # Ảnh dọc hoặc vuông
-            new_height = max_dimension
-            new_width = int(max_dimension * original_ratio)
-        
-        # Scale ảnh với kích thước đã tính
-        image_pixmap = self.original_pixmap.scaled(
-            new_width,
-            new_height,
-            Qt.AspectRatioMode.KeepAspectRatio, 
-            Qt.TransformationMode.SmoothTransformation
-        )
-        
+        self.request_image(self.current_image_path)
+
+    def display_sizes(self):
+        """(kích thước camera_label, kích thước image_view) hiện tại"""
+        return ((self.camera_label.width(), self.camera_label.height()),
+                (self.image_view.width(), self.image_view.height()))
+
+    def request_image(self, image_path):
+        """Hiển thị ảnh từ cache nếu đã scale đúng kích thước, nếu không thì giao cho ImageLoadWorker"""
+        camera_size, view_size = self.display_sizes()
+        camera_pixmap = self.scaled_pixmaps.get((image_path, 'camera', camera_size))
+        view_pixmap = self.scaled_pixmaps.get((image_path, 'view', view_size))
+        if camera_pixmap is not None and view_pixmap is not None:
+            self.scaled_pixmaps.move_to_end((image_path, 'camera', camera_size))
+            self.scaled_pixmaps.move_to_end((image_path, 'view', view_size))
+            self.set_display_pixmaps(camera_pixmap, view_pixmap)
+            return
+        self.image_loader.request(image_path, camera_size, view_size)
+
+    def cache_scaled_pixmap(self, key, pixmap):
+        self.scaled_pixmaps[key] = pixmap
+        self.scaled_pixmaps.move_to_end(key)
+        while len(self.scaled_pixmaps) > self.scaled_pixmap_capacity:
+            self.scaled_pixmaps.popitem(last=False)
+
+    def show_loaded_image(self, image_path, original, camera_image, view_image, sizes):
+        """Nhận ảnh đã thu nhỏ từ ImageLoadWorker, lưu cache và hiển thị"""
+        if image_path != self.current_image_path:
+            return  # Đã có ảnh mới hơn được yêu cầu
+        self.latency.mark_image(image_path, 'loaded')
+        self.original_image = original
+        camera_size, view_size = sizes
+        camera_pixmap = QPixmap.fromImage(camera_image)
+        view_pixmap = QPixmap.fromImage(view_image)
+        self.cache_scaled_pixmap((image_path, 'camera', camera_size), camera_pixmap)
+        self.cache_scaled_pixmap((image_path, 'view', view_size), view_pixmap)
+        self.set_display_pixmaps(camera_pixmap, view_pixmap)
+        self.latency.mark_image(image_path, 'displayed')
+        self.latency_panel.refresh()
+
+    def set_display_pixmaps(self, camera_pixmap, view_pixmap):
+        self.camera_label.setPixmap(camera_pixmap)
+        self.camera_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
         # Đặt pixmap và căn giữa
-        self.image_view.setPixmap(image_pixmap)
+        self.image_view.setPixmap(view_pixmap)
         self.image_view.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        
-        # In thông tin debug
-        print(f"Image view size: {view_width}x{view_height}, Scaled image: {new_width}x{new_height}")
+
     def initUI(self):
         """Khởi tạo giao diện người dùng"""
         # Thiết lập cửa sổ chính
@@ -332,9 +754,11 @@ class LinePacking(QMainWindow):
         
         self.reset_btn = QPushButton("Reset")
         self.reset_btn.setStyleSheet(button_style + "background-color: #4169E1; color: white;")
+        self.reset_btn.clicked.connect(self.reset_system)
         
         self.recheck_btn = QPushButton("Recheck")
         self.recheck_btn.setStyleSheet(button_style + "background-color: #4169E1; color: white;")
+        self.recheck_btn.clicked.connect(self.recheck)
         
         buttons_layout.addWidget(self.start_btn)
         buttons_layout.addWidget(self.stop_btn)
@@ -435,9 +859,24 @@ class LinePacking(QMainWindow):
         # Thêm nút để mở cấu hình teaching
         self.open_teaching_btn = QPushButton("Mở cấu hình teaching")
         self.open_teaching_btn.setStyleSheet("border: 1px solid #999;")  # Nút vẫn giữ viền nhẹ
+        self.open_teaching_btn.clicked.connect(self.open_teaching_config)
         teaching_layout.addWidget(self.open_teaching_btn)
         
         right_layout.addWidget(teaching_frame)
+
+        # Độ trễ từng chặng (p50 / p95 trên các lần kiểm tra gần nhất)
+        latency_frame = QFrame()
+        latency_frame.setStyleSheet("border: 2px solid black; border-radius: 5px; background-color: #f8f8f8;")
+        latency_layout = QHBoxLayout(latency_frame)
+        latency_layout.setContentsMargins(10, 5, 10, 5)
+        self.latency_panel = LatencyPanel(self.latency)
+        self.latency_panel.setStyleSheet("border: none;")
+        latency_layout.addWidget(self.latency_panel, 1)
+        export_latency_btn = QPushButton("Xuất CSV")
+        export_latency_btn.setStyleSheet("border: 1px solid #999;")
+        export_latency_btn.clicked.connect(self.export_latency)
+        latency_layout.addWidget(export_latency_btn, 0, Qt.AlignmentFlag.AlignBottom)
+        right_layout.addWidget(latency_frame)
         
         # Log process display với khả năng cuộn
         log_frame = QFrame()
@@ -446,9 +885,22 @@ class LinePacking(QMainWindow):
         log_layout.setContentsMargins(10, 10, 10, 10)  # Thêm padding bên trong
         
         # Tạo bảng log với khả năng cuộn
-        self.log_table = QTableWidget()
-        self.log_table.setColumnCount(5)
-        self.log_table.setHorizontalHeaderLabels(["Thời gian", "S/N", "Model", "Kết quả", "Thời gian xử lý"])
+        try:
+            self.log_store = InspectionLogStore(LOG_DB_PATH)
+        except sqlite3.Error as e:
+            print(f"Cannot open inspection log database {LOG_DB_PATH}: {e}")
+            self.log_store = None
+        self.log_model = InspectionLogModel(self.log_store, capacity=LOG_CAPACITY, parent=self)
+        self.log_table = QTableView()
+        self.log_table.setModel(self.log_model)
+        self.log_table.verticalHeader().setVisible(False)
+        # Cuộn theo từng dòng: keep_log_position tính vị trí cuộn bằng số dòng
+        self.log_table.setVerticalScrollMode(QTableView.ScrollMode.ScrollPerItem)
+        self.log_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        # Chỉ cắt bớt dòng cũ khi đang xem dòng mới nhất (đầu bảng)
+        self.log_table.verticalScrollBar().valueChanged.connect(
+            lambda value: setattr(self.log_model, 'follow_live', value == 0))
+        self.log_model.rows_prepended.connect(self.keep_log_position)
         self.log_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.log_table.setMinimumHeight(100)  # Giảm chiều cao tối thiểu
         self.log_table.setMaximumHeight(150)  # Thêm chiều cao tối đa
@@ -473,52 +925,116 @@ class LinePacking(QMainWindow):
         """Khôi phục kích thước mặc định cho splitter"""
         splitter.setSizes([100, 300, 200, 200])
 
-    def update_camera_preview(self):
+    def track_new_image(self, image_path):
+        """Ghép ảnh mới với TRIGGER đang chờ và ghi mốc camera ghi xong / watcher phát hiện"""
+        if not self.is_running:
+            return
+        detected_at = time.time()
+        try:
+            written_at = os.stat(image_path).st_mtime
+        except OSError:
+            written_at = detected_at
+        self.latency.attach_image(image_path, written_at)
+        self.latency.mark_image(image_path, 'detected', detected_at)
+
+    def update_camera_preview(self, image_path):
+        """Hiển thị ảnh mới nhất do ResultFolderWatcher báo"""
         if not self.is_running:
             return  # Không cập nhật nếu chưa bắt đầu chạy
-            
-        result_folder = r"C:\Users\a\Desktop\Work\VisionCheckLabel\image\Result"
-        
-        # Kiểm tra xem thư mục kết quả có tồn tại không
-        if os.path.exists(result_folder):
-            # Lấy tất cả các tệp ảnh trong thư mục
-            images = [f for f in os.listdir(result_folder) if f.endswith(('.jpg', '.jpeg', '.png', 'bmp'))]
-            
-            if images:
-                # Chọn ảnh mới nhất từ danh sách ảnh
-                images.sort(key=lambda x: os.path.getmtime(os.path.join(result_folder, x)), reverse=True)
-                image_path = os.path.join(result_folder, images[0])  # Lấy ảnh mới nhất theo thời gian sửa đổi
-                
-                # Chỉ cập nhật nếu đây là ảnh mới
-                if image_path != self.current_image_path:
-                    if os.path.exists(image_path):
-                        # Lưu đường dẫn ảnh hiện tại
-                        self.current_image_path = image_path
-                        
-                        # Tải ảnh và lưu phiên bản gốc
-                        self.original_pixmap = QPixmap(image_path)
-                        
-                        # Cập nhật hiển thị ảnh
-                        self.update_image_displays()
-                        
+
+        # Chỉ cập nhật nếu đây là ảnh mới
+        if image_path == self.current_image_path:
+            return
+        # Nạp file và thu nhỏ trên ImageLoadWorker, kết quả về qua show_loaded_image
+        self.current_image_path = image_path
+        # File trùng tên có thể đã bị camera ghi đè: bỏ các bản scale cũ của nó
+        for key in [key for key in self.scaled_pixmaps if key[0] == image_path]:
+            del self.scaled_pixmaps[key]
+        self.request_image(image_path)
+
+    def decode_new_image(self, image_path):
+        """Gửi ảnh mới sang DecodeWorker, kèm S/N và Model đang nhập"""
+        if not self.is_running:
+            return
+        self.queue_decode(image_path)
+
+    def queue_decode(self, image_path, recheck=False):
+        sn = self.sn_input.text().strip()
+        matcher = self.serial_matcher
+        if matcher is None:
+            matcher = self.typed_serial_matcher(sn)
+        self.decode_worker.request(image_path, sn, self.model_input.text().strip(), self.decode_recipe, matcher,
+                                   recheck)
+
+    def typed_serial_matcher(self, sn):
+        """Matcher của S/N nhập tay; cùng S/N và kiểu so sánh thì dùng lại để giữ trạng thái đã dùng"""
+        key = (sn, TEACHING_MODES[self.inspection['match_mode']])
+        if key != self.typed_matcher_key:
+            self.typed_matcher = SerialMatcher([sn], key[1])
+            self.typed_matcher_key = key
+        return self.typed_matcher
+
+    def handle_decode_result(self, result):
+        """Cập nhật bộ đếm, result_view và log theo verdict của một ảnh"""
+        passed = result['verdict'] == "PASS"
+        self.scan_count += 1
+        if passed:
+            self.pass_count += 1
         else:
-            print(f"Result folder does not exist: {result_folder}")
-            
-  
+            self.fail_count += 1
+        self.update_stats()
+
+        codes = ", ".join(code['data'] for code in result['codes']) or "Không đọc được mã"
+        if result.get('error'):
+            detail = f"Lỗi: {result['error']}"
+        else:
+            sn_state = "OK" if result['sn_ok'] else ("ĐÃ DÙNG" if result['sn_consumed'] else "NG")
+            detail = (f"S/N: {sn_state} - Model: {'OK' if result['model_ok'] else 'NG'}\n"
+                      f"Mã: {codes}")
+        self.result_view.setText(f"{result['verdict']}\n{detail}\n{result['ms']:.0f} ms")
+        color = "green" if passed else "red"
+        self.result_view.setStyleSheet(f"color: {color}; font-weight: bold;")
+        self.teaching_status_label.setText(result['verdict'])
+        self.teaching_status_label.setStyleSheet(f"color: {color}; font-weight: bold;")
+        verdict = f"RECHECK {result['verdict']}" if result['recheck'] else result['verdict']
+        self.add_to_log(sn=result['sn'], model=result['model'], result=verdict, duration_ms=result['ms'])
+        self.latency.mark_image(result['path'], 'decoded')
+        self.latency_panel.refresh()
+
+    def export_latency(self):
+        """Xuất các chặng độ trễ đã đo ra file CSV để phân tích"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Xuất độ trễ", datetime.datetime.now().strftime("latency_%Y%m%d_%H%M%S.csv"), "CSV Files (*.csv)")
+        if not file_path:
+            return
+        try:
+            rows = self.latency.export_csv(file_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Lỗi", f"Không ghi được file:\n{str(e)}")
+            return
+        self.statusBar().showMessage(f"Đã xuất {rows} chặng độ trễ ra {file_path}")
+
+    def start_result_watcher(self):
+        """Bắt đầu theo dõi thư mục ảnh kết quả hiện tại"""
+        if not self.result_watcher.start(self.image_folder):
+            print(f"Result folder does not exist: {self.image_folder}")
+
 
     def start_inspection(self):
         """Start the inspection process and send TRIGGER to comp4"""
         try:
+            pressed_at = time.time()
             current_state = self.windowState()
             # Check if S/N and Model are entered
-            if not self.sn_input.text() or not self.model_input.text():
+            # Có danh sách S/N trong teaching thì không cần nhập S/N
+            if (not self.sn_input.text() and self.serial_matcher is None) or not self.model_input.text():
                 self.result_view.setText("Please enter S/N and Model")
                 self.result_view.setStyleSheet("color: red; font-weight: bold;")
                 return
 
             # Đánh dấu là đã bắt đầu chạy
             self.is_running = True
-            self.camera_timer.start(100)
+            self.start_result_watcher()
             
             # Cập nhật giao diện khi bắt đầu quá trình gửi TRIGGER
             self.result_view.setText("Đang gửi message \"TRIGGER\" đến comp4...\nVui lòng đợi...")
@@ -542,25 +1058,19 @@ class LinePacking(QMainWindow):
                 self.is_running = False
                 return
 
-            # Kiểm tra xem đã có serial worker đang chạy chưa
-            if hasattr(self, 'trigger_worker') and self.trigger_worker.isRunning():
-                self.result_view.setText("Đang xử lý yêu cầu trước đó...\nVui lòng đợi.")
-                return
-
             # Hiển thị debug trên console
             print(f"Bắt đầu gửi message \"TRIGGER\" qua cổng COM4")
 
             # Thay đổi ở đây: Kết nối với COM4 thay vì COM3
             self.serial_port = "COM4"  # Đảm bảo là COM4
 
-            # Tạo và chạy worker thread để gửi message "TRIGGER" qua serial
-            self.trigger_worker = SerialTriggerWorker(self.serial_port, self.serial_baudrate)
-            self.trigger_worker.finished.connect(self.handle_trigger_result)
-            self.trigger_worker.status_update.connect(self.update_trigger_status)
-            self.trigger_worker.start()
+            # Xếp yêu cầu vào kênh TRIGGER (cổng giữ mở, yêu cầu đang chờ không bị từ chối)
+            self.trigger_channel.configure(self.serial_port, self.serial_baudrate)
+            request_id = self.trigger_channel.trigger()
+            self.trigger_inspections[request_id] = self.latency.begin(pressed_at)
 
             # Hiển thị debug
-            print("Đã khởi động thread gửi message \"TRIGGER\"")
+            print(f"Đã xếp message \"TRIGGER\" #{request_id} vào hàng đợi")
 
             # Thêm vào log
             self.add_to_log(
@@ -570,8 +1080,6 @@ class LinePacking(QMainWindow):
             )
             if current_state & Qt.WindowState.WindowFullScreen:
                 QTimer.singleShot(100, lambda: self.setWindowState(current_state))
-            # Bây giờ mới bắt đầu camera timer
-            self.camera_timer.start(1000)  # Update every second
 
         except Exception as e:
             self.is_running = False
@@ -583,29 +1091,40 @@ class LinePacking(QMainWindow):
             self.teaching_status_label.setText("Error")
             self.teaching_status_label.setStyleSheet("color: red; font-weight: bold;")
             self.statusBar().showMessage(f"Lỗi: {str(e)}")
+    def closeEvent(self, event):
+        """Dừng các thread nền trước khi đóng cửa sổ"""
+        self.result_watcher.stop()
+        self.image_loader.stop()
+        self.trigger_channel.stop()
+        self.decode_worker.stop()
+        self.log_model.flush()
+        if self.log_store is not None:
+            self.log_store.close()
+        super().closeEvent(event)
+
     def changeEvent(self, event):
         """Xử lý khi trạng thái cửa sổ thay đổi"""
         if event.type() == event.Type.WindowStateChange:
             # Nếu thay đổi sang/từ full screen, đảm bảo giao diện được cập nhật đúng
             if self.windowState() & Qt.WindowState.WindowFullScreen:
                 # Đang ở chế độ full screen
-                QTimer.singleShot(300, self.update_image_displays)
+                self.schedule_display_refresh(300)
             elif event.oldState() & Qt.WindowState.WindowFullScreen:
                 # Vừa thoát chế độ full screen
-                QTimer.singleShot(300, self.update_image_displays)
+                self.schedule_display_refresh(300)
         
         super().changeEvent(event)
     def stop_inspection(self):
         """Stop the inspection process"""
         self.is_running = False
-        self.camera_timer.stop()
+        self.result_watcher.stop()
         self.result_view.setText("System stopped")
         self.result_view.setStyleSheet("color: blue; font-weight: bold;")
 
     def reset_system(self):
         """Reset the system to initial state"""
         self.is_running = False
-        self.camera_timer.stop()
+        self.result_watcher.stop()
         self.sn_input.clear()
         self.model_input.clear()
         self.camera_label.setText("Camera View Online")
@@ -621,12 +1140,18 @@ class LinePacking(QMainWindow):
         self.fail_count = 0
         self.update_stats()
         
-        # Clear log
-        self.log_table.setRowCount(0)
+        # Clear log (lịch sử trong SQLite giữ nguyên)
+        self.log_model.clear()
+        self.trigger_inspections.clear()
+        self.latency.clear()
+        self.latency_panel.refresh()
         
         # Reset variables
+        self.typed_matcher = None
+        self.typed_matcher_key = None
         self.current_image_path = None
-        self.original_pixmap = None
+        self.original_image = None
+        self.scaled_pixmaps.clear()
         
         # Reset teaching display
         self.teaching_model_label.setText("Not set")
@@ -636,57 +1161,27 @@ class LinePacking(QMainWindow):
         self.teaching_status_label.setStyleSheet("color: green; font-weight: bold;")
 
     def recheck(self):
-        """Perform a recheck of the current item"""
-        try:
-            self.result_view.setText("Đang gửi message \"TRIGGER\" để kiểm tra lại...\nVui lòng đợi...")
-            self.result_view.setStyleSheet("color: orange; font-weight: bold;")
-            self.teaching_status_label.setText("Processing")
-            self.teaching_status_label.setStyleSheet("color: orange; font-weight: bold;")
-            self.statusBar().showMessage(f"Đang gửi message \"TRIGGER\" để kiểm tra lại qua {self.serial_port}")
-            
-            QApplication.processEvents()
-            
-            # Tạo và chạy worker thread để gửi message \"TRIGGER\" qua serial
-            self.trigger_worker = SerialTriggerWorker(self.serial_port, self.serial_baudrate)
-            self.trigger_worker.finished.connect(self.handle_trigger_result)
-            self.trigger_worker.status_update.connect(self.update_trigger_status)
-            self.trigger_worker.start()
-            
-            # Thêm vào log
-            self.add_to_log(
-                sn=self.sn_input.text(),
-                model=self.model_input.text(),
-                result="RECHECK Triggered"
-            )
-            
-        except Exception as e:
-            self.result_view.setText(f"Lỗi kiểm tra lại:\n{str(e)}")
+        """Giải mã và chấm lại ảnh đang hiển thị (không chụp ảnh mới)"""
+        if self.current_image_path is None:
+            self.result_view.setText("Chưa có ảnh để kiểm tra lại")
             self.result_view.setStyleSheet("color: red; font-weight: bold;")
-            self.statusBar().showMessage(f"Lỗi: {str(e)}")
+            return
+        self.result_view.setText("Đang kiểm tra lại ảnh hiện tại...")
+        self.result_view.setStyleSheet("color: orange; font-weight: bold;")
+        self.teaching_status_label.setText("Processing")
+        self.teaching_status_label.setStyleSheet("color: orange; font-weight: bold;")
+        self.statusBar().showMessage(f"Kiểm tra lại {os.path.basename(self.current_image_path)}")
+        self.queue_decode(self.current_image_path, recheck=True)
 
-    def add_to_log(self, sn, model, result):
-        """Add an entry to the log table"""
-        row = self.log_table.rowCount()
-        self.log_table.insertRow(row)
-        
-        # Add timestamp
-        time_item = QTableWidgetItem(datetime.datetime.now().strftime("%H:%M:%S"))
-        self.log_table.setItem(row, 0, time_item)
-        
-        # Add SN and Model
-        self.log_table.setItem(row, 1, QTableWidgetItem(sn))
-        self.log_table.setItem(row, 2, QTableWidgetItem(model))
-        
-        # Add result with color
-        result_item = QTableWidgetItem(result)
-        if "PASS" in result:
-            result_item.setBackground(Qt.GlobalColor.green)
-        elif "FAIL" in result:
-            result_item.setBackground(Qt.GlobalColor.red)
-        self.log_table.setItem(row, 3, result_item)
-        
-        # Scroll to the latest entry
-        self.log_table.scrollToBottom()
+    def add_to_log(self, sn, model, result, duration_ms=None):
+        """Add an entry to the log (thêm theo lô, dòng mới nhất ở đầu bảng)"""
+        self.log_model.append(sn, model, result, duration_ms)
+
+    def keep_log_position(self, count):
+        """Đang xem dòng cũ thì giữ nguyên các dòng đang thấy khi có dòng mới chèn lên đầu"""
+        scroll_bar = self.log_table.verticalScrollBar()
+        if scroll_bar.value() > 0:
+            scroll_bar.setValue(scroll_bar.value() + count)
 
     def show_auto_view(self):
         """Switch to auto view"""
@@ -753,12 +1248,20 @@ class LinePacking(QMainWindow):
         check_layout = QFormLayout(check_group)
         
         check_type = QComboBox()
-        check_type.addItems(["Barcode 1D", "QR Code", "Data Matrix", "Label Text"])
+        check_type.addItems(["Barcode 1D", "Barcode 1D (CODE128/CODE39)", "QR Code", "Data Matrix", "Label Text"])
         check_layout.addRow("Loại kiểm tra:", check_type)
         
         match_mode = QComboBox()
         match_mode.addItems(["Chính xác 100%", "Phần đầu giống nhau", "Chứa chuỗi"])
         check_layout.addRow("Kiểu so sánh:", match_mode)
+
+        serial_list = QLineEdit()
+        serial_list.setPlaceholderText("Để trống: so với S/N nhập tay")
+        browse_serial_list_btn = QPushButton("Browse...")
+        serial_list_layout = QHBoxLayout()
+        serial_list_layout.addWidget(serial_list)
+        serial_list_layout.addWidget(browse_serial_list_btn)
+        check_layout.addRow("Danh sách S/N:", serial_list_layout)
         
         # Thêm checkbox cho các tùy chọn nâng cao
         enable_preprocessing = QCheckBox("Bật tiền xử lý ảnh")
@@ -826,22 +1329,22 @@ class LinePacking(QMainWindow):
         
         # X position
         roi_x = QSpinBox()
-        roi_x.setRange(0, 1000)
+        roi_x.setRange(0, 10000)
         roi_x.setSuffix(" px")
         
         # Y position
         roi_y = QSpinBox()
-        roi_y.setRange(0, 1000)
+        roi_y.setRange(0, 10000)
         roi_y.setSuffix(" px")
         
         # Width
         roi_width = QSpinBox()
-        roi_width.setRange(10, 1000)
+        roi_width.setRange(10, 10000)
         roi_width.setSuffix(" px")
         
         # Height
         roi_height = QSpinBox()
-        roi_height.setRange(10, 1000)
+        roi_height.setRange(10, 10000)
         roi_height.setSuffix(" px")
         
         roi_params_layout.addWidget(QLabel("X:"))
@@ -931,6 +1434,7 @@ class LinePacking(QMainWindow):
         # Kết nối các sự kiện
         cancel_btn.clicked.connect(teaching_dialog.reject)
         browse_btn.clicked.connect(lambda: self.browse_file(model_path))
+        browse_serial_list_btn.clicked.connect(lambda: self.browse_file(serial_list))
         browse_image_path_btn.clicked.connect(lambda: self.browse_folder(image_path))
         browse_result_path_btn.clicked.connect(lambda: self.browse_folder(result_path))
         apply_btn.clicked.connect(teaching_dialog.accept)
@@ -940,34 +1444,124 @@ class LinePacking(QMainWindow):
         capture_sample_btn.clicked.connect(lambda: self.capture_sample_image(image_preview))
         clear_sample_btn.clicked.connect(lambda: self.clear_sample_image(image_preview))
         roi_edit_btn.clicked.connect(lambda: self.edit_roi(image_preview, roi_x, roi_y, roi_width, roi_height))
+
+        # Recipe đã lưu của model được nạp lên các ô thiết lập
+        def fill_inspection(model):
+            try:
+                inspection = load_inspection(model)
+            except (ValueError, OSError) as e:
+                QMessageBox.warning(teaching_dialog, "Recipe", f"Không đọc được recipe của {model}:\n{str(e)}")
+                return
+            model_path.setText(recipe_path(model))
+            check_type.setCurrentText(inspection['check_type'])
+            match_mode.setCurrentText(inspection['match_mode'])
+            timeout_value.setValue(int(inspection['timeout_s']))
+            serial_list.setText(inspection['serial_list'] or "")
+            roi = inspection['roi']
+            roi_type.setCurrentText(roi['type'])
+            roi_x.setValue(roi['x'])
+            roi_y.setValue(roi['y'])
+            roi_width.setValue(roi['width'])
+            roi_height.setValue(roi['height'])
+
+        def read_inspection():
+            return {
+                'check_type': check_type.currentText(),
+                'match_mode': match_mode.currentText(),
+                'timeout_s': timeout_value.value(),
+                'serial_list': serial_list.text().strip() or None,
+                'roi': {
+                    'type': roi_type.currentText(),
+                    'x': roi_x.value(),
+                    'y': roi_y.value(),
+                    'width': roi_width.value(),
+                    'height': roi_height.value(),
+                },
+            }
+
+        model_selector.currentTextChanged.connect(fill_inspection)
+        if self.active_model:
+            model_selector.setCurrentText(self.active_model)
+        fill_inspection(model_selector.currentText())
+
+        def save_current():
+            if self.save_inspection_recipe(model_selector.currentText(), read_inspection()):
+                QMessageBox.information(teaching_dialog, "Lưu cấu hình",
+                                        f"Đã lưu recipe vào {recipe_path(model_selector.currentText())}")
+        save_btn.clicked.connect(save_current)
         
         # Hiển thị dialog
         if teaching_dialog.exec() == QDialog.DialogCode.Accepted:
-            # Cập nhật các thông tin cấu hình
-            self.teaching_model_label.setText(model_selector.currentText())
-            self.teaching_area_label.setText(f"{roi_type.currentText()}")
-            self.teaching_settings_label.setText(f"{check_type.currentText()}")
+            # Lưu recipe của model (loại kiểm tra, kiểu so sánh, timeout, ROI) và biên dịch
+            # thành cấu hình decoder: chỉ quét symbology cần thiết, chỉ giải mã trong ROI
+            self.save_inspection_recipe(model_selector.currentText(), read_inspection())
             
             # Cập nhật cấu hình COM
             self.serial_port = com_port.currentText()
             self.serial_baudrate = int(baudrate.currentText())
-            
-            # Lưu cấu hình ROI
-            self.roi_settings = {
-                'type': roi_type.currentText(),
-                'x': roi_x.value(),
-                'y': roi_y.value(), 
-                'width': roi_width.value(),
-                'height': roi_height.value()
-            }
+            self.trigger_channel.configure(self.serial_port, self.serial_baudrate)
+
             
             # Lưu cấu hình đường dẫn
             self.image_folder = image_path.text()
             self.result_folder = result_path.text()
+            if self.is_running:
+                self.start_result_watcher()
             
             # Hiển thị thông báo thành công
             QMessageBox.information(self, "Cập nhật cấu hình", "Cấu hình teaching đã được cập nhật thành công!")
         
+    def apply_inspection_recipe(self, model, inspection=None):
+        """Biên dịch recipe của model (ROI, loại kiểm tra) thành cấu hình decoder đang dùng
+
+        Lỗi (loại kiểm tra chưa có decoder, backend chưa cài) được raise trước khi đổi
+        cấu hình, nên cấu hình đang chạy giữ nguyên.
+        """
+        inspection = inspection or load_inspection(model)
+        decode_recipe = compile_inspection(model, inspection)
+        make_decoder(decode_recipe)  # Báo lỗi ngay nếu backend chưa được cài
+        serial_matcher = self.build_serial_matcher(inspection)
+        self.active_model = model
+        self.inspection = inspection
+        self.check_type = inspection['check_type']
+        self.roi_settings = dict(inspection['roi'])
+        self.decode_recipe = decode_recipe
+        self.serial_matcher = serial_matcher
+        self.teaching_model_label.setText(model)
+        self.teaching_area_label.setText(inspection['roi']['type'])
+        self.teaching_settings_label.setText(inspection['check_type'])
+
+    def build_serial_matcher(self, inspection):
+        """Dựng chỉ mục cho danh sách S/N của teaching (None nếu không dùng danh sách)
+
+        Cùng file và cùng kiểu so sánh thì giữ matcher cũ để không mất trạng thái S/N đã dùng.
+        """
+        path = inspection.get('serial_list')
+        if not path:
+            return None
+        mode = TEACHING_MODES[inspection['match_mode']]
+        current = self.serial_matcher
+        if current is not None and current.source == path and current.mode == mode:
+            return current
+        try:
+            return SerialMatcher(load_serials(path), mode, source=path)
+        except OSError as e:
+            raise ValueError(f"Không đọc được danh sách S/N {path}: {e.strerror or e}") from None
+
+    def save_inspection_recipe(self, model, inspection):
+        """Kiểm tra, lưu recipe của model vào file và áp dụng ngay; trả về False nếu không áp dụng được"""
+        try:
+            self.apply_inspection_recipe(model, inspection)
+            save_inspection(model, inspection)
+            save_active_model(model)
+        except (ValueError, RuntimeError) as e:
+            QMessageBox.warning(self, "Cấu hình teaching", f"Không áp dụng được cấu hình:\n{str(e)}")
+            return False
+        except OSError as e:
+            QMessageBox.critical(self, "Lỗi", f"Không lưu được recipe:\n{str(e)}")
+            return False
+        return True
+
     def test_connection(self, port, baudrate):
         """Kiểm tra kết nối cổng COM"""
         try:
@@ -1007,14 +1601,39 @@ class LinePacking(QMainWindow):
             QMessageBox.critical(self, "Lỗi", f"Đã xảy ra lỗi khi tải ảnh: {str(e)}")
     
     def capture_sample_image(self, preview_label):
-        """Chụp ảnh mẫu từ camera"""
+        """Chụp ảnh mẫu từ camera Basler và lưu vào image/Sample"""
+        source = None
         try:
-            # Hiển thị thông báo chức năng chưa khả dụng
-            QMessageBox.information(self, "Chức năng chưa khả dụng", 
-                                  "Chức năng chụp ảnh mẫu đang được phát triển.\n"
-                                  "Vui lòng sử dụng chức năng tải ảnh mẫu.")
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+            try:
+                source = PylonCaptureSource(slots=2).start()
+                frame = source.snapshot()
+            finally:
+                QApplication.restoreOverrideCursor()
+            if frame is None:
+                QMessageBox.warning(self, "Lỗi", "Camera không trả về ảnh.")
+                return
+            gray, _ = frame
+
+            os.makedirs(SAMPLE_DIR, exist_ok=True)
+            file_path = os.path.join(SAMPLE_DIR, datetime.datetime.now().strftime("sample_%Y%m%d_%H%M%S.png"))
+            cv2.imwrite(file_path, gray)
+
+            height, width = gray.shape
+            image = QImage(gray.data, width, height, width, QImage.Format.Format_Grayscale8)
+            pixmap = QPixmap.fromImage(image).scaled(preview_label.width(), preview_label.height(),
+                                                     Qt.AspectRatioMode.KeepAspectRatio,
+                                                     Qt.TransformationMode.SmoothTransformation)
+            preview_label.setPixmap(pixmap)
+            preview_label.setProperty("image_path", file_path)  # Lưu đường dẫn ảnh
+        except RuntimeError as e:
+            # Không có pypylon hoặc không tìm thấy camera
+            QMessageBox.warning(self, "Không chụp được ảnh", f"{str(e)}\nVui lòng sử dụng chức năng tải ảnh mẫu.")
         except Exception as e:
             QMessageBox.critical(self, "Lỗi", f"Đã xảy ra lỗi: {str(e)}")
+        finally:
+            if source is not None:
+                source.stop()
     
     def clear_sample_image(self, preview_label):
         """Xóa ảnh mẫu đã tải"""
@@ -0,0 +1,7 @@
+"""Cho test import được IOController.py và các module trong thư mục "1. Pyzbar" """
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "1. Pyzbar"))
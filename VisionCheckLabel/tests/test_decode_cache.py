@@ -0,0 +1,65 @@
+import itertools
+
+import decode_cache
+from decode_cache import DecodeCache, content_hash, recipe_fingerprint
+
+
+RECIPE_A = {'strategies': ['gray'], 'blur': 3}
+RECIPE_B = {'strategies': ['upscale'], 'blur': 3}
+
+
+def test_fingerprint_ignores_key_order_and_changes_with_values():
+    assert recipe_fingerprint({'a': 1, 'b': 2}) == recipe_fingerprint({'b': 2, 'a': 1})
+    assert recipe_fingerprint(RECIPE_A) != recipe_fingerprint(RECIPE_B)
+    assert content_hash(b"abc") == content_hash(b"abc") != content_hash(b"abd")
+
+
+def test_results_are_keyed_by_content_and_recipe():
+    cache = DecodeCache(RECIPE_A)
+    key = content_hash(b"image")
+    fingerprint_b = recipe_fingerprint(RECIPE_B)
+    cache.put(key, {'ok': True})
+    assert cache.get(key) == {'ok': True}
+    assert cache.get(key, fingerprint_b) is None
+
+    cache.put(key, {'ok': False}, fingerprint_b)
+    assert cache.get(key, fingerprint_b) == {'ok': False}
+    assert cache.get(key, recipe_fingerprint(RECIPE_A)) == {'ok': True}
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 1
+
+
+def test_lru_drops_least_recently_used():
+    cache = DecodeCache(RECIPE_A, capacity=2)
+    cache.put("a", {'n': 1})
+    cache.put("b", {'n': 2})
+    cache.get("a")
+    cache.put("c", {'n': 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {'n': 1}
+
+
+def test_sqlite_is_shared_between_instances_and_recipes(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    first = DecodeCache(RECIPE_A, db_path=db_path)
+    first.put("img", {'ok': True})
+    first.close()
+
+    second = DecodeCache(RECIPE_B, db_path=db_path)
+    assert second.get("img") is None
+    # Đổi recipe không xóa dòng của recipe khác trong file
+    second.set_recipe(RECIPE_A)
+    assert second.get("img") == {'ok': True}
+    second.close()
+
+
+def test_prune_keeps_the_newest_rows(tmp_path, monkeypatch):
+    # Mốc ghi tăng dần, không phụ thuộc độ phân giải đồng hồ
+    clock = itertools.count(1000)
+    monkeypatch.setattr(decode_cache.time, 'time', lambda: float(next(clock)))
+    cache = DecodeCache(RECIPE_A, db_path=str(tmp_path / "cache.db"), max_rows=3)
+    for index in range(5):
+        cache.put(f"img{index}", {'n': index})
+    cache.prune()
+    rows = [row[0] for row in cache._db.execute("SELECT content_hash FROM decode_cache ORDER BY stored_at")]
+    assert rows == ["img2", "img3", "img4"]
+    cache.close()
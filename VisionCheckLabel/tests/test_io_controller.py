@@ -0,0 +1,106 @@
+from IOController import (FRAME_HEADER as H, FRAME_TRAILER as T, FrameParser, InPorts, IOController, IOType, OutPorts,
+                          PortState)
+
+
+def make_controller(io_type=IOType.EightPorts):
+    controller = IOController("loop://", io_type=io_type)
+    controller.write_line = lambda message: None
+    return controller
+
+
+def test_parser_joins_a_frame_split_across_reads():
+    parser = FrameParser()
+    assert parser.feed(bytes([H, 0x80])) == []
+    assert parser.feed(bytes([T])) == [bytes([H, 0x80, T])]
+
+
+def test_parser_returns_every_frame_of_a_burst():
+    parser = FrameParser()
+    assert parser.feed(bytes([H, 0x01, T, H, 0x02, T])) == [bytes([H, 0x01, T]), bytes([H, 0x02, T])]
+    assert parser.buffer == bytearray()
+
+
+def test_parser_resyncs_after_noise_and_a_bad_trailer():
+    parser = FrameParser()
+    # Rác trước frame, rồi một header không có trailer đúng chỗ
+    frames = parser.feed(bytes([0x11, 0x22, H, 0x05, 0x00, H, 0x40, T]))
+    assert frames == [bytes([H, 0x40, T])]
+    assert parser.discarded == 5
+
+
+def test_parser_header_byte_as_data_value():
+    parser = FrameParser()
+    # 0x98 ở vị trí dữ liệu (In_1, In_4 và In_5 bật) vẫn là một frame hợp lệ
+    assert parser.feed(bytes([H, H, T])) == [bytes([H, H, T])]
+
+
+def test_changed_inputs_table_maps_xor_bits_to_ports():
+    controller = make_controller()
+    assert controller.changed_inputs[0] == ()
+    assert controller.changed_inputs[0x80] == ((InPorts.In_1, 0x80),)
+    assert controller.changed_inputs[0x81] == ((InPorts.In_1, 0x80), (InPorts.In_8, 0x01))
+    assert len(controller.changed_inputs[0xFF]) == 8
+
+    four = make_controller(IOType.FourPorts)
+    # Bit không gắn với cổng nào của loại 4 cổng thì không sinh sự kiện
+    assert four.changed_inputs[0xF0] == ()
+    assert four.changed_inputs[0x03] == ((InPorts.In_1, 0x01), (InPorts.In_2, 0x02))
+
+
+def test_process_in_data_raises_one_event_per_changed_input():
+    controller = make_controller()
+    events = []
+    controller.add_data_received_callback(lambda sender, args: events.append((args.command, args.state)))
+
+    controller.process_in_data(bytes([H, 0x81, T]))
+    assert events == [(InPorts.In_1, PortState.On), (InPorts.In_8, PortState.On)]
+    events.clear()
+    controller.process_in_data(bytes([H, 0x81, T]))
+    assert events == []
+    controller.process_in_data(bytes([H, 0x01, T]))
+    assert events == [(InPorts.In_1, PortState.Off)]
+    assert controller.is_input_on(InPorts.In_8)
+    assert not controller.is_input_in(InPorts.All, PortState.On)
+
+
+def test_plan_outputs_sends_unknown_ports_and_skips_known_no_ops():
+    controller = make_controller()
+    commands, data = controller.plan_outputs({OutPorts.Out_1: PortState.On})
+    assert commands == [(OutPorts.Out_1, PortState.On)]
+    assert data == bytes([H, 0x01, 0x01, T])
+
+    controller.stored_byte_out, controller.known_byte_out = controller.apply_outputs(
+        commands, controller.stored_byte_out, controller.known_byte_out)
+    assert controller.plan_outputs({OutPorts.Out_1: PortState.On}) == ([], b'')
+    assert controller.plan_outputs({OutPorts.Out_1: PortState.On}, force=True)[0] == [(OutPorts.Out_1, PortState.On)]
+
+    controller.invalidate_outputs()
+    assert controller.plan_outputs({OutPorts.Out_1: PortState.On})[0] == [(OutPorts.Out_1, PortState.On)]
+
+
+def test_plan_outputs_coalesces_to_all_only_when_every_port_ends_equal():
+    controller = make_controller(IOType.FourPorts)
+    ports = [OutPorts.Out_1, OutPorts.Out_2, OutPorts.Out_3, OutPorts.Out_4]
+    commands, data = controller.plan_outputs({port: PortState.Off for port in ports})
+    assert commands == [(OutPorts.All, PortState.Off)]
+    assert data == bytes([H, 0xFF, 0x00, T])
+
+    # Ba cổng mới: cổng thứ tư chưa biết trạng thái nên không được gộp thành All
+    commands, _ = controller.plan_outputs({port: PortState.On for port in ports[:3]})
+    assert commands == [(port, PortState.On) for port in ports[:3]]
+
+
+def test_plan_outputs_later_entries_win_and_all_expands():
+    controller = make_controller(IOType.FourPorts)
+    commands, _ = controller.plan_outputs([(OutPorts.All, PortState.On), (OutPorts.Out_2, PortState.Off)])
+    assert commands == [(OutPorts.Out_1, PortState.On), (OutPorts.Out_3, PortState.On),
+                        (OutPorts.Out_4, PortState.On), (OutPorts.Out_2, PortState.Off)]
+    # Cổng không có trên loại 4 cổng
+    assert controller.plan_outputs({OutPorts.Out_5: PortState.On}) is None
+
+
+def test_transaction_needs_an_open_port():
+    controller = make_controller()
+    with controller.transaction() as tx:
+        tx.set(OutPorts.Out_1, PortState.On)
+    assert tx.result is False
@@ -0,0 +1,66 @@
+import pytest
+
+from matcher import SerialMatcher, match_code
+
+
+def test_exact_matches_whole_code_only():
+    matcher = SerialMatcher(["S516C00933"])
+    assert matcher.find("S516C00933") == ["S516C00933"]
+    assert matcher.find("S516C009331") == []
+    assert matcher.find("XS516C00933") == []
+
+
+def test_prefix_returns_every_serial_at_the_start_shortest_first():
+    matcher = SerialMatcher(["S516", "S516C0", "S517"], mode='prefix')
+    assert matcher.find("S516C00933") == ["S516", "S516C0"]
+    assert matcher.find("XS516C00933") == []
+
+
+def test_contains_finds_overlapping_serials_anywhere():
+    # "he" / "she" / "hers" chồng lên nhau: cần liên kết fail của Aho-Corasick
+    matcher = SerialMatcher(["he", "she", "hers", "xyz"], mode='contains')
+    assert sorted(matcher.find("ushers")) == ["he", "hers", "she"]
+    assert matcher.find("abc") == []
+
+
+def test_serials_are_stripped_and_blank_lines_ignored():
+    matcher = SerialMatcher([" S1 ", "", None, "S2\n"])
+    assert matcher.serials == {"S1", "S2"}
+    assert len(matcher) == 2
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        SerialMatcher(["S1"], mode='fuzzy')
+
+
+def test_check_prefers_unused_serial_and_reports_consumed():
+    matcher = SerialMatcher(["S1", "S2"])
+    assert matcher.check(["RT4405-40A", "S1"]) == {'serial': "S1", 'code': "S1", 'consumed': False}
+
+    assert matcher.consume("S1")
+    assert not matcher.consume("S1")
+    assert matcher.is_consumed("S1")
+    assert matcher.check(["S1"]) == {'serial': "S1", 'code': "S1", 'consumed': True}
+    # Label có cả S/N đã dùng và S/N chưa dùng: lấy S/N chưa dùng
+    assert matcher.check(["S1", "S2"])['serial'] == "S2"
+
+    matcher.reset()
+    assert matcher.consumed_count() == 0
+    assert matcher.check(["S1"])['consumed'] is False
+
+
+def test_check_without_match():
+    matcher = SerialMatcher(["S1"])
+    assert matcher.check(["HN204400151578"]) == {'serial': None, 'code': None, 'consumed': False}
+
+
+@pytest.mark.parametrize("mode, code, expected", [
+    ('exact', "RT4405-40A", True),
+    ('exact', "RT4405-40AB", False),
+    ('prefix', "RT4405-40AB", True),
+    ('prefix', "XRT4405-40A", False),
+    ('contains', "XRT4405-40AB", True),
+])
+def test_match_code(mode, code, expected):
+    assert match_code("RT4405-40A", code, mode) is expected
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from pipeline import DEFAULT_RECIPE
+from recipes import (DEFAULT_INSPECTION, RECIPE_VERSION, load_recipe_file, recipe_path, save_inspection,
+                     save_recipe)
+
+MODEL = "RU Model"
+
+
+def write_file(recipe_dir, data):
+    with open(recipe_path(MODEL, str(recipe_dir)), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def test_missing_file_gives_defaults(tmp_path):
+    data = load_recipe_file(MODEL, str(tmp_path))
+    assert data['version'] == RECIPE_VERSION
+    assert data['decode'] == DEFAULT_RECIPE
+    assert data['inspection'] == DEFAULT_INSPECTION
+
+
+def test_version_1_file_is_upgraded_on_read(tmp_path):
+    write_file(tmp_path, {'version': 1, 'model': MODEL, 'decode': {'strategies': ['otsu'], 'blur': 5},
+                          'tuning': {'images': 10}})
+    data = load_recipe_file(MODEL, str(tmp_path))
+    assert data['version'] == 2
+    assert data['decode'] == dict(DEFAULT_RECIPE, strategies=['otsu'], blur=5)
+    assert data['inspection'] == DEFAULT_INSPECTION
+    assert data['tuning'] == {'images': 10}
+
+
+def test_partial_inspection_is_completed_with_defaults(tmp_path):
+    write_file(tmp_path, {'version': 2, 'model': MODEL, 'decode': {},
+                          'inspection': {'match_mode': "Chứa chuỗi", 'roi': {'type': "Vùng chữ nhật", 'width': 10}}})
+    inspection = load_recipe_file(MODEL, str(tmp_path))['inspection']
+    assert inspection['match_mode'] == "Chứa chuỗi"
+    assert inspection['check_type'] == DEFAULT_INSPECTION['check_type']
+    assert inspection['roi'] == dict(DEFAULT_INSPECTION['roi'], type="Vùng chữ nhật", width=10)
+
+
+def test_unsupported_version_is_rejected(tmp_path):
+    write_file(tmp_path, {'version': 99, 'model': MODEL})
+    with pytest.raises(ValueError):
+        load_recipe_file(MODEL, str(tmp_path))
+
+
+def test_saving_one_section_keeps_the_others(tmp_path):
+    write_file(tmp_path, {'version': 1, 'model': MODEL, 'decode': {'blur': 5}, 'pyramid': {'start': 0.5}})
+    save_inspection(MODEL, dict(DEFAULT_INSPECTION, timeout_s=9), str(tmp_path))
+    save_recipe(MODEL, dict(DEFAULT_RECIPE, blur=7), str(tmp_path), tuning={'images': 3})
+
+    with open(recipe_path(MODEL, str(tmp_path)), encoding="utf-8") as f:
+        data = json.load(f)
+    assert data['version'] == 2
+    assert data['decode']['blur'] == 7
+    assert data['inspection']['timeout_s'] == 9
+    assert data['pyramid'] == {'start': 0.5}
+    assert data['tuning'] == {'images': 3}